@@ -1,17 +1,83 @@
 # Copyright (C) 2023 Authors of the MCDA project - All Rights Reserved
 
 ACCESSIBILITYSERVICE_URL = "http://172.26.62.41:5001"
+OAS_TIMEOUT_SECONDS = 600
+OAS_CONNECT_TIMEOUT_SECONDS = 10
+OAS_MAX_CONNECTIONS = 16
+OAS_RETRIES = 3
+OAS_RETRY_BACKOFF_SECONDS = 0.5
+# request bodies larger than this are gzip-compressed (0 disables compression, disabled automatically if rejected by the OAS)
+OAS_COMPRESS_MIN_BYTES = 64 * 1024
+# send locations/weights as packed binary arrays and accept arrow responses (falls back to json if unsupported by the OAS)
+OAS_BINARY_TRANSPORT = False
+# multi-criteria requests with more demand points are split into tiles requested concurrently
+OAS_SHARD_MIN_DEMAND = 50000
+OAS_SHARD_FANOUT = 4
+# tile side length in multiples of the halo (maximum distance reachable within the decay range)
+OAS_SHARD_TILE_FACTOR = 4
+# maximum travel speed per travel-mode used to derive the halo
+OAS_SHARD_SPEED_KMH = {"driving-car": 130, "walking-foot": 7, "public-transit": 130}
 
 GRAPH_DIR = "./files/graphs"
 GRAPH_OSM_FILE = "./files/osm.pbf"
 GRAPH_GTFS_DIR = "./files/gtfs"
 GRAPH_GTFS_FILTER_POLYGON = "./files/area.json"
 ROUTING_PROFILES = ["driving-car"]
+# keep a shared travel-time matrix ("pyaccess.calc_matrix") per session to update scenarios without routing again
+# (pyaccess is not pinned in requirements.txt: on first use per profile matrices are checked against
+# "pyaccess.calc_reachability_2" and not used if results differ)
+PYACCESS_CALC_MATRIX = False
+
+# written by scripts/populate_db.py
+POPULATION_RASTER_DIR = "./files/population"
+# resolution of the population used for large extents (max extent in km², resolution in m), larger extents use 1000 m
+POPULATION_AUTO_RESOLUTION = [(2500, 100), (10000, 250), (40000, 500)]
+
+# buffer (in degrees) around planning areas used to query population and physicians for spatial access
+PLANNING_AREA_BUFFER = 0.2
+# maximum number of vertices of the subdivided planning-area parts (written by scripts/populate_db.py)
+PLANNING_AREA_SUBDIVIDE_VERTICES = 256
+
+COMPUTE_POOL_TYPE = "thread" # "thread" or "process"
+COMPUTE_POOL_WORKERS = 4
+COMPUTE_MAX_CONCURRENT = 4
+
+RESULT_CACHE_MAX_BYTES = 512 * 1024 * 1024
+# should be increased whenever the population/facility data or the graphs change (invalidates cached results)
+DATASET_VERSION = 1
+# interval (in seconds) in which the in-memory facility tables are checked for changes
+FACILITY_REFRESH_SECONDS = 300
+# interval (in seconds) in which the catalogs (available facilities, population, ...) are reloaded from the database
+CATALOG_REFRESH_SECONDS = 300
+
+# static settings of the frontend (served through /v1/state)
+UI_SETTINGS = {
+    "storeParameters": False,
+    "loadParameters": False
+}
+ANALYSIS_SETTINGS = {
+    "statistics": {
+        "a": True,
+        "b": True,
+        "c": True
+    },
+    "hotspot": True,
+    "scenario": True
+}
+RANGE_LIMITS = {
+    "min": 0,
+    "max": 70
+}
+
+JOB_MAX_RUNNING = 2
+JOB_TIMEOUT_MINUTES = 60
 
 POSTGIS_HOST = "localhost"
 POSTGIS_USER = ""
 POSTGIS_PASSWORD = ""
 POSTGIS_DB = ""
+# create missing spatial indices on startup (tables are clustered by them in populate_db)
+DATABASE_MANAGE_INDICES = True
 
 API_HOST = "localhost"
 API_PORT = 5000
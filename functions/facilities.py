@@ -3,7 +3,7 @@
 """Utility functions to retrive facilities from db.
 """
 
-from sqlalchemy import select
+from sqlalchemy import select, func, literal, union_all
 from geoalchemy2.shape import from_shape, to_shape
 from sqlalchemy.ext.asyncio import AsyncSession
 from shapely import Point, Polygon
@@ -24,46 +24,69 @@ async def get_facility(session: AsyncSession, facility_name: str, envelop: Polyg
     Note:
         - a table facilities_list must exist in the database (containing metadata about existing facilites)
     """
-    locations = []
-    weights = []
-    location_set = set()
+    facilities = await get_facilities(session, {facility_name: (facility_name, envelop)})
+    return facilities[facility_name]
 
-    envelop_wkb = from_shape(envelop, srid=4326)
+async def get_facilities(session: AsyncSession, queries: dict[str, tuple[str, Polygon]]) -> dict[str, tuple[list[tuple[float, float]], list[float]]]:
+    """Extract locations and weights of multiple facilities from the database in a single query.
 
-    # get facility table and columns for the given facility
+    Args:
+        session: sqlalchemy session
+        queries: facility name and envelop to filter facilities (by key, e.g. infrastructure name)
+
+    Returns:
+        list of locations and weights (by key)
+
+    Note:
+        - a table facilities_list must exist in the database (containing metadata about existing facilites)
+        - unknown facilities are returned as empty lists
+    """
+    result: dict[str, tuple[list[tuple[float, float]], list[float]]] = {key: ([], []) for key in queries}
+    if len(queries) == 0:
+        return result
+
+    # get facility tables and columns for all requested facilities
     list_table = get_table("facilities_list")
     if list_table is None:
-        return (locations, weights)
-    stmt = select(list_table.c.table_name, list_table.c.geometry_column, list_table.c.weight_column).where(list_table.c.name == facility_name)
+        return result
+    names = list(set(name for name, _ in queries.values()))
+    stmt = select(list_table.c.name, list_table.c.table_name, list_table.c.geometry_column, list_table.c.weight_column).where(list_table.c.name.in_(names))
     rows = await session.execute(stmt)
     rows = rows.fetchall()
-    table_name = None
-    geometry_column = None
-    weight_column = None
+    columns = {}
     for row in rows:
-        table_name = row[0]
-        geometry_column = row[1]
-        weight_column = row[2]
-    if table_name is None or geometry_column is None or weight_column is None:
-        return (locations, weights)
-
-    # read locations and weights from table
-    facility_table = get_table(table_name)
-    if facility_table is None:
-        return (locations, weights)
-    stmt = select(getattr(facility_table.c, geometry_column), getattr(facility_table.c, weight_column)).where(getattr(facility_table.c, geometry_column).ST_Within(envelop_wkb))
+        if row[1] is None or row[2] is None or row[3] is None:
+            continue
+        facility_table = get_table(row[1])
+        if facility_table is None:
+            continue
+        columns[row[0]] = (getattr(facility_table.c, row[2]), getattr(facility_table.c, row[3]))
+
+    # read locations and weights of all facilities (tagged by key)
+    stmts = []
+    for i, (key, (name, envelop)) in enumerate(queries.items()):
+        if name not in columns:
+            continue
+        geometry, weight = columns[name]
+        envelop_wkb = from_shape(envelop, srid=4326)
+        # coordinates are extracted and duplicate locations are removed by postgis (no geometry decoding per row)
+        x = func.ST_X(geometry)
+        y = func.ST_Y(geometry)
+        stmt = select(literal(i).label("key"), x.label("x"), y.label("y"), weight.label("weight")) \
+            .where(geometry.ST_Within(envelop_wkb) & weight.is_distinct_from(0)) \
+            .distinct(x, y)
+        stmts.append(stmt)
+    if len(stmts) == 0:
+        return result
+    stmt = stmts[0] if len(stmts) == 1 else union_all(*stmts)
     rows = await session.execute(stmt)
     rows = rows.fetchall()
+    keys = list(queries.keys())
     for row in rows:
-        if row[1] == 0:
-            continue
-        point = to_shape(row[0])
-        if (point.x, point.y) in location_set:
-            continue
-        location_set.add((point.x, point.y))
-        locations.append((point.x, point.y))
-        weights.append(row[1])
-    return locations, weights
+        locations, weights = result[keys[row[0]]]
+        locations.append((row[1], row[2]))
+        weights.append(row[3])
+    return result
 
 async def _get_facility_group_by_id(session: AsyncSession, group_id: int) -> tuple[str, str, int] | None:
     """Retrives the facility-group by id.
@@ -80,6 +103,18 @@ async def _get_facility_group_by_id(session: AsyncSession, group_id: int) -> tup
         return str(row[0]), str(row[1]), row[2]
     return None
 
+async def _get_facility_groups_by_id(session: AsyncSession) -> dict[int, tuple[str, str, int | None]]:
+    """Retrives all facility-groups by id (in a single query).
+    - Return group-name, group-i18n-key and super-group-id (None if no super-group)
+    """
+    group_table = get_table("facilities_groups")
+    if group_table is None:
+        return {}
+    stmt = select(group_table.c.group_id, group_table.c.name, group_table.c.i18n_key, group_table.c.super_group_id)
+    rows = await session.execute(stmt)
+    rows = rows.fetchall()
+    return {int(row[0]): (str(row[1]), str(row[2]), row[3]) for row in rows}
+
 async def get_available_facilities(session: AsyncSession) -> dict:
     """Retrives all available facilities.
 
@@ -98,6 +133,7 @@ async def get_available_facilities(session: AsyncSession) -> dict:
     facilities_table = get_table("facilities_list")
     if facilities_table is None:
         return facilities
+    groups = await _get_facility_groups_by_id(session)
     stmt = select(facilities_table.c.name, facilities_table.c.i18n_key, facilities_table.c.tooltip_key, facilities_table.c.group_id).where()
     rows = await session.execute(stmt)
     rows = rows.fetchall()
@@ -110,7 +146,7 @@ async def get_available_facilities(session: AsyncSession) -> dict:
         else:
             item = {"text": i18n_key, "tooltip": tooltip_key}
         group_id = int(row[3])
-        group = await _get_facility_group_by_id(session, group_id)
+        group = groups.get(group_id)
         if group is None:
             continue
         group_name, group_i18n_key, super_group_id = group
@@ -119,7 +155,7 @@ async def get_available_facilities(session: AsyncSession) -> dict:
                 facilities[group_name] = {"text": group_i18n_key, "items": {}}
             facilities[group_name]["items"][name] = item
         else:
-            super_group = await _get_facility_group_by_id(session, super_group_id)
+            super_group = groups.get(super_group_id)
             if super_group is None:
                 continue
             super_group_name, super_group_i18n_key, super_group_id = super_group
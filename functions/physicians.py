@@ -3,16 +3,16 @@
 """Utility functions to retrive physicians from db.
 """
 
-from sqlalchemy import select
+from sqlalchemy import select, func
 from geoalchemy2.shape import from_shape, to_shape
 from sqlalchemy.ext.asyncio import AsyncSession
 from shapely import Point, Polygon
 
 from .util import get_table
-from .planning_areas import _get_supply_level_by_id
+from .planning_areas import _get_supply_levels_by_id, get_planning_area_filter, get_planning_area_member_filter
 
 
-async def get_physicians(session: AsyncSession, query: Polygon, physician_name: str, capacity_type: str) -> tuple[list[tuple[float, float]], list[float]]:
+async def get_physicians(session: AsyncSession, query: Polygon, physician_name: str, capacity_type: str, planning_area: str | None = None, buffered: bool = False) -> tuple[list[tuple[float, float]], list[float]]:
     """Retrives physicians from db.
 
     Args:
@@ -20,19 +20,20 @@ async def get_physicians(session: AsyncSession, query: Polygon, physician_name:
         query: extent to query physicians
         physician_name: physician name
         capacity_type: capacity type (e.g. location-based, scope of participation)
+        planning_area: name of the planning-area the query extent has been derived from (optional)
+        buffered: whether the query extent is the buffered planning-area
 
     Returns:
         lists of locations and weights
 
     Note:
+        - if planning_area is given its precomputed members (or subdivided parts) are queried instead of query
         - a table physicians_list must exist in the database (containing metadata about existing physicians)
         - a table physicians_locations must exist in the database (containing the actual locations of physicians)
     """
     locations = []
     weights = []
 
-    query_wkb = from_shape(query, srid=4326)
-    
     phys_list = get_table("physicians_list")
     if phys_list is None:
         return (locations, weights)
@@ -48,40 +49,35 @@ async def get_physicians(session: AsyncSession, query: Polygon, physician_name:
     phys_locs = get_table("physicians_locations")
     if phys_locs is None:
         return (locations, weights)
+    query_filter = None
+    if planning_area is not None:
+        query_filter = await get_planning_area_member_filter(session, phys_locs.c.pid, planning_area, buffered, "physician_pids")
+        if query_filter is None:
+            query_filter = await get_planning_area_filter(session, phys_locs.c.geometry, planning_area, buffered)
+    if query_filter is None:
+        query_filter = phys_locs.c.geometry.ST_Within(from_shape(query, srid=4326))
+    # coordinates are extracted by postgis (no geometry decoding per row)
+    x = func.ST_X(phys_locs.c.geometry)
+    y = func.ST_Y(phys_locs.c.geometry)
     if capacity_type == 'facility':
-        stmt = select(phys_locs.c.geometry).where(
-            (phys_locs.c.physician_id == detail_id) & phys_locs.c.geometry.ST_Within(query_wkb)
+        stmt = select(x, y).where(
+            (phys_locs.c.physician_id == detail_id) & query_filter
         )
         rows = await session.execute(stmt)
         rows = rows.fetchall()
         for row in rows:
-            point = to_shape(row[0])
-            locations.append((point.x, point.y))
+            locations.append((row[0], row[1]))
             weights.append(1)
-    elif capacity_type == 'physicianNumber':
-        stmt = select(phys_locs.c.geometry, phys_locs.c.physician_count).where(
-            (phys_locs.c.physician_id == detail_id) & phys_locs.c.geometry.ST_Within(query_wkb)
+    elif capacity_type in ['physicianNumber', 'employmentVolume']:
+        weight = phys_locs.c.physician_count if capacity_type == 'physicianNumber' else phys_locs.c.vbe_volume
+        stmt = select(x, y, weight).where(
+            (phys_locs.c.physician_id == detail_id) & query_filter & weight.is_distinct_from(0)
         )
         rows = await session.execute(stmt)
         rows = rows.fetchall()
         for row in rows:
-            if row[1] == 0:
-                continue
-            point = to_shape(row[0])
-            locations.append((point.x, point.y))
-            weights.append(row[1])
-    elif capacity_type == 'employmentVolume':
-        stmt = select(phys_locs.c.geometry, phys_locs.c.vbe_volume).where(
-            (phys_locs.c.physician_id == detail_id) & phys_locs.c.geometry.ST_Within(query_wkb)
-        )
-        rows = await session.execute(stmt)
-        rows = rows.fetchall()
-        for row in rows:
-            if row[1] == 0:
-                continue
-            point = to_shape(row[0])
-            locations.append((point.x, point.y))
-            weights.append(row[1])
+            locations.append((row[0], row[1]))
+            weights.append(row[2])
     return (locations, weights)
 
 async def get_available_physicians(session: AsyncSession) -> dict:
@@ -102,6 +98,7 @@ async def get_available_physicians(session: AsyncSession) -> dict:
     physician_table = get_table("physicians_list")
     if physician_table is None:
         return physician_groups
+    supply_levels = await _get_supply_levels_by_id(session)
     stmt = select(physician_table.c.name, physician_table.c.i18n_key, physician_table.c.supply_level_ids).where()
     rows = await session.execute(stmt)
     rows = rows.fetchall()
@@ -110,7 +107,7 @@ async def get_available_physicians(session: AsyncSession) -> dict:
         i18n_key = str(row[1])
         level_ids = list(row[2])
         for level_id in level_ids:
-            supply_level = await _get_supply_level_by_id(session, level_id)
+            supply_level = supply_levels.get(level_id)
             if supply_level not in physician_groups:
                 physician_groups[supply_level] = {}
             physician_groups[supply_level][name] = {"text": i18n_key}
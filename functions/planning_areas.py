@@ -3,7 +3,7 @@
 """Utility functions to retrive planning areas from db.
 """
 
-from sqlalchemy import select
+from sqlalchemy import select, exists, func, ColumnElement
 from geoalchemy2.shape import from_shape, to_shape
 from sqlalchemy.ext.asyncio import AsyncSession
 from shapely import Point, Polygon
@@ -31,6 +31,65 @@ async def get_planning_area(session: AsyncSession, planning_area: str) -> Polygo
         return to_shape(row[0])
     return None
 
+async def get_planning_area_filter(session: AsyncSession, geometry: ColumnElement, planning_area: str, buffered: bool = False, point: ColumnElement | None = None) -> ColumnElement | None:
+    """Builds a condition testing geometries against the subdivided parts of a planning-area.
+
+    Args:
+        session: db session
+        geometry: geometry column of the queried table (used to find candidate rows through its spatial index)
+        planning_area: name of the planning-area
+        buffered: use the buffered planning-area (see config.PLANNING_AREA_BUFFER)
+        point: point tested against the parts (defaults to geometry, should be given for non-point geometries)
+
+    Returns:
+        condition to be used in a where-clause, None if no parts exist for the planning-area
+
+    Note:
+        - the parts are written by populate_db ("insertPlanningAreas")
+        - a row matches if its point intersects any part (parts are much cheaper to test against than the whole planning-area)
+    """
+    part_table = get_table("planning_area_parts")
+    if part_table is None:
+        return None
+    stmt = select(part_table.c.pid).where((part_table.c.name == planning_area) & (part_table.c.buffered == buffered)).limit(1)
+    rows = await session.execute(stmt)
+    if rows.first() is None:
+        return None
+    if point is None:
+        point = geometry
+    return exists().where(
+        (part_table.c.name == planning_area) & (part_table.c.buffered == buffered)
+        & geometry.intersects(part_table.c.geometry) & func.ST_Intersects(part_table.c.geometry, point)
+    )
+
+async def get_planning_area_member_filter(session: AsyncSession, pid: ColumnElement, planning_area: str, buffered: bool = False, members: str = "population_pids") -> ColumnElement | None:
+    """Builds a condition testing pids against the precomputed members of a planning-area.
+
+    Args:
+        session: db session
+        pid: pid column of the queried table
+        planning_area: name of the planning-area
+        buffered: members of the buffered planning-area (see config.PLANNING_AREA_BUFFER)
+        members: member column to test against ("population_pids" or "physician_pids")
+
+    Returns:
+        condition to be used in a where-clause, None if no members exist for the planning-area
+
+    Note:
+        - the members are written by populate_db ("insertPlanningAreaMembers") and resolved by the database (pid lists are not sent back and forth)
+        - population cells are members if their centroid lies within the planning-area
+        - populate_db clears the members whenever population or physicians are reinserted
+    """
+    member_table = get_table("planning_area_members")
+    if member_table is None:
+        return None
+    area_filter = (member_table.c.name == planning_area) & (member_table.c.buffered == buffered)
+    stmt = select(member_table.c.name).where(area_filter).limit(1)
+    rows = await session.execute(stmt)
+    if rows.first() is None:
+        return None
+    return pid.in_(select(func.unnest(getattr(member_table.c, members))).where(area_filter))
+
 async def _get_supply_level_by_id(session: AsyncSession, supply_level_id: int) -> str | None:
     """Retrives the supply-level NAME by id.
     - None if no supply-level is found.
@@ -45,6 +104,17 @@ async def _get_supply_level_by_id(session: AsyncSession, supply_level_id: int) -
         return str(row[0])
     return None
 
+async def _get_supply_levels_by_id(session: AsyncSession) -> dict[int, str]:
+    """Retrives the NAMES of all supply-levels by id (in a single query).
+    """
+    level_table = get_table("supply_level_list")
+    if level_table is None:
+        return {}
+    stmt = select(level_table.c.supply_level_id, level_table.c.name)
+    rows = await session.execute(stmt)
+    rows = rows.fetchall()
+    return {int(row[0]): str(row[1]) for row in rows}
+
 async def get_available_supply_levels(session: AsyncSession) -> dict:
     """Retrives the available supply-levels.
 
@@ -81,6 +151,7 @@ async def get_available_planning_areas(session: AsyncSession) -> dict:
     area_table = get_table("planning_areas")
     if area_table is None:
         return planning_areas
+    supply_levels = await _get_supply_levels_by_id(session)
     stmt = select(area_table.c.name, area_table.c.i18n_key, area_table.c.supply_level_ids).where()
     rows = await session.execute(stmt)
     rows = rows.fetchall()
@@ -89,7 +160,7 @@ async def get_available_planning_areas(session: AsyncSession) -> dict:
         i18n_key = str(row[1])
         level_ids = list(row[2])
         for level_id in level_ids:
-            supply_level = await _get_supply_level_by_id(session, level_id)
+            supply_level = supply_levels.get(level_id)
             if supply_level not in planning_areas:
                 planning_areas[supply_level] = {}
             planning_areas[supply_level][name] = {"text": i18n_key}
@@ -3,13 +3,15 @@
 """Utility functions to retrive population-grid from db.
 """
 
-from sqlalchemy import select, func
+from sqlalchemy import select, func, union, union_all, literal, any_, bindparam, Integer, Table, ColumnElement
+from sqlalchemy.dialects.postgresql import ARRAY
 from geoalchemy2 import Geometry
 from geoalchemy2.shape import from_shape, to_shape
 from sqlalchemy.ext.asyncio import AsyncSession
 from shapely import Point, Polygon, from_wkb, STRtree
 
 from .util import get_table
+from .planning_areas import get_planning_area_filter, get_planning_area_member_filter
 from helpers.util import deprecated
 
 @deprecated
@@ -72,7 +74,7 @@ async def get_population(session: AsyncSession, query: Polygon, typ: str = 'stan
         weights.append(row[4])
     return locations, utm_locations, weights
 
-async def get_population_values(session: AsyncSession, query: Polygon | None = None, indices: list[int] | None = None, typ: str = 'standard_all', age_groups: list[str] = []) -> tuple[list[tuple[float, float]], list[int]]:
+async def get_population_values(session: AsyncSession, query: Polygon | None = None, indices: list[int] | None = None, typ: str = 'standard_all', age_groups: list[str] = [], planning_area: str | None = None, buffered: bool = False) -> tuple[list[tuple[float, float]], list[int]]:
     """Retrives the population data (location and weight) for a given population dataset.
 
     Result contains population cells within the query extent or part of indices-list. First n values of the result are garanteed to be ordered by indices-list (e.g. [indices[0], indices[1], ..., indices[-1], rest...]).
@@ -83,6 +85,8 @@ async def get_population_values(session: AsyncSession, query: Polygon | None = N
         indices: list of population grid-cell indices to get population data for 
         typ: population type (e.g. standard, kita_schul)
         age_groups: list of age groups (keys of population entries in db table)
+        planning_area: name of the planning-area the query extent has been derived from (optional)
+        buffered: whether the query extent is the buffered planning-area
 
     Returns:
         locations: list of population locations (centroid of cell)
@@ -91,6 +95,7 @@ async def get_population_values(session: AsyncSession, query: Polygon | None = N
     Note:
         - this function should be called to retrive actual population data for accessibility calculations
         - most common workflow is to first retrive geometry using "get_population_geometry" for visualization purposes and then call this function to compute accessibility results
+        - if planning_area is given its precomputed members (or subdivided parts) are queried instead of query (cells are tested by their centroid)
     """
     if query is None and indices is None:
         return [], []
@@ -143,17 +148,15 @@ async def get_population_values(session: AsyncSession, query: Polygon | None = N
     age_sum = getattr(pop_table.c, keys[0])
     for key in keys[1:]:
         age_sum = age_sum + getattr(pop_table.c, key)
-    if query is not None and indices is not None:
-        query_wkb = from_shape(query, srid=4326)
-        where_clause = pop_table.c.pid.in_(indices) | pop_table.c.geometry.ST_Within(query_wkb)
-    elif query is not None:
-        query_wkb = from_shape(query, srid=4326)
-        where_clause = pop_table.c.geometry.ST_Within(query_wkb)
-    else:
-        if indices is None:
-            raise ValueError("This should not happen.")
-        where_clause = pop_table.c.pid.in_(indices)
-    stmt = select(pop_table.c.pid, pop_table.c.x, pop_table.c.y, age_sum).where(where_clause)
+    # the index list is bound as a single array parameter and the spatial query is run separately
+    # (an OR of both conditions prevents postgres from using the indices)
+    columns = [pop_table.c.pid, pop_table.c.x, pop_table.c.y, age_sum.label("weight")]
+    stmts = []
+    if indices is not None:
+        stmts.append(select(*columns).where(pop_table.c.pid == any_(bindparam("pids", indices, type_=ARRAY(Integer)))))
+    if query is not None:
+        stmts.append(select(*columns).where(await _get_query_filter(session, pop_table, query, planning_area, buffered)))
+    stmt = stmts[0] if len(stmts) == 1 else union(*stmts)
     rows = await session.execute(stmt)
     rows = rows.fetchall()
     if indices is not None:
@@ -172,13 +175,14 @@ async def get_population_values(session: AsyncSession, query: Polygon | None = N
             weights.append(row[3])
     return locations, weights
 
-async def get_population_geometry(session: AsyncSession, query: Polygon, typ: str = 'standard_all') -> tuple[list[int], list[tuple[float, float]]]:
+async def get_population_geometry(session: AsyncSession, query: Polygon, typ: str = 'standard_all', planning_area: str | None = None) -> tuple[list[int], list[tuple[float, float]]]:
     """Returns list of population grid-cell indices and list of population locations.
 
     Args:
         session: database session
         query: query extent
         typ: population type (e.g. standard, kita_schul)
+        planning_area: name of the planning-area the query extent has been derived from (optional, see "get_population_values")
 
     Returns:
         indices: list of population grid-cell indices (can be used in calls to "get_population_values")
@@ -191,8 +195,6 @@ async def get_population_geometry(session: AsyncSession, query: Polygon, typ: st
     indices: list[int] = []
     utm_locations: list[tuple[float, float]] = []
 
-    query_wkb = from_shape(query, srid=4326)
-
     list_table = get_table("population_list")
     if list_table is None:
         return indices, utm_locations
@@ -215,7 +217,7 @@ async def get_population_geometry(session: AsyncSession, query: Polygon, typ: st
     pop_table = get_table(table_name)
     if pop_table is None:
         return indices, utm_locations
-    stmt = select(pop_table.c.pid, pop_table.c.utm_x, pop_table.c.utm_y).where(pop_table.c.geometry.ST_Within(query_wkb))
+    stmt = select(pop_table.c.pid, pop_table.c.utm_x, pop_table.c.utm_y).where(await _get_query_filter(session, pop_table, query, planning_area))
     rows = await session.execute(stmt)
     rows = rows.fetchall()
     for row in rows:
@@ -223,6 +225,18 @@ async def get_population_geometry(session: AsyncSession, query: Polygon, typ: st
         utm_locations.append((row[1], row[2]))
     return indices, utm_locations
 
+async def _get_query_filter(session: AsyncSession, pop_table: Table, query: Polygon, planning_area: str | None, buffered: bool = False) -> ColumnElement:
+    # precomputed members and subdivided planning-areas are preferred over the (complex) query polygon
+    if planning_area is not None:
+        member_filter = await get_planning_area_member_filter(session, pop_table.c.pid, planning_area, buffered, "population_pids")
+        if member_filter is not None:
+            return member_filter
+        centroid = func.ST_SetSRID(func.ST_MakePoint(pop_table.c.x, pop_table.c.y), 4326)
+        area_filter = await get_planning_area_filter(session, pop_table.c.geometry, planning_area, buffered, centroid)
+        if area_filter is not None:
+            return area_filter
+    return pop_table.c.geometry.ST_Within(from_shape(query, srid=4326))
+
 async def get_available_population(session: AsyncSession) -> dict:
     """Returns a list of available population types.
 
@@ -244,23 +258,30 @@ async def get_available_population(session: AsyncSession) -> dict:
         i18n_key = str(row[1])
         meta_table_name = str(row[2])
         populations[name] = {"text": i18n_key, "items": meta_table_name}
+    # age groups of all meta tables are read in a single query (tagged by population group)
+    groups = []
+    stmts = []
     for group in populations:
-        meta_table_name = populations[group]["items"]
-        meta_table = get_table(meta_table_name)
+        meta_table = get_table(populations[group]["items"])
         if meta_table is None:
             continue
-        stmt = select(meta_table.c.age_group_key, meta_table.c.from_, meta_table.c.to_).where()
-        rows = await session.execute(stmt)
-        rows = rows.fetchall()
-        ages = {}
-        for row in rows:
-            age_group_key = str(row[0])
-            from_age = int(row[1])
-            to_age = int(row[2])
-            if to_age < 0:
-                age_range = (from_age,)
-            else:
-                age_range = (from_age, to_age)
-            ages[age_group_key] = age_range
-        populations[group]["items"] = ages
+        stmts.append(select(literal(len(groups)).label("group"), meta_table.c.age_group_key, meta_table.c.from_, meta_table.c.to_))
+        groups.append(group)
+    if len(stmts) == 0:
+        return populations
+    ages = {group: {} for group in groups}
+    stmt = stmts[0] if len(stmts) == 1 else union_all(*stmts)
+    rows = await session.execute(stmt)
+    rows = rows.fetchall()
+    for row in rows:
+        age_group_key = str(row[1])
+        from_age = int(row[2])
+        to_age = int(row[3])
+        if to_age < 0:
+            age_range = (from_age,)
+        else:
+            age_range = (from_age, to_age)
+        ages[groups[row[0]]][age_group_key] = age_range
+    for group in groups:
+        populations[group]["items"] = ages[group]
     return populations
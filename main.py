@@ -13,9 +13,17 @@ from routers.spatial_access import router as spatial_access_router
 from routers.decision_support import router as decision_support_router
 from routers.state import router as app_state_router
 from routers.data import router as data_router
+from routers.jobs import router as jobs_router
 from services.session import init_state
-from services.profile import init_profile_manager
+from services.profile import init_profile_manager, get_profile_manager
+from services.compute import init_compute_executor, shutdown_compute_executor
 from services.database import init_database
+from services.method import init_result_cache, init_oas_client, close_oas_client
+from services.jobs import init_job_manager
+from services.population import init_population_store
+from services.facility import init_facility_store
+from services.physician import init_physician_store
+from services.catalog import init_catalog
 from helpers.log_formatter import ColorFormatter
 
 # create application
@@ -34,17 +42,37 @@ app.add_middleware(
 async def startup_event():
     logging.info("Start loading state...")
     init_state()
+    init_job_manager()
     logging.info("Start loading profiles...")
     init_profile_manager()
+    logging.info("Start compute executor...")
+    init_compute_executor()
+    init_result_cache()
+    init_oas_client()
     logging.info("Start loading database...")
     await init_database()
+    logging.info("Start loading population...")
+    await init_population_store()
+    logging.info("Start loading facilities...")
+    await init_facility_store()
+    logging.info("Start loading physicians...")
+    await init_physician_store()
+    await init_catalog()
 app.add_event_handler("startup", startup_event)
 
+# release services on shutdown
+async def shutdown_event():
+    shutdown_compute_executor()
+    await close_oas_client()
+    get_profile_manager().store_snappings()
+app.add_event_handler("shutdown", shutdown_event)
+
 # add routers to application
 app.include_router(spatial_access_router, prefix="/v1/spatial_access")
 app.include_router(decision_support_router, prefix="/v1/decision_support")
 app.include_router(app_state_router, prefix="/v1/state")
 app.include_router(data_router, prefix="/v1/data")
+app.include_router(jobs_router, prefix="/v1/jobs")
 
 if __name__ == '__main__':
     # configure logging
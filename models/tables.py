@@ -78,6 +78,27 @@ PLANNING_AREA_TABLE_SPEC = {
     ]
 }
 
+PLANNING_AREA_PARTS_TABLE_SPEC = {
+    "name": "planning_area_parts",
+    "columns": [
+        Column("pid", Integer, primary_key=True, autoincrement=True),
+        Column("name", String(50), index=True),
+        Column("buffered", Boolean),
+        Column("geometry", Geometry('POLYGON', srid=4326), index=True),
+    ]
+}
+
+PLANNING_AREA_MEMBERS_TABLE_SPEC = {
+    "name": "planning_area_members",
+    "columns": [
+        Column("pid", Integer, primary_key=True, autoincrement=True),
+        Column("name", String(50), index=True),
+        Column("buffered", Boolean),
+        Column("population_pids", ARRAY(Integer)),
+        Column("physician_pids", ARRAY(Integer)),
+    ]
+}
+
 PHYSICIANS_LIST_TABLE_SPEC = {
     "name": "physicians_list",
     "columns": [
@@ -101,6 +122,6 @@ PHYSICIANS_LOCATION_TABLE_SPEC = {
 }
 
 TABLE_SPECS = [
-    USER_TABLE_SPEC, POPULATION_LIST_TABLE_SPEC, FACILITY_GROUPS_TABLE_SPEC, FACILITY_LIST_TABLE_SPEC, PLANNING_AREA_TABLE_SPEC, SUPPLY_LEVEL_TABLE_SPEC,
+    USER_TABLE_SPEC, POPULATION_LIST_TABLE_SPEC, FACILITY_GROUPS_TABLE_SPEC, FACILITY_LIST_TABLE_SPEC, PLANNING_AREA_TABLE_SPEC, PLANNING_AREA_PARTS_TABLE_SPEC, PLANNING_AREA_MEMBERS_TABLE_SPEC, SUPPLY_LEVEL_TABLE_SPEC,
     PHYSICIANS_LIST_TABLE_SPEC, PHYSICIANS_LOCATION_TABLE_SPEC
 ]
@@ -8,13 +8,13 @@ from fastapi.responses import Response
 from pydantic import BaseModel
 from typing import Annotated
 
-from functions.population import get_population_geometry
 from functions.facilities import get_facility
 from functions.planning_areas import get_planning_area
 from helpers.util import get_extent, get_query_from_extent, get_buffered_query
 from filters.user import get_current_user, User
 from services.session import get_state, SessionStorage, Session
 from services.database import AsyncSession, get_db_session
+from services.population import PopulationStore, get_population_store
 
 ROUTER = APIRouter()
 
@@ -28,6 +28,7 @@ class PopulationGeometryRequest(BaseModel):
 @ROUTER.post("/grid")
 async def population_geometry_api(
         req: PopulationGeometryRequest,
+        population: Annotated[PopulationStore, Depends(get_population_store)],
         state: Annotated[SessionStorage, Depends(get_state)],
         user: Annotated[User, Depends(get_current_user)],
         db: Annotated[AsyncSession, Depends(get_db_session)],
@@ -42,7 +43,7 @@ async def population_geometry_api(
         query = get_query_from_extent(req.envelop)
     else:
         return {"error": "invalid request"}
-    grid_indices, utm_points = await get_population_geometry(db, query, req.population_type)
+    grid_indices, utm_points = await population.get_population_geometry(db, query, req.population_type, req.planning_area)
 
     features: list = []
     indices: list[int] = []
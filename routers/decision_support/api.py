@@ -7,23 +7,72 @@ from fastapi import APIRouter, Depends
 from fastapi.responses import Response
 from pydantic import BaseModel
 from shapely import Polygon
-from typing import Annotated, cast
+from typing import Annotated, Callable, cast
 import asyncio
 import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 
-from functions.population import get_population_values
-from functions.facilities import get_facility
 from helpers.util import get_query_from_extent, get_buffered_query
 from filters.user import get_current_user, User
 from helpers.dummy_decay import get_dummy_decay
-from services.method import get_method_service, IMethodService, Infrastructure
+from services.method import get_method_service, IMethodService, Infrastructure, NO_DATA_VALUE, aggregate_multi_criteria, update_multi_criteria_from_matrix, get_matrix_locations, get_matrix_range, InfrastructureState
 from services.session import get_state, SessionStorage, Session
-from services.database import AsyncSession, get_db_session
+from services.database import AsyncSession, get_db_session, create_db_session
+from services.jobs import Job, JobManager, get_job_manager
+from services.population import PopulationStore, get_population_store
+from services.facility import FacilityStore, get_facility_store
 
 ROUTER = APIRouter()
 
+def _build_features(population_weights: list[int], accessibilities: dict[str, np.ndarray]) -> list[dict]:
+    """Serializes the accessibility arrays to one feature per population cell.
+    """
+    features: list = [{"population": w} for w in population_weights]
+    for name, array in accessibilities.items():
+        for feature, access in zip(features, np.asarray(array).tolist()):
+            feature[name] = access
+    return features
+
+def _get_states(infrastructures: dict[str, Infrastructure], accessibilities: dict[str, np.ndarray], counts: dict[str, np.ndarray], demand_count: int) -> dict[str, InfrastructureState]:
+    """Keeps the result of every infrastructure to recompute later scenarios incrementally.
+    """
+    states = {}
+    for name, infra in infrastructures.items():
+        access = np.asarray(accessibilities[name], dtype=np.float32)
+        reach = np.where(access == NO_DATA_VALUE, np.float32(0), access)
+        # not every method service reports reachable facility counts
+        count = np.asarray(counts[name]) if name in counts else np.zeros((demand_count,), dtype=np.int32)
+        states[name] = InfrastructureState(infra.locations, infra.decay, reach, count)
+    return states
+
+async def _update_multi_criteria(
+        method_service: IMethodService,
+        population_locations: list[tuple[float, float]],
+        population_weights: list[int],
+        infrastructures: dict[str, Infrastructure],
+        states: dict[str, InfrastructureState],
+        travel_mode: str,
+    ) -> tuple[dict[str, np.ndarray], dict[str, InfrastructureState]]:
+    """Recomputes only infrastructures whose facility locations or decay changed, the other results are taken from states.
+
+    Returns:
+        accessibilities and the new states
+    """
+    changed = {}
+    new_states = {}
+    for name, infra in infrastructures.items():
+        state = states.get(name)
+        if state is not None and state.locations == infra.locations and state.decay == infra.decay:
+            new_states[name] = state
+        else:
+            changed[name] = infra
+    if len(changed) > 0:
+        accessibilities, counts = await method_service.calcMultiCriteria(population_locations, population_weights, changed, travel_mode)
+        new_states.update(_get_states(changed, accessibilities, counts, len(population_locations)))
+    reaches = {name: new_states[name].reach for name in infrastructures}
+    return aggregate_multi_criteria(reaches, infrastructures, len(population_locations)), new_states
+
 @ROUTER.post("/create_session")
 async def create_session(
         state: Annotated[SessionStorage, Depends(get_state)],
@@ -55,55 +104,92 @@ class MultiCriteriaRequest(BaseModel):
     # travel parameters
     travel_mode: str
 
-@ROUTER.post("/grid")
-async def decision_support_api(
+async def _compute_multi_criteria(
         req: MultiCriteriaRequest,
-        method_service: Annotated[IMethodService, Depends(get_method_service)],
-        state: Annotated[SessionStorage, Depends(get_state)],
-        user: Annotated[User, Depends(get_current_user)],
-        db: Annotated[AsyncSession, Depends(get_db_session)],
-    ):
-    """Computes the multi-criteria decision support.
-
-    Note:
-        - results and parameters are also stored in the session state
-    """
+        method_service: IMethodService,
+        population: PopulationStore,
+        facilities: FacilityStore,
+        session: Session,
+        db: AsyncSession,
+        progress: Callable[[float], None] | None = None,
+    ) -> list[dict]:
     if req.population_indizes is None or req.population_type is None:
-        population_locations, population_weights = await get_population_values(db, indices=req.population_grid_indices)
+        population_locations, population_weights = await population.get_population_values(db, indices=req.population_grid_indices)
     else:
-        population_locations, population_weights = await get_population_values(db, indices=req.population_grid_indices, typ=req.population_type, age_groups=req.population_indizes)
+        population_locations, population_weights = await population.get_population_values(db, indices=req.population_grid_indices, typ=req.population_type, age_groups=req.population_indizes)
 
     query = get_query_from_extent(req.envelop)
+    facility_queries = {name: (param.facility_type, get_buffered_query(query, req.travel_mode, param.distance_decay)) for name, param in req.infrastructures.items()}
+    facility_data = await facilities.get_facilities(db, facility_queries)
     infrastructures = {}
     for name, param in req.infrastructures.items():
-        buffer_query = get_buffered_query(query, req.travel_mode, param.distance_decay)
-        facility_points, facility_weights = await get_facility(db, param.facility_type, buffer_query)
+        facility_points, facility_weights = facility_data[name]
         infrastructures[name] = Infrastructure(param.infrastructure_weight, param.distance_decay, param.cutoff_points, facility_points, facility_weights)
 
-    task = asyncio.create_task(method_service.calcMultiCriteria(population_locations, population_weights, infrastructures, req.travel_mode))
-
-    accessibilities, counts = await task
+    # compute the travel-time matrix once and derive results from it (if supported by the method service)
+    matrix = await method_service.calcMatrix(population_locations, get_matrix_locations(infrastructures), get_matrix_range(infrastructures), req.travel_mode, progress)
+    result = None
+    if matrix is not None:
+        result = update_multi_criteria_from_matrix(matrix, infrastructures, {})
+    if result is None:
+        task = asyncio.create_task(method_service.calcMultiCriteria(population_locations, population_weights, infrastructures, req.travel_mode, progress))
+        accessibilities, counts = await task
+        states = _get_states(infrastructures, accessibilities, counts, len(population_locations))
+    else:
+        accessibilities, counts, states = result
 
     # update session
-    session = state.get_session(user.get_name(), req.session_id)
     session["accessibilities"] = accessibilities
     session["counts"] = counts
     session["infrastructures"] = infrastructures
     session["population"]  = (population_locations, population_weights)
+    session["matrix"] = (req.travel_mode, matrix)
+    session["scenario"] = states
     session.commit()
 
-    features: list = []
-    for w in population_weights:
-        features.append({
-            "population": w
-        })
-    for name, array in accessibilities.items():
-        for i, _ in enumerate(array):
-            feature = features[i]
-            access: float = float(array[i])
-            feature[name] = access
+    return _build_features(population_weights, accessibilities)
 
-    return features
+@ROUTER.post("/grid")
+async def decision_support_api(
+        req: MultiCriteriaRequest,
+        method_service: Annotated[IMethodService, Depends(get_method_service)],
+        population: Annotated[PopulationStore, Depends(get_population_store)],
+        facilities: Annotated[FacilityStore, Depends(get_facility_store)],
+        state: Annotated[SessionStorage, Depends(get_state)],
+        user: Annotated[User, Depends(get_current_user)],
+        db: Annotated[AsyncSession, Depends(get_db_session)],
+    ):
+    """Computes the multi-criteria decision support.
+
+    Note:
+        - results and parameters are also stored in the session state
+    """
+    session = state.get_session(user.get_name(), req.session_id)
+    return await _compute_multi_criteria(req, method_service, population, facilities, session, db)
+
+@ROUTER.post("/grid/job")
+async def decision_support_job_api(
+        req: MultiCriteriaRequest,
+        method_service: Annotated[IMethodService, Depends(get_method_service)],
+        population: Annotated[PopulationStore, Depends(get_population_store)],
+        facilities: Annotated[FacilityStore, Depends(get_facility_store)],
+        state: Annotated[SessionStorage, Depends(get_state)],
+        user: Annotated[User, Depends(get_current_user)],
+        jobs: Annotated[JobManager, Depends(get_job_manager)],
+    ):
+    """Starts the multi-criteria decision support (see "/grid") as background job.
+
+    Note:
+        - progress and result can be polled through "/v1/jobs/{job_id}"
+        - results and parameters are stored in the session state once the job finished
+    """
+    session = state.get_session(user.get_name(), req.session_id)
+    async def run(job: Job):
+        # the request scoped db session is closed once this endpoint returns
+        async with create_db_session() as db:
+            return await _compute_multi_criteria(req, method_service, population, facilities, session, db, job.set_progress)
+    job = jobs.submit(user.get_name(), req.session_id, run)
+    return job.to_dict()
 
 class Analysis1Request(BaseModel):
     session_id: str
@@ -118,7 +204,7 @@ async def stat_1_api(
     """
     # get session state
     session = state.get_session(user.get_name(), req.session_id)
-    access: dict[str, list[float]] = session["accessibilities"]
+    access: dict[str, np.ndarray] = session["accessibilities"]
     population: list[int]
     _, population = session["population"]
     # compute statistics
@@ -128,11 +214,7 @@ async def stat_1_api(
         if key in ["population", "multiCriteria"]:
             continue
         facility_count += 1
-        values = access[key]
-        for i in range(len(population)):
-            if values[i] == -9999:
-                continue
-            amount[i] += 1
+        amount += np.asarray(access[key]) != NO_DATA_VALUE
     df = pd.DataFrame({"amount": amount, "population": population})
     group = df.groupby('amount')
     agg = group.aggregate({'population': 'sum'})
@@ -171,8 +253,8 @@ async def stat_2_api(
     """
     # get session state
     session = state.get_session(user.get_name(), req.session_id)
-    access: dict[str, list[float]] = session["accessibilities"]
-    values: list[float] = access[req.facility]
+    access: dict[str, np.ndarray] = session["accessibilities"]
+    values = np.asarray(access[req.facility])
     population: list[int]
     _, population = session["population"]
     infras: dict[str, Infrastructure] = session["infrastructures"]
@@ -180,15 +262,12 @@ async def stat_2_api(
     # compute statistics
     decay = get_dummy_decay(infra.decay)
     cutoff_points = [decay.get_distance_weight(int(i)) - 0.0001 for i in infra.cutoffs]
-    quality = np.zeros((len(values,)), dtype=np.int32)
-    for i in range(len(values)):
-        quality[i] = len(infra.cutoffs)
-        if values[i] == -9999:
-            continue
-        for j, p in enumerate(cutoff_points):
-            if values[i] >= p:
-                quality[i] = j
-                break
+    quality = np.full((len(values,)), len(infra.cutoffs), dtype=np.int32)
+    assigned = values == NO_DATA_VALUE
+    for j, p in enumerate(cutoff_points):
+        hit = ~assigned & (values >= p)
+        quality[hit] = j
+        assigned |= hit
     df = pd.DataFrame({"quality": quality, "population": population})
     group = df.groupby('quality')
     agg = group.aggregate({'population': 'sum'})
@@ -225,10 +304,10 @@ async def stat_3_api(
     """
     # get session state
     session = state.get_session(user.get_name(), req.session_id)
-    counts: dict[str, list[int]] = session["counts"]
+    counts: dict[str, np.ndarray] = session["counts"]
     population: list[int]
     _, population = session["population"]
-    values: list[int] = counts[req.facility]
+    values = counts[req.facility]
     # compute statistics
     df = pd.DataFrame({"counts": values, "population": population})
     group = df.groupby('counts')
@@ -264,20 +343,14 @@ async def hotspot_api(
     """
     # get session state
     session = state.get_session(user.get_name(), req.session_id)
-    access: dict[str, list[float]] = session["accessibilities"]
-    multi: list[float] = access["multiCriteria"]
+    access: dict[str, np.ndarray] = session["accessibilities"]
+    multi = np.asarray(access["multiCriteria"])
     population: list[int]
     _, population = session["population"]
     # compute statistics
-    xs = []
-    ys = []
-    for i in range(len(population)):
-        x = population[i]
-        y = multi[i]
-        if y == -9999:
-            continue
-        xs.append(x)
-        ys.append(y)
+    valid = multi != NO_DATA_VALUE
+    xs = np.asarray(population)[valid].tolist()
+    ys = multi[valid].tolist()
     # create plotly plot
     fig = go.Figure()
     fig.add_scatter(x=xs, y=ys, mode='markers')
@@ -302,6 +375,7 @@ class FeaturesRequest(BaseModel):
 @ROUTER.post("/features")
 async def scenario_features_api(
         req: FeaturesRequest,
+        facilities: Annotated[FacilityStore, Depends(get_facility_store)],
         user: Annotated[User, Depends(get_current_user)],
         db: Annotated[AsyncSession, Depends(get_db_session)],
     ):
@@ -309,10 +383,11 @@ async def scenario_features_api(
     """
     query = get_query_from_extent(req.envelop)
 
+    facility_queries = {name: (param.facility_type, get_buffered_query(query, req.travel_mode, param.distance_decay)) for name, param in req.infrastructures.items()}
+    facility_data = await facilities.get_facilities(db, facility_queries)
     data = {}
     for name, param in req.infrastructures.items():
-        buffer_query = get_buffered_query(query, req.travel_mode, param.distance_decay)
-        facility_points, facility_weights = await get_facility(db, param.facility_type, buffer_query)
+        facility_points, facility_weights = facility_data[name]
         features = []
         for p, w in zip(facility_points, facility_weights):
             features.append({
@@ -365,20 +440,32 @@ async def scenario_api(
         facility_points = param.facility_locations
         infrastructures[name] = Infrastructure(param.infrastructure_weight, param.distance_decay, param.cutoff_points, facility_points, [])
 
-    accessibilities, _ = await method_service.calcMultiCriteria(population_locations, population_weights, infrastructures, req.travel_mode)
-
-    features: list = []
-    for p in population_weights:
-        features.append({
-            "population": p
-        })
-    for name, array in accessibilities.items():
-        for i, v in enumerate(array):
-            feature = features[i]
-            access: float = float(array[i])
-            feature[name] = access
+    # update the last scenario incrementally using the session matrix
+    # (only facility locations not contained in the matrix are routed),
+    # without matrix only infrastructures with changed facility locations are recomputed
+    travel_mode, matrix = session["matrix"]
+    states: dict[str, InfrastructureState] = session["scenario"]
+    result = None
+    if matrix is not None and travel_mode == req.travel_mode and get_matrix_range(infrastructures) <= matrix.get_max_range():
+        missing = matrix.get_missing_locations(get_matrix_locations(infrastructures))
+        if len(missing) > 0:
+            extension = await method_service.calcMatrix(population_locations, missing, matrix.get_max_range(), req.travel_mode)
+            if extension is not None:
+                matrix = matrix.extend(extension)
+                session["matrix"] = (travel_mode, matrix)
+        result = update_multi_criteria_from_matrix(matrix, infrastructures, states)
+    if result is None:
+        if travel_mode != req.travel_mode:
+            # previous results (and the matrix) belong to another travel-mode
+            states = {}
+            session["matrix"] = (req.travel_mode, None)
+        accessibilities, states = await _update_multi_criteria(method_service, population_locations, population_weights, infrastructures, states, req.travel_mode)
+    else:
+        accessibilities, _, states = result
+    session["scenario"] = states
+    session.commit()
 
-    return features
+    return _build_features(population_weights, accessibilities)
 
 class InfrastructureParams3(BaseModel):
     max_range: int
@@ -392,6 +479,28 @@ class OptimizationRequest(BaseModel):
     # travel parameters
     travel_mode: str
 
+async def _compute_optimization(
+        req: OptimizationRequest,
+        method_service: IMethodService,
+        session: Session,
+        progress: Callable[[float], None] | None = None,
+    ) -> dict:
+    population_locations: list[tuple[float, float]]
+    population_weights: list[int]
+    population_locations, population_weights = session["population"]
+
+    result = {}
+    for i, (name, param) in enumerate(req.infrastructures.items()):
+        r = await method_service.calcSetCoverage(population_locations, population_weights, param.facility_locations, param.max_range, param.coverage_target, req.travel_mode)
+        result[name] = r
+        if progress is not None:
+            progress((i + 1) / len(req.infrastructures))
+
+    session["optimization"] = result
+    session.commit()
+
+    return result
+
 @ROUTER.post("/optimization")
 async def scenario_optimization_api(
         req: OptimizationRequest,
@@ -403,13 +512,23 @@ async def scenario_optimization_api(
     """
     # get session state
     session = state.get_session(user.get_name(), req.session_id)
-    population_locations: list[tuple[float, float]]
-    population_weights: list[int]
-    population_locations, population_weights = session["population"]
+    return await _compute_optimization(req, method_service, session)
 
-    result = {}
-    for name, param in req.infrastructures.items():
-        r = await method_service.calcSetCoverage(population_locations, population_weights, param.facility_locations, param.max_range, param.coverage_target, req.travel_mode)
-        result[name] = r
+@ROUTER.post("/optimization/job")
+async def scenario_optimization_job_api(
+        req: OptimizationRequest,
+        method_service: Annotated[IMethodService, Depends(get_method_service)],
+        state: Annotated[SessionStorage, Depends(get_state)],
+        user: Annotated[User, Depends(get_current_user)],
+        jobs: Annotated[JobManager, Depends(get_job_manager)],
+    ):
+    """Starts the set-coverage optimization (see "/optimization") as background job.
 
-    return result
+    Note:
+        - progress and result can be polled through "/v1/jobs/{job_id}"
+    """
+    session = state.get_session(user.get_name(), req.session_id)
+    async def run(job: Job):
+        return await _compute_optimization(req, method_service, session, job.set_progress)
+    job = jobs.submit(user.get_name(), req.session_id, run)
+    return job.to_dict()
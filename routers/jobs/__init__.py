@@ -0,0 +1,6 @@
+# Copyright (C) 2023 Authors of the MCDA project - All Rights Reserved
+
+"""API-routers for polling and cancelling background jobs.
+"""
+
+from .api import ROUTER as router
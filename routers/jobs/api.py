@@ -0,0 +1,62 @@
+# Copyright (C) 2023 Authors of the MCDA project - All Rights Reserved
+
+"""Module containing the actual endpoints.
+"""
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Annotated
+
+from filters.user import get_current_user, User
+from services.jobs import Job, JobManager, get_job_manager
+
+ROUTER = APIRouter()
+
+def _get_job(jobs: JobManager, user: User, job_id: str) -> Job:
+    job = jobs.get_job(user.get_name(), job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return job
+
+@ROUTER.get("/{job_id}")
+async def get_job_status(
+        job_id: str,
+        jobs: Annotated[JobManager, Depends(get_job_manager)],
+        user: Annotated[User, Depends(get_current_user)],
+    ):
+    """Returns the status of a job:
+    ```json
+    {
+        "job_id": "job-id",
+        "status": "pending" | "running" | "finished" | "failed" | "cancelled",
+        "progress": 0.5,
+        "error": null
+    }
+    ```
+    """
+    job = _get_job(jobs, user, job_id)
+    return job.to_dict()
+
+@ROUTER.get("/{job_id}/result")
+async def get_job_result(
+        job_id: str,
+        jobs: Annotated[JobManager, Depends(get_job_manager)],
+        user: Annotated[User, Depends(get_current_user)],
+    ):
+    """Returns the result of a finished job (same format as the synchronous endpoint the job was submitted for).
+    """
+    job = _get_job(jobs, user, job_id)
+    if job.status != "finished":
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Job is {job.status}")
+    return job.result
+
+@ROUTER.post("/{job_id}/cancel")
+async def cancel_job(
+        job_id: str,
+        jobs: Annotated[JobManager, Depends(get_job_manager)],
+        user: Annotated[User, Depends(get_current_user)],
+    ):
+    """Cancels a pending or running job and returns its status.
+    """
+    job = _get_job(jobs, user, job_id)
+    jobs.cancel_job(user.get_name(), job_id)
+    return job.to_dict()
@@ -5,15 +5,19 @@
 
 from fastapi import APIRouter, Depends
 from pydantic import BaseModel
-from typing import Annotated
+from typing import Annotated, Callable
+import numpy as np
+
+import config
 
-from functions.population import get_population_values
-from functions.physicians import get_physicians
 from functions.planning_areas import get_planning_area
 from functions.travel_modes import get_distance_decay, is_valid_travel_mode, get_default_travel_mode
 from filters.user import get_current_user, User
 from services.method import get_method_service, IMethodService, Infrastructure
-from services.database import AsyncSession, get_db_session
+from services.database import AsyncSession, get_db_session, create_db_session
+from services.jobs import Job, JobManager, get_job_manager
+from services.population import PopulationStore, get_population_store, get_auto_resolution, POPULATION_RESOLUTIONS
+from services.physician import PhysicianStore, get_physician_store
 
 ROUTER = APIRouter()
 
@@ -28,35 +32,43 @@ class SpatialAccessRequest(BaseModel):
     population_type: str
     population_grid_indices: list[int]
     population_indizes: list[str] | None
+    # cell size of the population used for routing (100, 250, 500 or 1000), picked from the size of the planning area if not set
+    # (the resolution actually used is returned as "resolution")
+    population_resolution: int | None = None
     #routing parameters
     travel_mode: str
     decay_type: str
 
-@ROUTER.post("/grid")
-async def spatial_access_api(
+async def _compute_spatial_access(
         req: SpatialAccessRequest,
-        method_service: Annotated[IMethodService, Depends(get_method_service)],
-        user: Annotated[User, Depends(get_current_user)],
-        db: Annotated[AsyncSession, Depends(get_db_session)],
-    ):
-    """Computes the 2sfca accessibility.
-    """
+        method_service: IMethodService,
+        population: PopulationStore,
+        physicians: PhysicianStore,
+        db: AsyncSession,
+        progress: Callable[[float], None] | None = None,
+    ) -> dict:
     query = await get_planning_area(db, req.planning_area)
     if query is None:
         return {"error": "invalid request"}
-    buffer_query = query.buffer(0.2)
+    buffer_query = query.buffer(config.PLANNING_AREA_BUFFER)
 
+    # routing is done from aggregated population cells, results are mapped back to the requested cells
+    resolution = req.population_resolution
+    if resolution is None:
+        resolution = get_auto_resolution(query)
+    elif resolution not in POPULATION_RESOLUTIONS:
+        return {"error": "invalid request"}
     if req.population_indizes is None or req.population_type is None:
-        population_locations, population_weights = await get_population_values(db, query=buffer_query, indices=req.population_grid_indices)
+        population_locations, population_weights, mapping, resolution = await population.get_aggregated_population_values(db, query=buffer_query, indices=req.population_grid_indices, resolution=resolution, planning_area=req.planning_area, buffered=True)
     else:
-        population_locations, population_weights = await get_population_values(db, query=buffer_query, indices=req.population_grid_indices, typ=req.population_type, age_groups=req.population_indizes)
-    facility_points, facility_weights = await get_physicians(db, buffer_query, req.facility_type, req.facility_capacity)
+        population_locations, population_weights, mapping, resolution = await population.get_aggregated_population_values(db, query=buffer_query, indices=req.population_grid_indices, typ=req.population_type, age_groups=req.population_indizes, resolution=resolution, planning_area=req.planning_area, buffered=True)
+    facility_points, facility_weights = await physicians.get_physicians(db, buffer_query, req.facility_type, req.facility_capacity, req.planning_area, True)
     distance_decay = get_distance_decay(req.travel_mode, req.decay_type, req.supply_level, req.facility_type)
     travel_mode = req.travel_mode
     if not is_valid_travel_mode(travel_mode):
         travel_mode = get_default_travel_mode()
 
-    accessibilities = await method_service.calcFCA(population_locations, population_weights, facility_points, facility_weights, distance_decay, travel_mode)
+    accessibilities = (await method_service.calcFCA(population_locations, population_weights, facility_points, facility_weights, distance_decay, travel_mode))[mapping]
 
     features: list = []
     min_val = 1000000000
@@ -72,4 +84,40 @@ async def spatial_access_api(
             "accessibility": access,
         })
 
-    return {"features": features, "min": min_val, "max": max_val}
+    if progress is not None:
+        progress(1)
+
+    return {"features": features, "min": min_val, "max": max_val, "resolution": resolution}
+
+@ROUTER.post("/grid")
+async def spatial_access_api(
+        req: SpatialAccessRequest,
+        method_service: Annotated[IMethodService, Depends(get_method_service)],
+        population: Annotated[PopulationStore, Depends(get_population_store)],
+        physicians: Annotated[PhysicianStore, Depends(get_physician_store)],
+        user: Annotated[User, Depends(get_current_user)],
+        db: Annotated[AsyncSession, Depends(get_db_session)],
+    ):
+    """Computes the 2sfca accessibility.
+    """
+    return await _compute_spatial_access(req, method_service, population, physicians, db)
+
+@ROUTER.post("/grid/job")
+async def spatial_access_job_api(
+        req: SpatialAccessRequest,
+        method_service: Annotated[IMethodService, Depends(get_method_service)],
+        population: Annotated[PopulationStore, Depends(get_population_store)],
+        physicians: Annotated[PhysicianStore, Depends(get_physician_store)],
+        user: Annotated[User, Depends(get_current_user)],
+        jobs: Annotated[JobManager, Depends(get_job_manager)],
+    ):
+    """Starts the 2sfca accessibility (see "/grid") as background job.
+
+    Note:
+        - progress and result can be polled through "/v1/jobs/{job_id}"
+    """
+    async def run(job: Job):
+        async with create_db_session() as db:
+            return await _compute_spatial_access(req, method_service, population, physicians, db, job.set_progress)
+    job = jobs.submit(user.get_name(), None, run)
+    return job.to_dict()
@@ -4,22 +4,57 @@
 """
 
 from typing import Annotated
-from fastapi import APIRouter, Request, HTTPException, Depends
+from fastapi import APIRouter, Request, Response, HTTPException, Depends, status
 
 from functions.travel_modes import get_default_timezones
-from functions.population import get_available_population
-from functions.facilities import get_available_facilities
-from functions.physicians import get_available_physicians
-from functions.planning_areas import get_available_supply_levels, get_available_planning_areas
 from filters.user import get_current_user, User
 from services.database import AsyncSession, get_db_session
+from services.method import ResultCache, get_result_cache
+from services.catalog import Catalog, get_catalog
+import config
 
 ROUTER = APIRouter()
 
+def _accepts_gzip(accept_encoding: str) -> bool:
+    """Checks whether gzip is acceptable according to the Accept-Encoding header (respecting q-values, e.g. "gzip;q=0").
+    """
+    qualities = {}
+    for item in accept_encoding.split(","):
+        coding, *params = [part.strip() for part in item.split(";")]
+        if coding == "":
+            continue
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding.lower()] = quality
+    return qualities.get("gzip", qualities.get("*", 0.0)) > 0
+
+async def _get_catalog_response(req: Request, catalog: Catalog, name: str) -> Response:
+    """Serves a catalog with etag (responds with "304 Not Modified" if the client already has the current version).
+    """
+    await catalog.refresh()
+    entry = catalog.get(name)
+    use_gzip = _accepts_gzip(req.headers.get("Accept-Encoding", ""))
+    etag = entry.gzip_etag if use_gzip else entry.etag
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache", "Vary": "Accept-Encoding"}
+    if_none_match = req.headers.get("If-None-Match")
+    if if_none_match is not None and etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    if use_gzip:
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=entry.gzip_body, media_type="application/json", headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
 @ROUTER.get("/facilities")
 async def get_facilities(
+        req: Request,
         user: Annotated[User, Depends(get_current_user)],
-        db: Annotated[AsyncSession, Depends(get_db_session)],
+        catalog: Annotated[Catalog, Depends(get_catalog)],
     ):
     """Returns all available facilities:
     ```json
@@ -42,12 +77,13 @@ async def get_facilities(
     }
     ```
     """
-    return await get_available_facilities(db)
+    return await _get_catalog_response(req, catalog, "facilities")
 
 @ROUTER.get("/population")
 async def get_population(
+        req: Request,
         user: Annotated[User, Depends(get_current_user)],
-        db: Annotated[AsyncSession, Depends(get_db_session)],
+        catalog: Annotated[Catalog, Depends(get_catalog)],
     ):
     """Returns all available population parameters:
     ```json
@@ -67,7 +103,7 @@ async def get_population(
     }
     ```
     """
-    return await get_available_population(db)
+    return await _get_catalog_response(req, catalog, "population")
 
 @ROUTER.post("/time_zones")
 async def get_time_zones(
@@ -104,8 +140,9 @@ async def get_time_zones(
 
 @ROUTER.get("/supply_levels")
 async def get_supply_levels(
+        req: Request,
         user: Annotated[User, Depends(get_current_user)],
-        db: Annotated[AsyncSession, Depends(get_db_session)],
+        catalog: Annotated[Catalog, Depends(get_catalog)],
     ):
     """Returns all available supply-levels
     ```json
@@ -116,12 +153,13 @@ async def get_supply_levels(
     }
     ```
     """
-    return await get_available_supply_levels(db)
+    return await _get_catalog_response(req, catalog, "supply_levels")
 
 @ROUTER.get("/planning_areas")
 async def get_planning_areas(
+        req: Request,
         user: Annotated[User, Depends(get_current_user)],
-        db: Annotated[AsyncSession, Depends(get_db_session)],
+        catalog: Annotated[Catalog, Depends(get_catalog)],
     ):
     """Returns all available planning-areas per supply-level
     ```json
@@ -134,12 +172,13 @@ async def get_planning_areas(
     }
     ```
     """
-    return await get_available_planning_areas(db)
+    return await _get_catalog_response(req, catalog, "planning_areas")
 
 @ROUTER.get("/physicians")
 async def get_physicians(
+        req: Request,
         user: Annotated[User, Depends(get_current_user)],
-        db: Annotated[AsyncSession, Depends(get_db_session)],
+        catalog: Annotated[Catalog, Depends(get_catalog)],
     ):
     """Returns all available physicians per supply-level
     ```json
@@ -152,30 +191,63 @@ async def get_physicians(
     }
     ```
     """
-    return await get_available_physicians(db)
+    return await _get_catalog_response(req, catalog, "physicians")
 
 @ROUTER.get("/ui_settings")
 async def get_ui_settings(user: Annotated[User, Depends(get_current_user)]):
-    return {
-        "storeParameters": False,
-        "loadParameters": False
-    }
+    return config.UI_SETTINGS
 
 @ROUTER.get("/analysis_settings")
 async def get_analysis_settings(user: Annotated[User, Depends(get_current_user)]):
-    return {
-        "statistics": {
-            "a": True,
-            "b": True,
-            "c": True
-        },
-        "hotspot": True,
-        "scenario": True
-    }
+    return config.ANALYSIS_SETTINGS
 
 @ROUTER.get("/range_limits")
 async def get_range_limits(user: Annotated[User, Depends(get_current_user)]):
-    return {
-        "min": 0,
-        "max": 70
+    return config.RANGE_LIMITS
+
+@ROUTER.get("/bootstrap")
+async def get_bootstrap(
+        req: Request,
+        user: Annotated[User, Depends(get_current_user)],
+        catalog: Annotated[Catalog, Depends(get_catalog)],
+    ):
+    """Returns all catalogs and settings needed by the frontend at once
+    ```json
+    {
+        "facilities": {...},
+        "population": {...},
+        "supply_levels": {...},
+        "planning_areas": {...},
+        "physicians": {...},
+        "ui_settings": {...},
+        "analysis_settings": {...},
+        "range_limits": {...}
+    }
+    ```
+
+    Note:
+        - same content as the single endpoints (precomputed, gzip-compressed if accepted by the client)
+        - supports conditional requests through "If-None-Match"
+    """
+    return await _get_catalog_response(req, catalog, "bootstrap")
+
+@ROUTER.get("/cache_stats")
+async def get_cache_stats(
+        user: Annotated[User, Depends(get_current_user)],
+        cache: Annotated[ResultCache, Depends(get_result_cache)],
+    ):
+    """Returns statistics of the accessibility result cache (admin only)
+    ```json
+    {
+        "entries": 12,
+        "bytes": 1234567,
+        "max_bytes": 536870912,
+        "hits": 34,
+        "misses": 12,
+        "evictions": 0
     }
+    ```
+    """
+    if user.get_group() != "admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not allowed")
+    return cache.get_stats()
@@ -0,0 +1,181 @@
+# Copyright (C) 2023 Authors of the MCDA project - All Rights Reserved
+
+"""Local stand-in for the OAS to test the OAS client without a running OAS instance.
+
+Results are computed from straight-line distances and are only meant to have the right shape.
+
+Supports the binary transport of the OAS client (packed request arrays, arrow responses).
+
+Usage:
+    python scripts/oas_dummy_server.py [port]
+    (set ACCESSIBILITYSERVICE_URL in config.py to "http://localhost:<port>")
+
+Additional "/test/..." endpoints simulate failures of the OAS (used by the client tests).
+"""
+
+from fastapi import FastAPI, Request
+from fastapi.responses import Response
+from fastapi.middleware.gzip import GZipMiddleware
+import asyncio
+import base64
+import gzip
+import json
+import sys
+import numpy as np
+import pyarrow as pa
+import uvicorn
+
+NO_DATA_VALUE = -9999
+# rough travel-time (in seconds) per degree
+SECONDS_PER_DEGREE = 60 * 90
+
+app = FastAPI()
+app.add_middleware(GZipMiddleware, minimum_size=1000)
+
+def _unpack_arrays(body):
+    if isinstance(body, dict) and "dtype" in body and "data" in body:
+        return np.frombuffer(base64.b64decode(body["data"]), dtype=body["dtype"]).reshape(body["shape"]).tolist()
+    if isinstance(body, dict):
+        return {key: _unpack_arrays(value) for key, value in body.items()}
+    return body
+
+async def _read_body(request: Request) -> dict:
+    data = await request.body()
+    if request.headers.get("Content-Encoding") == "gzip":
+        data = gzip.decompress(data)
+    body = json.loads(data)
+    if request.headers.get("Content-Type") == "application/vnd.oas.packed+json":
+        body = _unpack_arrays(body)
+    return body
+
+def _flatten(result: dict, prefix: str = "") -> dict:
+    columns = {}
+    for key, value in result.items():
+        if isinstance(value, dict):
+            columns.update(_flatten(value, f"{prefix}{key}."))
+        else:
+            columns[prefix + key] = np.asarray(value, dtype=np.float64)
+    return columns
+
+def _respond(request: Request, result: dict):
+    if "application/vnd.apache.arrow.stream" not in request.headers.get("Accept", ""):
+        return result
+    table = pa.table(_flatten(result))
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return Response(content=sink.getvalue().to_pybytes(), media_type="application/vnd.apache.arrow.stream")
+
+def _get_times(demand: list, supply: list) -> np.ndarray:
+    dem = np.asarray(demand, dtype=np.float64).reshape(-1, 2)
+    sup = np.asarray(supply, dtype=np.float64).reshape(-1, 2)
+    dist = np.sqrt(((dem[:, None, :] - sup[None, :, :]) ** 2).sum(axis=2))
+    return dist * SECONDS_PER_DEGREE
+
+def _get_max_range(decay: dict) -> float:
+    if "max_range" in decay:
+        return float(decay["max_range"])
+    if "ranges" in decay:
+        return float(max(decay["ranges"]))
+    return 1800.0
+
+def _calc_access(demand: list, supply: list, supply_weights: list, decay: dict) -> np.ndarray:
+    times = _get_times(demand, supply)
+    max_range = _get_max_range(decay)
+    weights = np.where(times <= max_range, 1 - times / max_range, 0)
+    access = (weights * np.asarray(supply_weights, dtype=np.float64)[None, :]).sum(axis=1)
+    access[weights.sum(axis=1) == 0] = NO_DATA_VALUE
+    return access
+
+@app.post("/v1/accessibility/enhanced_2sfca")
+async def enhanced_2sfca(request: Request):
+    body = await _read_body(request)
+    access = _calc_access(body["demand"]["demand_locations"], body["supply"]["supply_locations"], body["supply"]["supply_weights"], body["distance_decay"])
+    return _respond(request, {"access": access.tolist()})
+
+@app.post("/v1/accessibility/reachability")
+async def reachability(request: Request):
+    body = await _read_body(request)
+    access = _calc_access(body["demand"]["demand_locations"], body["supply"]["supply_locations"], body["supply"]["supply_weights"], body["distance_decay"])
+    return _respond(request, {"access": access.tolist()})
+
+@app.post("/v1/multicriteria/multi")
+async def multi_criteria(request: Request):
+    body = await _read_body(request)
+    demand = body["demand"]["demand_locations"]
+    result = {}
+    multi = np.zeros((len(demand),), dtype=np.float64)
+    for name, infra in body["infrastructures"].items():
+        access = _calc_access(demand, infra["supply"]["supply_locations"], [1] * len(infra["supply"]["supply_locations"]), infra["decay"])
+        result[name] = access.tolist()
+        multi += np.where(access == NO_DATA_VALUE, 0, access) * infra["infrastructure_weight"]
+    return _respond(request, {"access": {"multiCriteria": multi.tolist(), **result}})
+
+@app.post("/v1/queries/aggregate")
+async def aggregate_query(request: Request):
+    body = await _read_body(request)
+    times = _get_times(body["demand"]["demand_locations"], body["supply"]["supply_locations"])
+    reached = times <= float(body["range"])
+    weights = np.asarray(body["supply"]["supply_weights"], dtype=np.float64)[None, :]
+    return _respond(request, {"result": (reached * weights).sum(axis=1).tolist()})
+
+@app.post("/v1/queries/n_nearest")
+async def n_nearest_query(request: Request):
+    body = await _read_body(request)
+    times = _get_times(body["demand"]["demand_locations"], body["supply"]["supply_locations"])
+    count = min(int(body["facility_count"]), times.shape[1])
+    nearest = np.sort(times, axis=1)[:, :count]
+    return _respond(request, {"result": nearest.mean(axis=1).tolist()})
+
+# number of requests received per "/test/..." path
+_TEST_CALLS: dict[str, int] = {}
+
+def _count_call(request: Request) -> int:
+    count = _TEST_CALLS.get(request.url.path, 0) + 1
+    _TEST_CALLS[request.url.path] = count
+    return count
+
+@app.post("/test/echo")
+async def echo(request: Request):
+    """Returns the (decoded) request body together with the received content-encoding.
+    """
+    body = await _read_body(request)
+    return _respond(request, {"body": body, "content_encoding": request.headers.get("Content-Encoding")})
+
+@app.post("/test/fail/{status}/{times}/{key}")
+async def fail(request: Request, status: int, times: int, key: str):
+    """Fails the first "times" requests (per key) with the given status, later requests are echoed.
+    """
+    count = _count_call(request)
+    if count <= times:
+        return Response(status_code=status)
+    body = await _read_body(request)
+    return _respond(request, {"body": body, "calls": count})
+
+@app.post("/test/no-gzip/{key}")
+async def no_gzip(request: Request, key: str):
+    """Rejects gzip-compressed requests (415) like an OAS without request decompression, other requests are echoed.
+    """
+    count = _count_call(request)
+    if request.headers.get("Content-Encoding") == "gzip":
+        return Response(status_code=415)
+    body = await _read_body(request)
+    return _respond(request, {"body": body, "calls": count})
+
+@app.post("/test/delay/{seconds}")
+async def delay(request: Request, seconds: float):
+    """Waits before echoing the request body.
+    """
+    await asyncio.sleep(seconds)
+    body = await _read_body(request)
+    return _respond(request, {"body": body})
+
+@app.get("/test/calls")
+async def calls():
+    """Returns the number of requests received per "/test/..." path.
+    """
+    return _TEST_CALLS
+
+if __name__ == '__main__':
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 5001
+    uvicorn.run(app, host="localhost", port=port)
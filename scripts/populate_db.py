@@ -6,15 +6,18 @@ import os
 import string
 import random
 import hashlib
+import numpy as np
 from sqlalchemy.orm import Session
-from sqlalchemy import insert, delete, Column, Integer, String, Float
+from sqlalchemy import insert, delete, select, func, literal, exists, text, Column, Integer, String, Float
 from geoalchemy2 import Geometry
-from geoalchemy2.shape import from_shape
+from geoalchemy2.shape import from_shape, to_shape
 
 import sys
 sys.path.append("./")
 
+import config
 from models import ENGINE, get_table, create_table
+from services.population.raster import RasterGeometry, write_population_raster, write_population_pyramid, write_planning_area_mask, remove_planning_area_masks
 
 POPULATION_FILE = "./files/population.csv"
 FACILITY_DIR = "./files/facilities"
@@ -64,9 +67,12 @@ def insertPlanningAreas() -> None:
     area_table = get_table("planning_areas")
     if area_table is None:
         return
+    # members and masks refer to the previous planning areas ("insertPlanningAreaMembers" and "writePlanningAreaMasks" have to be rerun)
+    remove_planning_area_masks(config.POPULATION_RASTER_DIR)
     with Session(ENGINE) as session:
         stmt = delete(area_table).where()
         session.execute(stmt)
+        clearPlanningAreaMembers(session)
         for file in os.listdir(PLANNING_AREAS_DIR):
             if not os.path.isfile(os.path.join(PLANNING_AREAS_DIR, file)):
                 continue
@@ -88,8 +94,32 @@ def insertPlanningAreas() -> None:
                     level_ids = mapping[name]["supply_levels"]
                     stmt = insert(area_table).values(name=name, i18n_key=i18n_key, supply_level_ids=level_ids, geometry=from_shape(polygon))
                     session.execute(stmt)
+        # subdivided parts of the raw and buffered planning areas (used by containment queries)
+        part_table = get_table("planning_area_parts")
+        if part_table is not None:
+            stmt = delete(part_table).where()
+            session.execute(stmt)
+            for buffered in [False, True]:
+                geometry = area_table.c.geometry
+                if buffered:
+                    geometry = func.ST_Buffer(geometry, config.PLANNING_AREA_BUFFER)
+                parts = select(area_table.c.name, literal(buffered), func.ST_Subdivide(geometry, config.PLANNING_AREA_SUBDIVIDE_VERTICES))
+                stmt = insert(part_table).from_select(["name", "buffered", "geometry"], parts)
+                session.execute(stmt)
         session.commit()
 
+def clearPlanningAreaMembers(session: Session) -> None:
+    """Deletes the precomputed members of all planning areas (they refer to pids of the population and physician tables).
+
+    Has to be called whenever planning areas, population or physicians are reinserted, "insertPlanningAreaMembers" has to be rerun afterwards.
+    Running servers keep the members loaded at startup (see "PopulationStore" and "PhysicianStore"), they have to be restarted.
+    """
+    member_table = get_table("planning_area_members")
+    if member_table is None:
+        return
+    stmt = delete(member_table).where()
+    session.execute(stmt)
+
 def insertPhysicians() -> None:
     loc_table = get_table("physicians_locations")
     if loc_table is None:
@@ -97,6 +127,7 @@ def insertPhysicians() -> None:
     with Session(ENGINE) as session:
         stmt = delete(loc_table).where()
         session.execute(stmt)
+        clearPlanningAreaMembers(session)
         # load physicians data
         with open(SPATIAL_ACCESS_DIR + "/outpatient_physician_location_specialist_count.geojson", "r") as file:
             data = json.loads(file.read())
@@ -224,6 +255,7 @@ def insertPopulation() -> None:
     with Session(ENGINE) as session:
         stmt = delete(list_table).where()
         session.execute(stmt)
+        clearPlanningAreaMembers(session)
         for group in populations:
             meta_table_name = f"population_{group}_meta"
             table_name = f"population_{group}"
@@ -301,6 +333,20 @@ def insertPopulation() -> None:
                     attr[key] = int(float(token))
             population_data.append(attr)
 
+    # pids are derived from the raster cells of the population entries
+    print("writing population raster")
+    x = np.array([attr["wgs_x"] for attr in population_data])
+    y = np.array([attr["wgs_y"] for attr in population_data])
+    raster = RasterGeometry.from_locations(x, y)
+    rows, cols = raster.get_cells(x, y)
+    pids = raster.get_pids(rows, cols)
+    groups = {}
+    for group in populations:
+        groups[group] = {field: np.array([attr[field] for attr in population_data], dtype=np.int32) for field in populations[group]["items"]}
+    write_population_raster(config.POPULATION_RASTER_DIR, raster, rows, cols, groups)
+    print("writing population pyramid")
+    write_population_pyramid(config.POPULATION_RASTER_DIR)
+
     # write to tables
     print("writing tables")
     for group in populations:
@@ -312,8 +358,9 @@ def insertPopulation() -> None:
         with Session(ENGINE) as session:
             stmt = delete(pop_table).where()
             session.execute(stmt)
-            for attr in population_data:
+            for attr, pid in zip(population_data, pids.tolist()):
                 val = {
+                    "pid": pid,
                     "geometry": attr["geometry"],
                     "x": attr["wgs_x"],
                     "y": attr["wgs_y"],
@@ -326,6 +373,79 @@ def insertPopulation() -> None:
                 session.execute(stmt)
             session.commit()
 
+def writePlanningAreaMasks() -> None:
+    """Precomputes the population raster masks of all planning areas (population and planning areas have to be inserted first).
+    """
+    area_table = get_table("planning_areas")
+    if area_table is None:
+        return
+    with Session(ENGINE) as session:
+        rows = session.execute(select(area_table.c.name, area_table.c.geometry)).fetchall()
+        for row in rows:
+            polygon = to_shape(row[1])
+            write_planning_area_mask(config.POPULATION_RASTER_DIR, str(row[0]), polygon)
+
+def insertPlanningAreaMembers() -> None:
+    """Precomputes the population cells and physician locations within all (raw and buffered) planning areas.
+
+    Planning areas (including their parts), population and physicians have to be inserted first.
+    """
+    area_table = get_table("planning_areas")
+    part_table = get_table("planning_area_parts")
+    member_table = get_table("planning_area_members")
+    list_table = get_table("population_list")
+    loc_table = get_table("physicians_locations")
+    if area_table is None or part_table is None or member_table is None or list_table is None or loc_table is None:
+        return
+    with Session(ENGINE) as session:
+        stmt = delete(member_table).where()
+        session.execute(stmt)
+        pop_tables = [get_table(row[0]) for row in session.execute(select(list_table.c.table_name)).fetchall()]
+        names = [str(row[0]) for row in session.execute(select(area_table.c.name)).fetchall()]
+        for name in names:
+            for buffered in [False, True]:
+                def in_area(geometry, point):
+                    return exists().where(
+                        (part_table.c.name == name) & (part_table.c.buffered == buffered)
+                        & geometry.intersects(part_table.c.geometry) & func.ST_Intersects(part_table.c.geometry, point)
+                    )
+                # population pids are equal for all population tables (derived from the population raster)
+                population_pids = set()
+                for pop_table in pop_tables:
+                    if pop_table is None:
+                        continue
+                    centroid = func.ST_SetSRID(func.ST_MakePoint(pop_table.c.x, pop_table.c.y), 4326)
+                    rows = session.execute(select(pop_table.c.pid).where(in_area(pop_table.c.geometry, centroid))).fetchall()
+                    population_pids.update(int(row[0]) for row in rows)
+                rows = session.execute(select(loc_table.c.pid).where(in_area(loc_table.c.geometry, loc_table.c.geometry))).fetchall()
+                physician_pids = [int(row[0]) for row in rows]
+                stmt = insert(member_table).values(name=name, buffered=buffered, population_pids=sorted(population_pids), physician_pids=sorted(physician_pids))
+                session.execute(stmt)
+        session.commit()
+
+def clusterSpatialTables() -> None:
+    """Clusters all tables by their spatial index (rows of nearby geometries are stored together) and analyzes them.
+
+    Should be run after all tables have been inserted (CLUSTER locks and rewrites the whole table).
+    """
+    stmt = text("""
+        SELECT DISTINCT ON (t.relname) t.relname, i.relname
+        FROM pg_index x
+        JOIN pg_class t ON t.oid = x.indrelid
+        JOIN pg_class i ON i.oid = x.indexrelid
+        JOIN pg_am am ON am.oid = i.relam
+        JOIN pg_namespace n ON n.oid = t.relnamespace
+        WHERE am.amname = 'gist' AND n.nspname = current_schema()
+        ORDER BY t.relname, i.relname
+    """)
+    with ENGINE.connect() as conn:
+        quote = conn.dialect.identifier_preparer.quote
+        rows = conn.execute(stmt).fetchall()
+        for table_name, index_name in rows:
+            conn.execute(text(f"CLUSTER {quote(table_name)} USING {quote(index_name)}"))
+            conn.execute(text(f"ANALYZE {quote(table_name)}"))
+            conn.commit()
+
 def insertFacilityGroups() -> None:
     groups = [
         ("localSupply", "localSupply.text", 100, None),
@@ -420,6 +540,12 @@ if __name__ == "__main__":
     insertAdminUser()
     # print("start inserting Population")
     # insertPopulation()
+    # print("start writing Planning Area Masks")
+    # writePlanningAreaMasks()
+    # print("start inserting Planning Area Members")
+    # insertPlanningAreaMembers()
     # print("start inserting Facilities")
     # insertFacilityGroups()
     # insertFacilities()
+    # print("start clustering spatial tables")
+    # clusterSpatialTables()
@@ -0,0 +1,6 @@
+# Copyright (C) 2023 Authors of the MCDA project - All Rights Reserved
+
+"""Service keeping the catalogs (available facilities, population, ...) in memory.
+"""
+
+from .catalog import Catalog, CatalogEntry, init_catalog, get_catalog
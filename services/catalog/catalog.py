@@ -0,0 +1,155 @@
+# Copyright (C) 2023 Authors of the MCDA project - All Rights Reserved
+
+"""Versioned in-memory catalogs served to the frontend.
+"""
+
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import time
+from typing import Any
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import config
+from functions.population import get_available_population
+from functions.facilities import get_available_facilities
+from functions.physicians import get_available_physicians
+from functions.planning_areas import get_available_supply_levels, get_available_planning_areas
+from functions.util import get_table
+from services.database import create_db_session
+
+# tables the catalogs are built from (populate_db deletes and reinserts their rows, so new pids mark a change)
+# (the population meta tables listed in "population_list" are source tables as well)
+_SOURCE_TABLES = ["facilities_list", "facilities_groups", "population_list", "supply_level_list", "planning_areas", "physicians_list"]
+
+async def _get_signature(session: AsyncSession) -> tuple:
+    """Returns row count and maximum pid of every source table of the catalogs.
+    """
+    names = list(_SOURCE_TABLES)
+    list_table = get_table("population_list")
+    if list_table is not None:
+        rows = (await session.execute(select(list_table.c.meta_table_name).order_by(list_table.c.meta_table_name))).fetchall()
+        names.extend(str(row[0]) for row in rows if row[0] is not None)
+    signature = []
+    for name in names:
+        table = get_table(name)
+        if table is None:
+            signature.append((name, None))
+            continue
+        row = (await session.execute(select(func.count(), func.max(table.c.pid)))).one()
+        signature.append((name, *row))
+    return tuple(signature)
+
+class CatalogEntry:
+    """Catalog data together with its serialized (and gzip-compressed) json body and etags.
+
+    Note:
+        - both representations have their own etag (the gzip etag is suffixed with "-gzip")
+    """
+    data: Any
+    body: bytes
+    gzip_body: bytes
+    etag: str
+    gzip_etag: str
+
+    def __init__(self, data: Any):
+        self.data = data
+        self.body = json.dumps(jsonable_encoder(data), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+        self.gzip_body = gzip.compress(self.body, mtime=0)
+        h = hashlib.sha1()
+        h.update(str(config.DATASET_VERSION).encode())
+        h.update(self.body)
+        self.etag = f'"{h.hexdigest()}"'
+        self.gzip_etag = f'"{h.hexdigest()}-gzip"'
+
+class Catalog:
+    """Keeps the catalogs of the frontend in memory.
+
+    Note:
+        - every config.CATALOG_REFRESH_SECONDS the source tables are checked for changes (row counts and maximum pids),
+          changed catalogs are reloaded in the background while the current ones are still served
+        - etags only change if the content of a catalog (or config.DATASET_VERSION) changes
+        - "bootstrap" bundles all catalogs and the static frontend settings (config.UI_SETTINGS, ...)
+    """
+    _entries: dict[str, CatalogEntry]
+    _signature: tuple | None
+    _last_check: float
+    _reload_task: asyncio.Task | None
+
+    def __init__(self):
+        self._entries = {}
+        self._signature = None
+        self._last_check = 0
+        self._reload_task = None
+
+    async def load(self, session: AsyncSession):
+        """Loads all catalogs from the database.
+        """
+        self._last_check = time.monotonic()
+        self._signature = await _get_signature(session)
+        entries = {
+            "facilities": CatalogEntry(await get_available_facilities(session)),
+            "population": CatalogEntry(await get_available_population(session)),
+            "supply_levels": CatalogEntry(await get_available_supply_levels(session)),
+            "planning_areas": CatalogEntry(await get_available_planning_areas(session)),
+            "physicians": CatalogEntry(await get_available_physicians(session)),
+        }
+        bootstrap = {name: entry.data for name, entry in entries.items()}
+        bootstrap["ui_settings"] = config.UI_SETTINGS
+        bootstrap["analysis_settings"] = config.ANALYSIS_SETTINGS
+        bootstrap["range_limits"] = config.RANGE_LIMITS
+        entries["bootstrap"] = CatalogEntry(bootstrap)
+        self._entries = entries
+
+    async def refresh(self):
+        """Starts a background check (and reload) of the catalogs if the refresh interval has passed.
+        """
+        if self._reload_task is not None or time.monotonic() - self._last_check < config.CATALOG_REFRESH_SECONDS:
+            return
+        self._last_check = time.monotonic()
+        self._reload_task = asyncio.create_task(self._reload())
+
+    async def _reload(self):
+        try:
+            async with create_db_session() as session:
+                if await _get_signature(session) != self._signature:
+                    await self.load(session)
+                    logging.info("Reloaded catalogs")
+        except Exception:
+            logging.exception("Failed to reload catalogs")
+        finally:
+            self._reload_task = None
+
+    def get(self, name: str) -> CatalogEntry:
+        """Returns a catalog by name (e.g. "facilities", "population", "supply_levels", "planning_areas", "physicians", "bootstrap").
+        """
+        return self._entries[name]
+
+CATALOG = None
+
+async def init_catalog():
+    """Initializes the catalog by loading all catalogs from the database.
+
+    Note:
+        - has to be called after the database has been initialized
+    """
+    global CATALOG
+    catalog = Catalog()
+    async with create_db_session() as session:
+        await catalog.load(session)
+    CATALOG = catalog
+
+def get_catalog() -> Catalog:
+    """Returns the catalog singleton.
+
+    Note:
+        - This can be used as a fastapi dependency
+    """
+    global CATALOG
+    if CATALOG is None:
+        raise ValueError("This should not have happened.")
+    return CATALOG
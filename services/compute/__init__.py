@@ -0,0 +1,6 @@
+# Copyright (C) 2023 Authors of the MCDA project - All Rights Reserved
+
+"""Service for running blocking computations off the event-loop.
+"""
+
+from .executor import ComputeExecutor, get_compute_executor, init_compute_executor, shutdown_compute_executor
@@ -0,0 +1,91 @@
+# Copyright (C) 2023 Authors of the MCDA project - All Rights Reserved
+
+"""Module containing the compute executor.
+"""
+
+from typing import Any, Callable, TypeVar
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+import asyncio
+import functools
+
+import config
+from services.profile import init_profile_manager
+
+T = TypeVar("T")
+
+class ComputeExecutor:
+    """Runs blocking computations (e.g. pyaccess routines) in a thread- or process-pool.
+
+    Note:
+        - at most max_concurrent computations are submitted to the pool at once, further calls wait on the event-loop
+        - a slot is only freed once the computation inside the pool has finished (even if the caller has been cancelled)
+        - in process mode submitted functions and their arguments must be picklable
+    """
+    _pool: Executor
+    _semaphore: asyncio.Semaphore
+
+    def __init__(self, pool_type: str, max_workers: int, max_concurrent: int, initializer: Callable[[], Any] | None = None):
+        match pool_type:
+            case "thread":
+                self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="compute", initializer=initializer)
+            case "process":
+                self._pool = ProcessPoolExecutor(max_workers=max_workers, initializer=initializer)
+            case _:
+                raise ValueError(f"Invalid pool type {pool_type}.")
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+
+    def is_threaded(self) -> bool:
+        """Returns True if computations share the memory of the caller (e.g. progress callbacks can be passed).
+        """
+        return isinstance(self._pool, ThreadPoolExecutor)
+
+    async def run(self, func: Callable[..., T], *args: Any) -> T:
+        """Runs func(*args) inside the pool and waits for the result without blocking the event-loop.
+        """
+        await self._semaphore.acquire()
+        try:
+            future = self._pool.submit(functools.partial(func, *args))
+        except BaseException:
+            self._semaphore.release()
+            raise
+        loop = asyncio.get_running_loop()
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(self._semaphore.release))
+        return await asyncio.wrap_future(future)
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+EXECUTOR = None
+
+def init_compute_executor():
+    """Initializes the compute executor.
+
+    Note:
+        - process workers load their own routing profiles on startup
+        - should be called after the profile manager has been initialized
+    """
+    global EXECUTOR
+    initializer = None
+    if config.COMPUTE_POOL_TYPE == "process":
+        initializer = init_profile_manager
+    EXECUTOR = ComputeExecutor(config.COMPUTE_POOL_TYPE, config.COMPUTE_POOL_WORKERS, config.COMPUTE_MAX_CONCURRENT, initializer)
+
+def shutdown_compute_executor():
+    """Shuts down the pool of the compute executor.
+    """
+    global EXECUTOR
+    if EXECUTOR is None:
+        return
+    EXECUTOR.shutdown()
+    EXECUTOR = None
+
+def get_compute_executor() -> ComputeExecutor:
+    """Returns the compute executor singleton.
+
+    Note:
+        - This can be used as a fastapi dependency
+    """
+    global EXECUTOR
+    if EXECUTOR is None:
+        raise ValueError("This should not have happened.")
+    return EXECUTOR
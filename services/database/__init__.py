@@ -11,12 +11,16 @@ import config
 from models import META_DATA
 from models.tables import TABLE_SPECS
 from functions.util import get_table, create_table
+from .indexes import ensure_spatial_indices
 
 ENGINE = None
 SESSION_MAKER = None
 
 async def init_database():
     """Initializes the database connection and creates the tables if they don't exist.
+
+    Note:
+        - missing spatial indices of geometry tables (e.g. tables created by populate_db) are created on startup
     """
     global ENGINE
     ENGINE = create_async_engine(f"postgresql+asyncpg://{config.POSTGIS_USER}:{config.POSTGIS_PASSWORD}@{config.POSTGIS_HOST}:5432/{config.POSTGIS_DB}")
@@ -29,6 +33,19 @@ async def init_database():
         for spec in TABLE_SPECS:
             if get_table(spec["name"]) is None:
                 await create_table(session, spec["name"], spec["columns"])
+    if config.DATABASE_MANAGE_INDICES:
+        await ensure_spatial_indices(ENGINE, META_DATA)
+
+def create_db_session() -> AsyncSession:
+    """Creates a database session that has to be closed by the caller.
+
+    Note:
+        - should be used for work outliving a request (e.g. background jobs), otherwise use "get_db_session"
+    """
+    global SESSION_MAKER
+    if SESSION_MAKER is None:
+        raise ValueError("This should not have happened.")
+    return SESSION_MAKER()
 
 async def get_db_session() -> AsyncGenerator[AsyncSession, Any]:
     """Creates a database session.
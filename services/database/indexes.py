@@ -0,0 +1,58 @@
+# Copyright (C) 2023 Authors of the MCDA project - All Rights Reserved
+
+"""Management of spatial indices of the geometry tables.
+"""
+
+import logging
+from sqlalchemy import MetaData, Table, text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from geoalchemy2 import Geometry
+
+_INDEXED_COLUMNS_QUERY = text("""
+    SELECT a.attname
+    FROM pg_index x
+    JOIN pg_class t ON t.oid = x.indrelid
+    JOIN pg_class i ON i.oid = x.indexrelid
+    JOIN pg_am am ON am.oid = i.relam
+    JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = x.indkey[0]
+    WHERE t.relname = :table AND am.amname = 'gist'
+""")
+
+def _get_geometry_columns(table: Table) -> list[str]:
+    return [column.name for column in table.columns if isinstance(column.type, Geometry)]
+
+async def ensure_spatial_indices(engine: AsyncEngine, meta_data: MetaData) -> list[str]:
+    """Creates missing GIST indices on all geometry columns.
+
+    Tables getting a new index are analyzed afterwards.
+
+    Args:
+        engine: database engine (every table is fixed and committed in its own transaction)
+        meta_data: (reflected) tables
+
+    Returns:
+        names of the tables that have been fixed
+
+    Note:
+        - tables are not clustered by their indices (this rewrites the whole table), use "clusterSpatialTables" of populate_db instead
+    """
+    quote = engine.dialect.identifier_preparer.quote
+    fixed = []
+    for table in meta_data.sorted_tables:
+        columns = _get_geometry_columns(table)
+        if len(columns) == 0:
+            continue
+        async with engine.begin() as conn:
+            rows = await conn.execute(_INDEXED_COLUMNS_QUERY, {"table": table.name})
+            indexed = set(row[0] for row in rows.fetchall())
+            missing = [column for column in columns if column not in indexed]
+            if len(missing) == 0:
+                continue
+            for column in missing:
+                index_name = f"idx_{table.name}_{column}"
+                await conn.execute(text(f"CREATE INDEX IF NOT EXISTS {quote(index_name)} ON {quote(table.name)} USING GIST ({quote(column)})"))
+            await conn.execute(text(f"ANALYZE {quote(table.name)}"))
+        fixed.append(table.name)
+    if len(fixed) > 0:
+        logging.info(f"Created spatial indices for tables: {', '.join(fixed)}")
+    return fixed
@@ -0,0 +1,6 @@
+# Copyright (C) 2023 Authors of the MCDA project - All Rights Reserved
+
+"""Service keeping the facility tables in memory.
+"""
+
+from .store import FacilityStore, FacilityLocations, init_facility_store, get_facility_store
@@ -0,0 +1,168 @@
+# Copyright (C) 2023 Authors of the MCDA project - All Rights Reserved
+
+"""In-memory spatial index of the facility tables.
+"""
+
+import asyncio
+import logging
+import time
+import numpy as np
+from shapely import Polygon, STRtree, points
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from functions.util import get_table
+import config
+from functions.facilities import get_facilities
+from services.database import create_db_session
+
+class FacilityLocations:
+    """Locations and weights of a single facility table.
+
+    Note:
+        - facilities with zero weight are dropped and duplicate locations are only kept once (same as "functions.facilities.get_facility")
+    """
+    x: np.ndarray
+    y: np.ndarray
+    weights: np.ndarray
+    _tree: STRtree
+
+    def __init__(self, x: np.ndarray, y: np.ndarray, weights: np.ndarray):
+        valid = weights != 0
+        x, y, weights = x[valid], y[valid], weights[valid]
+        _, first = np.unique(np.stack([x, y], axis=1), axis=0, return_index=True)
+        first = np.sort(first)
+        self.x = x[first]
+        self.y = y[first]
+        self.weights = weights[first]
+        self._tree = STRtree(points(self.x, self.y))
+
+    def query(self, envelop: Polygon) -> np.ndarray:
+        """Returns the indices of all facilities within the envelop (in table order).
+        """
+        return np.sort(self._tree.query(envelop, predicate="contains"))
+
+class FacilityStore:
+    """Keeps all facility tables in memory to answer envelop queries without the database.
+
+    Note:
+        - every config.FACILITY_REFRESH_SECONDS the tables are checked for changes (row counts, maximum pids, weight and coordinate sums),
+          changed tables are reloaded in the background while the current ones are still served
+    """
+    _facilities: dict[str, FacilityLocations]
+    _signatures: dict[str, tuple]
+    _last_check: float
+    _reload_task: asyncio.Task | None
+
+    def __init__(self):
+        self._facilities = {}
+        self._signatures = {}
+        self._last_check = 0
+        self._reload_task = None
+
+    async def load(self, session: AsyncSession):
+        """Loads all facility tables listed in "facilities_list" (unchanged tables are skipped).
+        """
+        self._last_check = time.monotonic()
+        list_table = get_table("facilities_list")
+        if list_table is None:
+            return
+        rows = (await session.execute(select(list_table.c.name, list_table.c.table_name, list_table.c.geometry_column, list_table.c.weight_column))).fetchall()
+        names = set()
+        for name, table_name, geometry_column, weight_column in rows:
+            facility_table = get_table(table_name)
+            if facility_table is None:
+                continue
+            geometry = getattr(facility_table.c, geometry_column)
+            weight = getattr(facility_table.c, weight_column)
+            names.add(name)
+            # coordinate sums detect moved facilities
+            stmt = select(func.count(), func.max(facility_table.c.pid), func.sum(weight), func.sum(func.ST_X(geometry)), func.sum(func.ST_Y(geometry)))
+            signature = (table_name, geometry_column, weight_column, *(await session.execute(stmt)).one())
+            if self._signatures.get(name) == signature:
+                continue
+            data = (await session.execute(select(func.ST_X(geometry), func.ST_Y(geometry), weight).order_by(facility_table.c.pid))).fetchall()
+            x = np.array([row[0] for row in data], dtype=np.float64)
+            y = np.array([row[1] for row in data], dtype=np.float64)
+            # weights keep the type of the weight column
+            weights = np.array([row[2] for row in data])
+            # the spatial index is built outside of the event-loop (reloads run while requests are served)
+            self._facilities[name] = await asyncio.get_running_loop().run_in_executor(None, FacilityLocations, x, y, weights)
+            self._signatures[name] = signature
+            logging.info(f"Loaded facility {name} ({len(data)} locations)")
+        for name in list(self._facilities.keys()):
+            if name not in names:
+                del self._facilities[name]
+                del self._signatures[name]
+
+    async def refresh(self):
+        """Starts a background check (and reload) of the facility tables if the refresh interval has passed.
+        """
+        if self._reload_task is not None or time.monotonic() - self._last_check < config.FACILITY_REFRESH_SECONDS:
+            return
+        self._last_check = time.monotonic()
+        self._reload_task = asyncio.create_task(self._reload())
+
+    async def _reload(self):
+        try:
+            async with create_db_session() as session:
+                await self.load(session)
+        except Exception:
+            logging.exception("Failed to reload facilities")
+        finally:
+            self._reload_task = None
+
+    async def get_facility(self, session: AsyncSession, facility_name: str, envelop: Polygon) -> tuple[list[tuple[float, float]], list[float]]:
+        """Same as "functions.facilities.get_facility" but served from memory.
+
+        Note:
+            - falls back to the database if the facility has not been loaded
+        """
+        facilities = await self.get_facilities(session, {facility_name: (facility_name, envelop)})
+        return facilities[facility_name]
+
+    async def get_facilities(self, session: AsyncSession, queries: dict[str, tuple[str, Polygon]]) -> dict[str, tuple[list[tuple[float, float]], list[float]]]:
+        """Same as "functions.facilities.get_facilities" but served from memory.
+
+        Note:
+            - facilities that have not been loaded are fetched from the database (in a single query)
+        """
+        await self.refresh()
+        result = {}
+        missing = {}
+        for key, (facility_name, envelop) in queries.items():
+            facility = self._facilities.get(facility_name)
+            if facility is None:
+                missing[key] = (facility_name, envelop)
+                continue
+            indices = facility.query(envelop)
+            locations = list(zip(facility.x[indices].tolist(), facility.y[indices].tolist()))
+            result[key] = (locations, facility.weights[indices].tolist())
+        if len(missing) > 0:
+            result.update(await get_facilities(session, missing))
+        return result
+
+FACILITY_STORE = None
+
+async def init_facility_store():
+    """Initializes the facility store by loading all facility tables.
+
+    Note:
+        - has to be called after the database has been initialized
+    """
+    global FACILITY_STORE
+    store = FacilityStore()
+    async with create_db_session() as session:
+        await store.load(session)
+    FACILITY_STORE = store
+
+def get_facility_store() -> FacilityStore:
+    """Returns the facility store singleton.
+
+    Note:
+        - This can be used as a fastapi dependency
+    """
+    global FACILITY_STORE
+    if FACILITY_STORE is None:
+        raise ValueError("This should not have happened.")
+    return FACILITY_STORE
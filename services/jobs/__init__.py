@@ -0,0 +1,6 @@
+# Copyright (C) 2023 Authors of the MCDA project - All Rights Reserved
+
+"""Service for running long computations as background jobs.
+"""
+
+from .jobs import Job, JobCancelledError, JobManager, get_job_manager, init_job_manager
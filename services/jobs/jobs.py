@@ -0,0 +1,175 @@
+# Copyright (C) 2023 Authors of the MCDA project - All Rights Reserved
+
+"""Background job manager
+"""
+
+from __future__ import annotations
+
+import string
+import random
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable
+import asyncio
+import logging
+
+import config
+
+
+def _generate_job_id() -> str:
+    letters = string.ascii_lowercase
+    jid = ''.join(random.choice(letters) for i in range(16))
+    return jid
+
+class JobCancelledError(Exception):
+    """Raised by Job.set_progress once the job has been cancelled.
+    """
+    pass
+
+class Job:
+    """Background job.
+
+    Note:
+        - progress is in range [0, 1] and may be set from compute threads
+        - after cancellation set_progress raises JobCancelledError (stops chunked computations at the next chunk)
+        - jobs belonging to a session additionally store their results in the session state (same as the synchronous endpoints)
+    """
+    job_id: str
+    user: str
+    session_id: str | None
+    status: str
+    progress: float
+    result: Any
+    error: str | None
+    created: datetime
+    finished: datetime | None
+    _task: asyncio.Task | None
+    _cancelled: bool
+
+    def __init__(self, job_id: str, user: str, session_id: str | None):
+        self.job_id = job_id
+        self.user = user
+        self.session_id = session_id
+        self.status = "pending"
+        self.progress = 0
+        self.result = None
+        self.error = None
+        self.created = datetime.now()
+        self.finished = None
+        self._task = None
+        self._cancelled = False
+
+    def set_progress(self, progress: float):
+        if self._cancelled:
+            raise JobCancelledError()
+        self.progress = max(self.progress, min(progress, 1.0))
+
+    def is_done(self) -> bool:
+        return self.status in ["finished", "failed", "cancelled"]
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "progress": self.progress,
+            "error": self.error,
+        }
+
+class JobManager:
+    """Runs jobs in the background with a bounded number of jobs running at once.
+    """
+    _jobs: dict[str, Job]
+    _semaphore: asyncio.Semaphore
+
+    def __init__(self, max_running: int):
+        self._jobs = {}
+        self._semaphore = asyncio.Semaphore(max_running)
+
+    def periodically_clear(self, iter_seconds: int, timeout_minutes: int):
+        asyncio.create_task(self._clear_outdated_jobs(iter_seconds, timeout_minutes))
+
+    async def _clear_outdated_jobs(self, iter_seconds: int, timeout_minutes: int):
+        while True:
+            now = datetime.now()
+            to_be_deleted = []
+            for job_id, job in self._jobs.items():
+                if job.finished is not None and now - job.finished > timedelta(minutes=timeout_minutes):
+                    to_be_deleted.append(job_id)
+            for job_id in to_be_deleted:
+                del self._jobs[job_id]
+            await asyncio.sleep(iter_seconds)
+
+    def submit(self, user: str, session_id: str | None, run: Callable[[Job], Awaitable[Any]]) -> Job:
+        """Creates a new job and starts it in the background.
+
+        Args:
+            user: user owning the job
+            session_id: session the job belongs to (if any)
+            run: coroutine function computing the job result (progress should be reported through the job)
+
+        Returns:
+            the created job
+        """
+        while True:
+            job_id = _generate_job_id()
+            if job_id not in self._jobs:
+                break
+        job = Job(job_id, user, session_id)
+        self._jobs[job_id] = job
+        job._task = asyncio.create_task(self._run(job, run))
+        return job
+
+    async def _run(self, job: Job, run: Callable[[Job], Awaitable[Any]]):
+        try:
+            async with self._semaphore:
+                job.status = "running"
+                job.result = await run(job)
+            job.progress = 1
+            job.status = "finished"
+        except (asyncio.CancelledError, JobCancelledError):
+            job.status = "cancelled"
+        except Exception as e:
+            logging.exception(f"Job {job.job_id} failed")
+            job.status = "failed"
+            job.error = str(e)
+        job.finished = datetime.now()
+
+    def get_job(self, user: str, job_id: str) -> Job | None:
+        """Returns the job (None if it does not exist or is owned by another user).
+        """
+        job = self._jobs.get(job_id)
+        if job is None or job.user != user:
+            return None
+        return job
+
+    def cancel_job(self, user: str, job_id: str):
+        """Cancels the job.
+
+        Note:
+            - computations already running inside the compute executor stop at their next progress report (e.g. the next matrix chunk), their result is discarded
+            - computations without progress reports (or running in a process pool) finish in the background
+        """
+        job = self.get_job(user, job_id)
+        if job is None or job.is_done() or job._task is None:
+            return
+        job._cancelled = True
+        job._task.cancel()
+
+JOB_MANAGER = None
+
+def init_job_manager():
+    """Initializes the job manager.
+    """
+    global JOB_MANAGER
+    JOB_MANAGER = JobManager(config.JOB_MAX_RUNNING)
+    JOB_MANAGER.periodically_clear(60 * 60, config.JOB_TIMEOUT_MINUTES)
+
+def get_job_manager() -> JobManager:
+    """Returns the job manager singleton.
+
+    Note:
+        - This can be used as a fastapi dependency
+    """
+    global JOB_MANAGER
+    if JOB_MANAGER is None:
+        raise ValueError("This should not have happened.")
+    return JOB_MANAGER
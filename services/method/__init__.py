@@ -3,4 +3,8 @@
 """Method service.
 """
 
-from .method_service import IMethodService, get_method_service, Infrastructure
\ No newline at end of file
+from .method_service import IMethodService, get_method_service, Infrastructure
+from .util import NO_DATA_VALUE, aggregate_multi_criteria
+from .oas_api.client import OASClient, init_oas_client, close_oas_client, get_oas_client
+from .cache import ResultCache, init_result_cache, get_result_cache
+from .matrix_methods import calc_multi_criteria_from_matrix, update_multi_criteria_from_matrix, get_matrix_locations, get_matrix_range, InfrastructureState
@@ -3,56 +3,166 @@
 """IMethodService implementations using pyaccess.
 """
 
-from .util import get_distance_decay, Infrastructure
-from services.profile import ProfileManager
+from typing import Callable
+import logging
+import numpy as np
+
+import config
+from .util import get_distance_decay, aggregate_multi_criteria, Infrastructure
+from .matrix_methods import calc_reachability_from_matrix
+from services.profile import ProfileManager, get_profile_manager, IRoutingProfile, TravelTimeMatrix
+from services.compute import ComputeExecutor
 
 class AccessMethodService:
+    """IMethodService implementation running pyaccess routines inside the compute executor.
+
+    Note:
+        - parameters are validated on the event-loop, the actual computations only happen inside the executor
+        - demand points snapped to the same graph node are routed only once (results are identical for all of them)
+    """
     _profiles: ProfileManager
+    _executor: ComputeExecutor
 
-    def __init__(self, profiles: ProfileManager):
+    def __init__(self, profiles: ProfileManager, executor: ComputeExecutor):
         self._profiles = profiles
+        self._executor = executor
+
+    def _get_callback(self, progress: Callable[[float], None] | None = None) -> Callable[[float], None] | None:
+        # progress can only be reported from within the computation if it runs in the same process
+        if self._executor.is_threaded():
+            return progress
+        return None
 
-    async def calcFCA(self, population_locations: list[tuple[float, float]], population_weights: list[int], facility_locations: list[tuple[float, float]], facility_weights: list[float], decay: dict, travel_mode: str = "driving-car") -> list[float]:
-        profile = self._profiles.get_profile(travel_mode)
-        if profile is None:
+    def _check_profile(self, travel_mode: str):
+        if self._profiles.get_profile(travel_mode) is None:
             raise ValueError(f"Invalid profile {travel_mode}.")
-        distance_decay = get_distance_decay(decay)
-        if distance_decay is None:
+
+    async def calcFCA(self, population_locations: list[tuple[float, float]], population_weights: list[int], facility_locations: list[tuple[float, float]], facility_weights: list[float], decay: dict, travel_mode: str = "driving-car") -> np.ndarray:
+        self._check_profile(travel_mode)
+        if get_distance_decay(decay) is None:
             raise ValueError(f"Invalid decay parameters {decay}.")
-        arr = profile.calc_2sfca(population_locations, population_weights, facility_locations, [int(i) for i in facility_weights], distance_decay)
-        return arr.tolist()
+        return await self._executor.run(_calc_2sfca, travel_mode, population_locations, population_weights, facility_locations, [int(i) for i in facility_weights], decay)
 
-    async def calcMultiCriteria(self, population_locations: list[tuple[float, float]], population_weights: list[int], infrastructures: dict[str, Infrastructure], travel_mode: str = "driving-car") -> tuple[dict[str, list[float]], dict[str, list[int]]]:
-        profile = self._profiles.get_profile(travel_mode)
-        if profile is None:
-            raise ValueError(f"Invalid profile {travel_mode}.")
-        access = {}
-        access["multiCriteria"] = [0] * len(population_locations)
-        counts = {}
-        # weight_sum = sum([i.weight for i in infrastructures.values()])
-        for name, infra in infrastructures.items():
-            decay = get_distance_decay(infra.decay)
-            if decay is None:
+    async def calcMultiCriteria(self, population_locations: list[tuple[float, float]], population_weights: list[int], infrastructures: dict[str, Infrastructure], travel_mode: str = "driving-car", progress: Callable[[float], None] | None = None) -> tuple[dict[str, np.ndarray], dict[str, np.ndarray]]:
+        self._check_profile(travel_mode)
+        for infra in infrastructures.values():
+            if get_distance_decay(infra.decay) is None:
                 raise ValueError(f"Invalid decay parameters {infra.decay}.")
-            reach, count = profile.calc_reachability(population_locations, infra.locations, decay)
-            counts[name] = count
-            weight = infrastructures[name].weight
-            multi = access["multiCriteria"]
-            for j in range(len(population_locations)):
-                if reach[j] <= 0:
-                    reach[j] = -9999
-                    continue
-                multi[j] += weight * reach[j]
-            access[name] = reach.tolist()
-        multi = access["multiCriteria"]
-        for j in range(len(population_locations)):
-            if multi[j] <= 0:
-                multi[j] = -9999
-        return access, counts
-
-    async def calcSetCoverage(self, population_locations: list[tuple[float, float]], population_weights: list[int], facility_locations: list[tuple[float, float]], max_range: int, percent_coverage: float, travel_mode: str = "driving-car") -> list[bool]:
-        profile = self._profiles.get_profile(travel_mode)
-        if profile is None:
-            raise ValueError(f"Invalid profile {travel_mode}.")
-        arr = profile.calc_set_coverage(population_locations, population_weights, facility_locations, max_range, percent_coverage)
+        result = await self._executor.run(_calc_multi_criteria, travel_mode, population_locations, infrastructures, self._get_callback(progress))
+        if progress is not None:
+            progress(1)
+        return result
+
+    async def calcSetCoverage(self, population_locations: list[tuple[float, float]], population_weights: list[int], facility_locations: list[tuple[float, float]], max_range: int, percent_coverage: float, travel_mode: str = "driving-car", progress: Callable[[float], None] | None = None) -> list[bool]:
+        self._check_profile(travel_mode)
+        arr = await self._executor.run(_calc_set_coverage, travel_mode, population_locations, population_weights, facility_locations, max_range, percent_coverage)
+        if progress is not None:
+            progress(1)
         return arr.tolist()
+
+    def supportsMatrix(self) -> bool:
+        return config.PYACCESS_CALC_MATRIX
+
+    async def calcMatrix(self, population_locations: list[tuple[float, float]], facility_locations: list[tuple[float, float]], max_range: int, travel_mode: str = "driving-car", progress: Callable[[float], None] | None = None) -> TravelTimeMatrix | None:
+        self._check_profile(travel_mode)
+        # matrices are only computed if enabled (see config.PYACCESS_CALC_MATRIX) and checked, callers fall back to calcMultiCriteria
+        if not self.supportsMatrix():
+            return None
+        matrix = await self._executor.run(_calc_matrix, travel_mode, population_locations, facility_locations, max_range, self._get_callback(progress))
+        if progress is not None:
+            progress(1)
+        return matrix
+
+# functions executed inside the compute executor
+# (module-level and parameterized by plain values so that they can be send to process workers)
+
+def _get_profile(travel_mode: str) -> IRoutingProfile:
+    profile = get_profile_manager().get_profile(travel_mode)
+    if profile is None:
+        raise ValueError(f"Invalid profile {travel_mode}.")
+    return profile
+
+def _collapse_demand(profile: IRoutingProfile, population_locations: list[tuple[float, float]]) -> tuple[list[tuple[float, float]], np.ndarray]:
+    """Merges demand points snapped to the same graph node into a single routing origin.
+
+    Note:
+        - origins are located at the snapped node (the location of any merged demand point could be snapped to another node by the router)
+
+    Returns:
+        locations of the origins and the origin of every demand point (results of the origins can be scattered back using "result[mapping]")
+    """
+    nodes, node_locations = profile.snap(population_locations)
+    _, first, mapping = np.unique(nodes, return_index=True, return_inverse=True)
+    return [node_locations[i] for i in first.tolist()], mapping
+
+def _collapse_weights(weights: list[int], mapping: np.ndarray, count: int) -> list[int]:
+    return np.bincount(mapping, weights=np.asarray(weights, dtype=np.float64), minlength=count).astype(np.int64).tolist()
+
+def _calc_2sfca(travel_mode: str, population_locations: list[tuple[float, float]], population_weights: list[int], facility_locations: list[tuple[float, float]], facility_weights: list[int], decay: dict) -> np.ndarray:
+    profile = _get_profile(travel_mode)
+    distance_decay = get_distance_decay(decay)
+    if distance_decay is None:
+        raise ValueError(f"Invalid decay parameters {decay}.")
+    locations, mapping = _collapse_demand(profile, population_locations)
+    weights = _collapse_weights(population_weights, mapping, len(locations))
+    return np.asarray(profile.calc_2sfca(locations, weights, facility_locations, facility_weights, distance_decay))[mapping]
+
+def _calc_multi_criteria(travel_mode: str, population_locations: list[tuple[float, float]], infrastructures: dict[str, Infrastructure], progress: Callable[[float], None] | None = None) -> tuple[dict[str, np.ndarray], dict[str, np.ndarray]]:
+    profile = _get_profile(travel_mode)
+    locations, mapping = _collapse_demand(profile, population_locations)
+    reaches = {}
+    counts = {}
+    for i, (name, infra) in enumerate(infrastructures.items()):
+        decay = get_distance_decay(infra.decay)
+        if decay is None:
+            raise ValueError(f"Invalid decay parameters {infra.decay}.")
+        reach, count = profile.calc_reachability(locations, infra.locations, decay)
+        reaches[name] = np.asarray(reach)
+        counts[name] = np.asarray(count)
+        if progress is not None:
+            progress((i + 1) / len(infrastructures))
+    access = aggregate_multi_criteria(reaches, infrastructures, len(locations))
+    return {name: arr[mapping] for name, arr in access.items()}, {name: arr[mapping] for name, arr in counts.items()}
+
+def _calc_set_coverage(travel_mode: str, population_locations: list[tuple[float, float]], population_weights: list[int], facility_locations: list[tuple[float, float]], max_range: int, percent_coverage: float) -> np.ndarray:
+    profile = _get_profile(travel_mode)
+    # demand without population does not influence the coverage
+    keep = [i for i, w in enumerate(population_weights) if w > 0]
+    locations, mapping = _collapse_demand(profile, [population_locations[i] for i in keep])
+    weights = _collapse_weights([population_weights[i] for i in keep], mapping, len(locations))
+    return profile.calc_set_coverage(locations, weights, facility_locations, max_range, percent_coverage)
+
+# number of demand points used to check matrices against "calc_reachability"
+_MATRIX_CHECK_SIZE = 200
+# result of the check per travel-mode (checked once per process)
+_MATRIX_CHECKS: dict[str, bool] = {}
+
+def _check_matrix(profile: IRoutingProfile, travel_mode: str, locations: list[tuple[float, float]], facility_locations: list[tuple[float, float]], max_range: int) -> bool:
+    """Checks that the reachability derived from "calc_matrix" matches "calc_reachability" (on a sample of the demand).
+    """
+    checked = _MATRIX_CHECKS.get(travel_mode)
+    if checked is not None:
+        return checked
+    sample = locations[:_MATRIX_CHECK_SIZE]
+    if len(sample) == 0 or len(facility_locations) == 0:
+        return True
+    decay = {"decay_type": "linear", "max_range": max_range}
+    try:
+        matrix = profile.calc_matrix(sample, facility_locations, max_range)
+        reach, count = calc_reachability_from_matrix(matrix, np.arange(len(facility_locations)), decay)
+        expected_reach, expected_count = profile.calc_reachability(sample, facility_locations, get_distance_decay(decay))
+        valid = np.allclose(reach, np.asarray(expected_reach), atol=1e-4) and np.array_equal(count, np.asarray(expected_count))
+    except Exception:
+        logging.exception(f"Failed to compute a travel-time matrix for {travel_mode}")
+        valid = False
+    if not valid:
+        logging.warning(f"Travel-time matrices of {travel_mode} do not reproduce calc_reachability, they will not be used.")
+    _MATRIX_CHECKS[travel_mode] = valid
+    return valid
+
+def _calc_matrix(travel_mode: str, population_locations: list[tuple[float, float]], facility_locations: list[tuple[float, float]], max_range: int, progress: Callable[[float], None] | None = None) -> TravelTimeMatrix | None:
+    profile = _get_profile(travel_mode)
+    locations, mapping = _collapse_demand(profile, population_locations)
+    if not _check_matrix(profile, travel_mode, locations, facility_locations, max_range):
+        return None
+    return profile.calc_matrix(locations, facility_locations, max_range, progress).select_rows(mapping)
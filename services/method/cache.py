@@ -0,0 +1,191 @@
+# Copyright (C) 2023 Authors of the MCDA project - All Rights Reserved
+
+"""Content-addressed result cache for method services.
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import Any, Callable
+import hashlib
+import json
+import numpy as np
+
+import config
+from .util import Infrastructure
+from services.profile import TravelTimeMatrix
+
+def _update_hash(h, value: Any):
+    """Feeds a canonical encoding of value into the hash.
+    """
+    if isinstance(value, np.ndarray):
+        h.update(f"nd{value.dtype.str}{value.shape}".encode())
+        h.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, dict):
+        h.update(json.dumps(value, sort_keys=True, default=str).encode())
+    elif isinstance(value, (list, tuple)):
+        h.update(f"seq{len(value)}".encode())
+        h.update(np.asarray(value, dtype=np.float64).tobytes())
+    else:
+        h.update(repr(value).encode())
+    h.update(b"|")
+
+def make_cache_key(*parts: Any) -> str:
+    """Computes a canonical hash of the given parts (arrays, lists of numbers/points, dicts or scalars).
+    """
+    h = hashlib.sha256()
+    h.update(str(config.DATASET_VERSION).encode())
+    for part in parts:
+        _update_hash(h, part)
+    return h.hexdigest()
+
+def _get_size(value: Any) -> int:
+    """Estimates the memory used by a cached value.
+    """
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, TravelTimeMatrix):
+        return value.get_nbytes()
+    if isinstance(value, dict):
+        return sum(_get_size(v) for v in value.values()) + 64 * len(value)
+    if isinstance(value, (list, tuple)):
+        if len(value) > 0 and isinstance(value[0], (list, tuple, dict, np.ndarray)):
+            return sum(_get_size(v) for v in value)
+        return 32 * len(value)
+    return 32
+
+class ResultCache:
+    """LRU cache bounded by an (approximate) byte budget.
+    """
+    _entries: OrderedDict[str, tuple[Any, int]]
+    _max_bytes: int
+    _bytes: int
+    _hits: int
+    _misses: int
+    _evictions: int
+
+    def __init__(self, max_bytes: int):
+        self._entries = OrderedDict()
+        self._max_bytes = max_bytes
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, key: str) -> Any | None:
+        if key not in self._entries:
+            self._misses += 1
+            return None
+        self._hits += 1
+        self._entries.move_to_end(key)
+        return self._entries[key][0]
+
+    def put(self, key: str, value: Any):
+        size = _get_size(value)
+        if size > self._max_bytes:
+            return
+        if key in self._entries:
+            self._bytes -= self._entries.pop(key)[1]
+        self._entries[key] = (value, size)
+        self._bytes += size
+        while self._bytes > self._max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self._evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+
+    def get_stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self._max_bytes,
+            "hits": self._hits,
+            "misses": self._misses,
+            "evictions": self._evictions,
+        }
+
+def _infrastructures_key(infrastructures: dict[str, Infrastructure]) -> list:
+    parts = []
+    for name in sorted(infrastructures.keys()):
+        infra = infrastructures[name]
+        parts.extend([name, infra.weight, infra.decay, infra.locations, infra.weights])
+    return parts
+
+class CachedMethodService:
+    """IMethodService wrapper serving repeated computations from the result cache.
+
+    Note:
+        - keys contain the name of the wrapped service since results of different services are not interchangeable
+        - cached results are shared between requests and must not be modified by callers
+        - travel-time matrices are cached as well (they are immutable), so repeated "/decision_support/grid" requests are served from the cache
+    """
+    _service: Any
+    _name: str
+    _cache: ResultCache
+
+    def __init__(self, service: Any, name: str, cache: ResultCache):
+        self._service = service
+        self._name = name
+        self._cache = cache
+
+    async def calcFCA(self, population_locations: list[tuple[float, float]], population_weights: list[int], facility_locations: list[tuple[float, float]], facility_weights: list[float], decay: dict, travel_mode: str = "driving-car") -> np.ndarray:
+        key = make_cache_key(self._name, "fca", travel_mode, population_locations, population_weights, facility_locations, facility_weights, decay)
+        result = self._cache.get(key)
+        if result is None:
+            result = await self._service.calcFCA(population_locations, population_weights, facility_locations, facility_weights, decay, travel_mode)
+            self._cache.put(key, result)
+        return result
+
+    async def calcMultiCriteria(self, population_locations: list[tuple[float, float]], population_weights: list[int], infrastructures: dict[str, Infrastructure], travel_mode: str = "driving-car", progress: Callable[[float], None] | None = None) -> tuple[dict[str, np.ndarray], dict[str, np.ndarray]]:
+        key = make_cache_key(self._name, "multi_criteria", travel_mode, population_locations, population_weights, *_infrastructures_key(infrastructures))
+        result = self._cache.get(key)
+        if result is None:
+            result = await self._service.calcMultiCriteria(population_locations, population_weights, infrastructures, travel_mode, progress)
+            self._cache.put(key, result)
+        access, counts = result
+        return dict(access), dict(counts)
+
+    async def calcSetCoverage(self, population_locations: list[tuple[float, float]], population_weights: list[int], facility_locations: list[tuple[float, float]], max_range: int, percent_coverage: float, travel_mode: str = "driving-car", progress: Callable[[float], None] | None = None) -> list[bool]:
+        key = make_cache_key(self._name, "set_coverage", travel_mode, population_locations, population_weights, facility_locations, max_range, percent_coverage)
+        result = self._cache.get(key)
+        if result is None:
+            result = await self._service.calcSetCoverage(population_locations, population_weights, facility_locations, max_range, percent_coverage, travel_mode, progress)
+            self._cache.put(key, result)
+        return result
+
+    def supportsMatrix(self) -> bool:
+        return self._service.supportsMatrix()
+
+    async def calcMatrix(self, population_locations: list[tuple[float, float]], facility_locations: list[tuple[float, float]], max_range: int, travel_mode: str = "driving-car", progress: Callable[[float], None] | None = None) -> TravelTimeMatrix | None:
+        # neither hash the demand nor count a miss if the wrapped service does not compute matrices
+        if not self._service.supportsMatrix():
+            return None
+        key = make_cache_key(self._name, "matrix", travel_mode, population_locations, facility_locations, max_range)
+        result = self._cache.get(key)
+        if result is None:
+            result = await self._service.calcMatrix(population_locations, facility_locations, max_range, travel_mode, progress)
+            if result is not None:
+                self._cache.put(key, result)
+        return result
+
+RESULT_CACHE = None
+
+def init_result_cache():
+    """Initializes the result cache.
+    """
+    global RESULT_CACHE
+    RESULT_CACHE = ResultCache(config.RESULT_CACHE_MAX_BYTES)
+
+def get_result_cache() -> ResultCache:
+    """Returns the result cache singleton.
+
+    Note:
+        - This can be used as a fastapi dependency
+    """
+    global RESULT_CACHE
+    if RESULT_CACHE is None:
+        raise ValueError("This should not have happened.")
+    return RESULT_CACHE
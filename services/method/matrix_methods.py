@@ -0,0 +1,134 @@
+# Copyright (C) 2023 Authors of the MCDA project - All Rights Reserved
+
+"""Accessibility methods computed from a precomputed travel-time matrix.
+"""
+
+from collections import Counter
+import numpy as np
+
+from .util import get_distance_decay, aggregate_multi_criteria, Infrastructure
+from services.profile import TravelTimeMatrix
+
+def _get_decay(decay: dict):
+    distance_decay = get_distance_decay(decay)
+    if distance_decay is None:
+        raise ValueError(f"Invalid decay parameters {decay}.")
+    return distance_decay
+
+def get_matrix_range(infrastructures: dict[str, Infrastructure]) -> int:
+    """Returns the travel-time range a matrix needs to cover all infrastructures.
+    """
+    return max([_get_decay(infra.decay).get_max_distance() for infra in infrastructures.values()], default=0)
+
+def get_matrix_locations(infrastructures: dict[str, Infrastructure]) -> list[tuple[float, float]]:
+    """Returns the unique supply locations of all infrastructures (the columns of the matrix).
+    """
+    locations = {}
+    for infra in infrastructures.values():
+        for p in infra.locations:
+            locations[(p[0], p[1])] = None
+    return list(locations.keys())
+
+def calc_reachability_from_matrix(matrix: TravelTimeMatrix, cols: np.ndarray, decay: dict) -> tuple[np.ndarray, np.ndarray]:
+    """Computes the reachability (highest decayed weight and number of reachable supply points) per demand point.
+
+    Note:
+        - meant to reproduce "pyaccess.calc_reachability_2" (matrices are checked against it before being used, see "access_methods._check_matrix")
+    """
+    distance_decay = _get_decay(decay)
+    max_range = distance_decay.get_max_distance()
+    weights = matrix.select(matrix.get_decay_weights(distance_decay, max_range), cols)
+    reach = weights.max(axis=1).toarray().ravel()
+    in_range = matrix.select(matrix.get_range_mask(max_range), cols)
+    count = np.asarray(in_range.sum(axis=1), dtype=np.int32).ravel()
+    return reach, count
+
+def _update_reachability_from_matrix(matrix: TravelTimeMatrix, state: "InfrastructureState", locations: list[tuple[float, float]]) -> tuple[np.ndarray, np.ndarray] | None:
+    """Updates the reachability of a previous result by the contribution of added and removed supply locations.
+    """
+    old_locations = Counter([(p[0], p[1]) for p in state.locations])
+    new_locations = Counter([(p[0], p[1]) for p in locations])
+    added = matrix.get_columns(list((new_locations - old_locations).elements()))
+    removed = matrix.get_columns(list((old_locations - new_locations).elements()))
+    if added is None or removed is None:
+        return None
+    distance_decay = _get_decay(state.decay)
+    max_range = distance_decay.get_max_distance()
+    weights = matrix.get_decay_weights(distance_decay, max_range)
+    in_range = matrix.get_range_mask(max_range)
+    reach = state.reach.copy()
+    count = state.count.copy()
+    if added.shape[0] > 0:
+        reach = np.maximum(reach, matrix.select(weights, added).max(axis=1).toarray().ravel())
+        count += np.asarray(matrix.select(in_range, added).sum(axis=1), dtype=np.int32).ravel()
+    if removed.shape[0] > 0:
+        count -= np.asarray(matrix.select(in_range, removed).sum(axis=1), dtype=np.int32).ravel()
+        # only demand points best served by a removed location need to be recomputed
+        removed_reach = matrix.select(weights, removed).max(axis=1).toarray().ravel()
+        rows = np.nonzero((removed_reach > 0) & (removed_reach >= reach))[0]
+        if rows.shape[0] > 0:
+            cols = matrix.get_columns(locations)
+            if cols is None:
+                return None
+            reach[rows] = matrix.select(weights, cols, rows).max(axis=1).toarray().ravel()
+    return reach, count
+
+class InfrastructureState:
+    """Result of a single infrastructure kept to update later computations incrementally.
+    """
+    locations: list[tuple[float, float]]
+    decay: dict
+    reach: np.ndarray
+    count: np.ndarray
+
+    def __init__(self, locations: list[tuple[float, float]], decay: dict, reach: np.ndarray, count: np.ndarray):
+        self.locations = locations
+        self.decay = decay
+        self.reach = reach
+        self.count = count
+
+def update_multi_criteria_from_matrix(matrix: TravelTimeMatrix, infrastructures: dict[str, Infrastructure], states: dict[str, InfrastructureState]) -> tuple[dict[str, np.ndarray], dict[str, np.ndarray], dict[str, InfrastructureState]] | None:
+    """Computes the multi-criteria result from the matrix reusing previous results.
+
+    Infrastructures with unchanged locations and decay are taken from states, infrastructures with changed
+    locations are only updated by the added and removed locations.
+
+    Returns:
+        accessibilities, counts and the new states (None if the matrix does not cover the infrastructures)
+    """
+    if get_matrix_range(infrastructures) > matrix.get_max_range():
+        return None
+    reaches = {}
+    counts = {}
+    new_states = {}
+    for name, infra in infrastructures.items():
+        state = states.get(name)
+        result = None
+        if state is not None and state.decay == infra.decay:
+            if state.locations == infra.locations:
+                result = state.reach, state.count
+            else:
+                result = _update_reachability_from_matrix(matrix, state, infra.locations)
+        if result is None:
+            cols = matrix.get_columns(infra.locations)
+            if cols is None:
+                return None
+            result = calc_reachability_from_matrix(matrix, cols, infra.decay)
+        reach, count = result
+        reaches[name] = reach
+        counts[name] = count
+        new_states[name] = InfrastructureState(infra.locations, infra.decay, reach, count)
+    access = aggregate_multi_criteria(reaches, infrastructures, matrix.get_demand_count())
+    return access, counts, new_states
+
+def calc_multi_criteria_from_matrix(matrix: TravelTimeMatrix, infrastructures: dict[str, Infrastructure]) -> tuple[dict[str, np.ndarray], dict[str, np.ndarray]] | None:
+    """Computes the multi-criteria result from the matrix.
+
+    Returns:
+        same as IMethodService.calcMultiCriteria (None if the matrix does not cover the infrastructures)
+    """
+    result = update_multi_criteria_from_matrix(matrix, infrastructures, {})
+    if result is None:
+        return None
+    access, counts, _ = result
+    return access, counts
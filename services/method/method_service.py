@@ -6,40 +6,60 @@
 from __future__ import annotations
 
 from fastapi import Depends
-from typing import Any, Annotated, Protocol
+from typing import Any, Annotated, Callable, Protocol
 import asyncio
+import numpy as np
 
-import config
 from .util import Infrastructure
 from filters.user import get_current_user, User
-from services.profile import ProfileManager, get_profile_manager
+from services.profile import ProfileManager, get_profile_manager, TravelTimeMatrix
+from services.compute import ComputeExecutor, get_compute_executor
 from .access_methods import AccessMethodService
 from .oas_methods import OASMethodService
+from .oas_api.client import OASClient, get_oas_client
+from .cache import CachedMethodService, ResultCache, get_result_cache
 
 class IMethodService(Protocol):
     """Method service interface.
+
+    Note:
+        - long running methods accept an optional progress callback (called with values in range [0, 1])
     """
-    async def calcMultiCriteria(self, population_locations: list[tuple[float, float]], population_weights: list[int], infrastructures: dict[str, Infrastructure], travel_mode: str = "driving-car") -> tuple[dict[str, list[float]], dict[str, list[int]]]:
+    async def calcMultiCriteria(self, population_locations: list[tuple[float, float]], population_weights: list[int], infrastructures: dict[str, Infrastructure], travel_mode: str = "driving-car", progress: Callable[[float], None] | None = None) -> tuple[dict[str, np.ndarray], dict[str, np.ndarray]]:
+        ...
+
+    async def calcFCA(self, population_locations: list[tuple[float, float]], population_weights: list[int], facility_locations: list[tuple[float, float]], facility_weights: list[float], decay: dict, travel_mode: str = "driving-car") -> np.ndarray:
+        ...
+
+    async def calcSetCoverage(self, population_locations: list[tuple[float, float]], population_weights: list[int], facility_locations: list[tuple[float, float]], max_range: int, percent_coverage: float, travel_mode: str = "driving-car", progress: Callable[[float], None] | None = None) -> list[bool]:
         ...
 
-    async def calcFCA(self, population_locations: list[tuple[float, float]], population_weights: list[int], facility_locations: list[tuple[float, float]], facility_weights: list[float], decay: dict, travel_mode: str = "driving-car") -> list[float]:
+    def supportsMatrix(self) -> bool:
+        """Checks if the service computes travel-time matrices (otherwise calcMatrix always returns None).
+        """
         ...
 
-    async def calcSetCoverage(self, population_locations: list[tuple[float, float]], population_weights: list[int], facility_locations: list[tuple[float, float]], max_range: int, percent_coverage: float, travel_mode: str = "driving-car") -> list[bool]:
+    async def calcMatrix(self, population_locations: list[tuple[float, float]], facility_locations: list[tuple[float, float]], max_range: int, travel_mode: str = "driving-car", progress: Callable[[float], None] | None = None) -> TravelTimeMatrix | None:
+        """Computes the sparse travel-time matrix up to max_range (None if not supported by the service).
+        """
         ...
 
 def get_method_service(
         profiles: Annotated[ProfileManager, Depends(get_profile_manager)],
+        executor: Annotated[ComputeExecutor, Depends(get_compute_executor)],
+        cache: Annotated[ResultCache, Depends(get_result_cache)],
+        oas_client: Annotated[OASClient, Depends(get_oas_client)],
         user: Annotated[User, Depends(get_current_user)]
     ) -> IMethodService:
     """Gets the appropriate method service.
 
     Note:
         - this function is expected the be used as a fastapi dependency
+        - returned services are wrapped by the result cache
     """
     if user.get_group() in ["admin", "user"]:
-        return AccessMethodService(profiles)
+        return CachedMethodService(AccessMethodService(profiles, executor), "pyaccess", cache)
     elif user.get_group() in ["dummy"]:
-        return OASMethodService(config.ACCESSIBILITYSERVICE_URL)
+        return CachedMethodService(OASMethodService(oas_client), "oas", cache)
     else:
         raise ValueError(f"Invalid user group {user.get_group()}.")
@@ -0,0 +1,200 @@
+# Copyright (C) 2023 Authors of the MCDA project - All Rights Reserved
+
+"""Shared async HTTP client for requests to the OAS.
+"""
+
+from typing import Any
+import asyncio
+import base64
+import gzip
+import json
+import logging
+import numpy as np
+import pyarrow as pa
+import httpx
+
+import config
+
+# status codes indicating a (possibly) transient failure of the OAS
+_RETRY_STATUS_CODES = [502, 503, 504]
+
+# media types of the binary transport
+PACKED_JSON_TYPE = "application/vnd.oas.packed+json"
+ARROW_STREAM_TYPE = "application/vnd.apache.arrow.stream"
+
+# request fields send as packed arrays by the binary transport
+_PACKED_FIELDS = ["demand_locations", "demand_weights", "supply_locations", "supply_weights"]
+
+def _pack_arrays(body: Any) -> Any:
+    """Replaces the location/weight lists of a request body by base64 encoded little-endian float64 arrays.
+    """
+    if not isinstance(body, dict):
+        return body
+    packed = {}
+    for key, value in body.items():
+        if key in _PACKED_FIELDS and isinstance(value, (list, tuple, np.ndarray)):
+            arr = np.asarray(value, dtype="<f8")
+            packed[key] = {
+                "dtype": "<f8",
+                "shape": list(arr.shape),
+                "data": base64.b64encode(np.ascontiguousarray(arr).tobytes()).decode(),
+            }
+        else:
+            packed[key] = _pack_arrays(value)
+    return packed
+
+def _decode_arrow(data: bytes) -> dict:
+    """Decodes an arrow ipc stream into the (nested) response dict.
+
+    Note:
+        - every column holds one result array, nested fields are given by dotted column names (e.g. "access.multiCriteria")
+        - columns are converted without copies if possible
+    """
+    table = pa.ipc.open_stream(data).read_all()
+    result: dict = {}
+    for name, column in zip(table.column_names, table.columns):
+        keys = name.split(".")
+        node = result
+        for key in keys[:-1]:
+            node = node.setdefault(key, {})
+        node[keys[-1]] = column.combine_chunks().to_numpy(zero_copy_only=False)
+    return result
+
+def _decode_body(response: httpx.Response) -> Any:
+    if response.headers.get("Content-Type", "").startswith(ARROW_STREAM_TYPE):
+        return _decode_arrow(response.content)
+    return response.json()
+
+def _encode_body(body: Any, compress_min_bytes: int, binary: bool) -> tuple[bytes, dict[str, str]]:
+    if binary:
+        data = json.dumps(_pack_arrays(body)).encode()
+        headers = {"Content-Type": PACKED_JSON_TYPE, "Accept": f"{ARROW_STREAM_TYPE}, application/json;q=0.9"}
+    else:
+        data = json.dumps(body).encode()
+        headers = {"Content-Type": "application/json"}
+    if compress_min_bytes > 0 and len(data) >= compress_min_bytes:
+        data = gzip.compress(data, compresslevel=1)
+        headers["Content-Encoding"] = "gzip"
+    return data, headers
+
+class OASClient:
+    """Pooled HTTP client for the OAS.
+
+    Note:
+        - connections are kept alive and shared between all requests
+        - requests failing with connection errors, timeouts or 502/503/504 are retried with exponential backoff (OAS requests are side-effect free)
+        - request bodies larger than compress_min_bytes are gzip-compressed, responses are accepted gzip-compressed,
+          the client stops compressing once the OAS rejects a compressed request (400/415) but accepts it uncompressed
+        - encoding/decoding of (large) json bodies happens outside of the event-loop
+        - if binary is set locations/weights are send packed and arrow responses are accepted,
+          the client falls back to plain json once the OAS rejects a packed request (415)
+        - responses are decoded into lists (json) or numpy arrays (arrow), callers have to handle both
+    """
+    _client: httpx.AsyncClient
+    _retries: int
+    _backoff: float
+    _compress_min_bytes: int
+    _binary: bool
+
+    def __init__(self, base_url: str, timeout: float, connect_timeout: float, max_connections: int, retries: int, backoff: float, compress_min_bytes: int, binary: bool = False):
+        self._client = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            headers={"Accept-Encoding": "gzip"},
+        )
+        self._retries = retries
+        self._backoff = backoff
+        self._compress_min_bytes = compress_min_bytes
+        self._binary = binary
+
+    async def post(self, path: str, body: Any) -> Any:
+        """Posts the json body to the OAS endpoint and returns the decoded json response.
+
+        Args:
+            path: path of the endpoint (e.g. "/v1/accessibility/enhanced_2sfca")
+            body: json serializable request body
+
+        Returns:
+            decoded response
+        """
+        loop = asyncio.get_running_loop()
+        if self._binary:
+            response = await self._post(path, body, True)
+            if response.status_code != 415:
+                response.raise_for_status()
+                return await loop.run_in_executor(None, _decode_body, response)
+            logging.warning("OAS does not support the binary transport, falling back to json.")
+            self._binary = False
+        response = await self._post(path, body, False)
+        response.raise_for_status()
+        return await loop.run_in_executor(None, _decode_body, response)
+
+    async def _post(self, path: str, body: Any, binary: bool) -> httpx.Response:
+        loop = asyncio.get_running_loop()
+        data, headers = await loop.run_in_executor(None, _encode_body, body, self._compress_min_bytes, binary)
+        response = await self._send(path, data, headers)
+        if "Content-Encoding" not in headers or response.status_code not in (400, 415):
+            return response
+        # gzip request bodies are not negotiated, retry once uncompressed
+        data, headers = await loop.run_in_executor(None, _encode_body, body, 0, binary)
+        retry = await self._send(path, data, headers)
+        if retry.status_code not in (400, 415):
+            logging.warning("OAS does not support compressed requests, falling back to uncompressed bodies.")
+            self._compress_min_bytes = 0
+        return retry
+
+    async def _send(self, path: str, data: bytes, headers: dict[str, str]) -> httpx.Response:
+        attempt = 0
+        while True:
+            try:
+                response = await self._client.post(path, content=data, headers=headers)
+                if response.status_code not in _RETRY_STATUS_CODES or attempt >= self._retries:
+                    return response
+                logging.warning(f"OAS request to {path} failed with status {response.status_code}, retrying...")
+            except httpx.TransportError as e:
+                if attempt >= self._retries:
+                    raise
+                logging.warning(f"OAS request to {path} failed ({e!r}), retrying...")
+            await asyncio.sleep(self._backoff * 2 ** attempt)
+            attempt += 1
+
+    async def close(self):
+        await self._client.aclose()
+
+OAS_CLIENT = None
+
+def init_oas_client():
+    """Initializes the OAS client.
+    """
+    global OAS_CLIENT
+    OAS_CLIENT = OASClient(
+        config.ACCESSIBILITYSERVICE_URL,
+        config.OAS_TIMEOUT_SECONDS,
+        config.OAS_CONNECT_TIMEOUT_SECONDS,
+        config.OAS_MAX_CONNECTIONS,
+        config.OAS_RETRIES,
+        config.OAS_RETRY_BACKOFF_SECONDS,
+        config.OAS_COMPRESS_MIN_BYTES,
+        config.OAS_BINARY_TRANSPORT,
+    )
+
+async def close_oas_client():
+    """Closes all pooled connections of the OAS client.
+    """
+    global OAS_CLIENT
+    if OAS_CLIENT is None:
+        return
+    await OAS_CLIENT.close()
+    OAS_CLIENT = None
+
+def get_oas_client() -> OASClient:
+    """Returns the OAS client singleton.
+
+    Note:
+        - This can be used as a fastapi dependency
+    """
+    global OAS_CLIENT
+    if OAS_CLIENT is None:
+        raise ValueError("This should not have happened.")
+    return OAS_CLIENT
@@ -1,16 +1,12 @@
 # Copyright (C) 2023 Authors of the MCDA project - All Rights Reserved
 
 from shapely import Point, Polygon
-import requests
-import json
-import asyncio
 import numpy as np
 
-import config
+from .client import get_oas_client
 
 
-async def calcFCA(population_locations: list[tuple[float, float]], population_weights: list[int], facility_locations: list[tuple[float, float]], facility_weights: list[float], decay: dict, travel_mode: str = "driving-car") -> list[float]:
-    header = {'Content-Type': 'application/json'}
+async def calcFCA(population_locations: list[tuple[float, float]], population_weights: list[int], facility_locations: list[tuple[float, float]], facility_weights: list[float], decay: dict, travel_mode: str = "driving-car") -> np.ndarray:
     body = {
         "supply": {
             "supply_locations": facility_locations,
@@ -33,9 +29,5 @@ async def calcFCA(population_locations: list[tuple[float, float]], population_we
             "no_data_value": -9999,
         },
     }
-    loop = asyncio.get_running_loop()
-    data = json.dumps(body)
-    response = await loop.run_in_executor(None, lambda: requests.post(config.ACCESSIBILITYSERVICE_URL + "/v1/accessibility/enhanced_2sfca", data=data, headers=header))
-    accessibilities = response.json()
-    arr: list[float] = accessibilities["access"]
-    return arr
+    accessibilities = await get_oas_client().post("/v1/accessibility/enhanced_2sfca", body)
+    return np.asarray(accessibilities["access"], dtype=np.float32)
@@ -2,12 +2,9 @@
 
 from shapely import Point, Polygon
 from pydantic import BaseModel
-import requests
-import json
-import asyncio
 import numpy as np
 
-import config
+from .client import get_oas_client
 from .reachability import calcReachability
 
 
@@ -23,7 +20,7 @@ class Infrastructure():
         self.locations = locations
         self.weights = weights        
 
-async def calcMultiCriteria(population_locations: list[tuple[float, float]], population_weights: list[int], infrastructures: dict[str, Infrastructure], travel_mode: str = "driving-car") -> dict[str, list[float]]:
+async def calcMultiCriteria(population_locations: list[tuple[float, float]], population_weights: list[int], infrastructures: dict[str, Infrastructure], travel_mode: str = "driving-car") -> dict[str, np.ndarray]:
     infras = {}
     for name, obj in infrastructures.items():
         infras[name] = {
@@ -34,7 +31,6 @@ async def calcMultiCriteria(population_locations: list[tuple[float, float]], pop
             },
             "decay": obj.decay,
         }
-    header = {'Content-Type': 'application/json'}
     body = {
         "infrastructures": infras,
         "demand": {
@@ -54,7 +50,5 @@ async def calcMultiCriteria(population_locations: list[tuple[float, float]], pop
         },
         "return_all": True,
     }
-    loop = asyncio.get_running_loop()
-    response = await loop.run_in_executor(None, lambda: requests.post(config.ACCESSIBILITYSERVICE_URL + "/v1/multicriteria/multi", json=body, headers=header))
-    accessibilities = response.json()
-    return accessibilities["access"]
+    accessibilities = await get_oas_client().post("/v1/multicriteria/multi", body)
+    return {name: np.asarray(values, dtype=np.float32) for name, values in accessibilities["access"].items()}
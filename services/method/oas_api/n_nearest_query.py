@@ -1,18 +1,14 @@
 # Copyright (C) 2023 Authors of the MCDA project - All Rights Reserved
 
 from shapely import Point, Polygon
-import requests
-import json
-import asyncio
 import numpy as np
 import random
 import base64
 
-import config
+from .client import get_oas_client
 
 
 async def calcNearestQuery(population_locations: list[tuple[float, float]], population_weights: list[int], envelop: tuple[float, float, float, float], facilities: list[tuple[float, float]], facility_weights: list[float], ranges: list[float]) -> list[float]:
-    header = {'Content-Type': 'application/json'}
     body = {
         "demand": {
             "demand_locations": population_locations,
@@ -27,15 +23,12 @@ async def calcNearestQuery(population_locations: list[tuple[float, float]], popu
         "ranges": ranges,
         "compute_type": "mean",
     }
-    loop = asyncio.get_running_loop()
-    response = await loop.run_in_executor(None, lambda: requests.post(config.ACCESSIBILITYSERVICE_URL + "/v1/queries/n_nearest", json=body, headers=header))
-    accessibilities = response.json()
-    arr: list[float] = accessibilities["result"]
+    accessibilities = await get_oas_client().post("/v1/queries/n_nearest", body)
+    arr: list[float] = np.asarray(accessibilities["result"]).tolist()
     return arr
 
 
 async def calcNearestQuery2(population_locations: list[tuple[float, float]], envelop: tuple[float, float, float, float], facilities: list[tuple[float, float]], facility_weights: list[float], ranges: list[float], facility_count: int, compute_type: str) -> list[float]:
-    header = {'Content-Type': 'application/json'}
     body = {
         "demand": {
             "demand_locations": population_locations,
@@ -50,7 +43,5 @@ async def calcNearestQuery2(population_locations: list[tuple[float, float]], env
         "ranges": ranges,
         "compute_type": compute_type,
     }
-    loop = asyncio.get_running_loop()
-    response = await loop.run_in_executor(None, lambda: requests.post(config.ACCESSIBILITYSERVICE_URL + "/v1/queries/n_nearest", json=body, headers=header))
-    accessibilities = response.json()
-    return accessibilities["result"]
+    accessibilities = await get_oas_client().post("/v1/queries/n_nearest", body)
+    return np.asarray(accessibilities["result"]).tolist()
@@ -1,15 +1,12 @@
 # Copyright (C) 2023 Authors of the MCDA project - All Rights Reserved
 
 from shapely import Point, Polygon
-import requests
-import json
-import asyncio
+import numpy as np
 
-import config
+from .client import get_oas_client
 
 
-async def calcReachability(population_locations: list[tuple[float, float]], population_weights: list[int], facility_locations: list[tuple[float, float]], facility_weights: list[float], ranges: list[float], range_factors: list[float]) -> list[float]:
-    header = {'Content-Type': 'application/json'}
+async def calcReachability(population_locations: list[tuple[float, float]], population_weights: list[int], facility_locations: list[tuple[float, float]], facility_weights: list[float], ranges: list[float], range_factors: list[float]) -> np.ndarray:
     body = {
         "supply": {
             "supply_locations": facility_locations,
@@ -25,8 +22,5 @@ async def calcReachability(population_locations: list[tuple[float, float]], popu
             "range_factors": range_factors,
         },
     }
-    loop = asyncio.get_running_loop()
-    response = await loop.run_in_executor(None, lambda: requests.post(config.ACCESSIBILITYSERVICE_URL + "/v1/accessibility/reachability", json=body, headers=header))
-    accessibilities = response.json()
-    arr: list[float] = accessibilities["access"]
-    return arr
+    accessibilities = await get_oas_client().post("/v1/accessibility/reachability", body)
+    return np.asarray(accessibilities["access"], dtype=np.float32)
@@ -3,21 +3,24 @@
 """IMethodService implementation using the OAS.
 """
 
+from typing import Callable
 import asyncio
-import json
-import requests
+import numpy as np
 from fastapi import HTTPException, status
 
-from .util import Infrastructure
+import config
+from .util import Infrastructure, NO_DATA_VALUE, get_distance_decay
+from .sharding import Tile, get_tiles, get_halo_size
+from .oas_api.client import OASClient
+from services.profile import TravelTimeMatrix
 
 class OASMethodService:
-    _oas_url: str
+    _client: OASClient
 
-    def __init__(self, oas_url: str):
-        self._oas_url = oas_url
+    def __init__(self, client: OASClient):
+        self._client = client
 
-    async def calcFCA(self, population_locations: list[tuple[float, float]], population_weights: list[int], facility_locations: list[tuple[float, float]], facility_weights: list[float], decay: dict, travel_mode: str = "driving-car") -> list[float]:
-        header = {'Content-Type': 'application/json'}
+    async def calcFCA(self, population_locations: list[tuple[float, float]], population_weights: list[int], facility_locations: list[tuple[float, float]], facility_weights: list[float], decay: dict, travel_mode: str = "driving-car") -> np.ndarray:
         body = {
             "supply": {
                 "supply_locations": facility_locations,
@@ -40,14 +43,70 @@ class OASMethodService:
                 "no_data_value": -9999,
             },
         }
-        loop = asyncio.get_running_loop()
-        data = json.dumps(body)
-        response = await loop.run_in_executor(None, lambda: requests.post(self._oas_url + "/v1/accessibility/enhanced_2sfca", data=data, headers=header))
-        accessibilities = response.json()
-        arr: list[float] = accessibilities["access"]
-        return arr
-
-    async def calcMultiCriteria(self, population_locations: list[tuple[float, float]], population_weights: list[int], infrastructures: dict[str, Infrastructure], travel_mode: str = "driving-car") -> tuple[dict[str, list[float]], dict[str, list[int]]]:
+        accessibilities = await self._client.post("/v1/accessibility/enhanced_2sfca", body)
+        return np.asarray(accessibilities["access"], dtype=np.float32)
+
+    async def calcMultiCriteria(self, population_locations: list[tuple[float, float]], population_weights: list[int], infrastructures: dict[str, Infrastructure], travel_mode: str = "driving-car", progress: Callable[[float], None] | None = None) -> tuple[dict[str, np.ndarray], dict[str, np.ndarray]]:
+        if len(population_locations) < config.OAS_SHARD_MIN_DEMAND:
+            access = await self._request_multi_criteria(population_locations, population_weights, infrastructures, travel_mode)
+        else:
+            access = await self._calc_multi_criteria_sharded(population_locations, population_weights, infrastructures, travel_mode, progress)
+        if progress is not None:
+            progress(1)
+        # the OAS does not report reachable facility counts
+        return access, {}
+
+    async def _calc_multi_criteria_sharded(self, population_locations: list[tuple[float, float]], population_weights: list[int], infrastructures: dict[str, Infrastructure], travel_mode: str, progress: Callable[[float], None] | None = None) -> dict[str, np.ndarray]:
+        """Splits the demand into tiles and requests them concurrently.
+
+        Note:
+            - every tile request contains the tile's own demand and the facilities within one range around the tile,
+              multi-criteria results only depend on the facilities reachable from a demand point, so they match the unsharded request
+            - demand points are sent exactly once (the total request size stays close to the unsharded request)
+            - the halo is derived from the largest decay range and the maximum speed of the travel-mode
+            - every tile request contains all infrastructures (with an empty supply if no facility lies within the halo)
+        """
+        max_range = 0
+        for infra in infrastructures.values():
+            decay = get_distance_decay(infra.decay)
+            if decay is None:
+                raise ValueError(f"Invalid decay parameters {infra.decay}.")
+            max_range = max(max_range, decay.get_max_distance())
+        dem = np.asarray(population_locations, dtype=np.float64).reshape(-1, 2)
+        sups = {name: np.asarray(infra.locations, dtype=np.float64).reshape(-1, 2) for name, infra in infrastructures.items()}
+        speed = config.OAS_SHARD_SPEED_KMH.get(travel_mode, max(config.OAS_SHARD_SPEED_KMH.values()))
+        halo = get_halo_size(max_range, speed, float(dem[:, 1].mean()))
+        tiles = get_tiles(dem, (halo[0] * config.OAS_SHARD_TILE_FACTOR, halo[1] * config.OAS_SHARD_TILE_FACTOR))
+
+        semaphore = asyncio.Semaphore(config.OAS_SHARD_FANOUT)
+        done = 0
+        async def request_tile(tile: Tile) -> tuple[Tile, dict[str, np.ndarray]]:
+            nonlocal done
+            dem_indices = tile.indices.tolist()
+            tile_infrastructures = {}
+            for name, infra in infrastructures.items():
+                sup_indices = tile.select_within(sups[name], halo).tolist()
+                weights = [infra.weights[i] for i in sup_indices] if len(infra.weights) > 0 else []
+                tile_infrastructures[name] = Infrastructure(infra.weight, infra.decay, infra.cutoffs, [infra.locations[i] for i in sup_indices], weights)
+            async with semaphore:
+                access = await self._request_multi_criteria([population_locations[i] for i in dem_indices], [population_weights[i] for i in dem_indices], tile_infrastructures, travel_mode)
+            done += 1
+            if progress is not None:
+                progress(done / len(tiles))
+            return tile, access
+
+        results = await asyncio.gather(*[request_tile(tile) for tile in tiles])
+
+        # stitch tile results back in the order of the demand points
+        access = {name: np.full((dem.shape[0],), NO_DATA_VALUE, dtype=np.float32) for name in ["multiCriteria", *infrastructures.keys()]}
+        for tile, tile_access in results:
+            for name, values in tile_access.items():
+                if name not in access:
+                    access[name] = np.full((dem.shape[0],), NO_DATA_VALUE, dtype=np.float32)
+                access[name][tile.indices] = values
+        return access
+
+    async def _request_multi_criteria(self, population_locations: list[tuple[float, float]], population_weights: list[int], infrastructures: dict[str, Infrastructure], travel_mode: str) -> dict[str, np.ndarray]:
         infras = {}
         for name, obj in infrastructures.items():
             infras[name] = {
@@ -58,7 +117,6 @@ class OASMethodService:
                 },
                 "decay": obj.decay,
             }
-        header = {'Content-Type': 'application/json'}
         body = {
             "infrastructures": infras,
             "demand": {
@@ -78,10 +136,15 @@ class OASMethodService:
             },
             "return_all": True,
         }
-        loop = asyncio.get_running_loop()
-        response = await loop.run_in_executor(None, lambda: requests.post(self._oas_url + "/v1/multicriteria/multi", json=body, headers=header))
-        accessibilities = response.json()
-        return accessibilities["access"]
+        accessibilities = await self._client.post("/v1/multicriteria/multi", body)
+        return {name: np.asarray(values, dtype=np.float32) for name, values in accessibilities["access"].items()}
 
-    async def calcSetCoverage(self, population_locations: list[tuple[float, float]], population_weights: list[int], facility_locations: list[tuple[float, float]], max_range: int, percent_coverage: float, travel_mode: str = "driving-car") -> list[bool]:
+    async def calcSetCoverage(self, population_locations: list[tuple[float, float]], population_weights: list[int], facility_locations: list[tuple[float, float]], max_range: int, percent_coverage: float, travel_mode: str = "driving-car", progress: Callable[[float], None] | None = None) -> list[bool]:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="This Method is not implemented")
+
+    def supportsMatrix(self) -> bool:
+        return False
+
+    async def calcMatrix(self, population_locations: list[tuple[float, float]], facility_locations: list[tuple[float, float]], max_range: int, travel_mode: str = "driving-car", progress: Callable[[float], None] | None = None) -> TravelTimeMatrix | None:
+        # the OAS does not provide travel-time matrices, callers fall back to the other methods
+        return None
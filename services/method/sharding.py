@@ -0,0 +1,68 @@
+# Copyright (C) 2023 Authors of the MCDA project - All Rights Reserved
+
+"""Spatial sharding of demand locations into tiles.
+"""
+
+import numpy as np
+
+def get_halo_size(max_range: int, speed_kmh: float, lat: float) -> tuple[float, float]:
+    """Converts a travel-time range to an upper bound of the travelled distance in degrees.
+
+    Args:
+        max_range: travel-time range (seconds)
+        speed_kmh: maximum travel speed
+        lat: latitude used to scale longitudes
+
+    Returns:
+        halo size in degrees (lon, lat)
+    """
+    dist_km = max_range / 3600 * speed_kmh
+    dlat = dist_km / 111.32
+    dlon = dlat / max(float(np.cos(np.radians(lat))), 0.01)
+    return (dlon, dlat)
+
+class Tile:
+    """Set of demand points within a grid cell.
+    """
+    indices: np.ndarray
+    bbox: tuple[float, float, float, float]
+
+    def __init__(self, indices: np.ndarray, bbox: tuple[float, float, float, float]):
+        self.indices = indices
+        self.bbox = bbox
+
+    def select_within(self, points: np.ndarray, halo: tuple[float, float]) -> np.ndarray:
+        """Returns the indices of all points within the halo around the tile.
+        """
+        if points.shape[0] == 0:
+            return np.zeros((0,), dtype=np.int64)
+        inside = (points[:, 0] >= self.bbox[0] - halo[0]) & (points[:, 0] <= self.bbox[2] + halo[0]) \
+               & (points[:, 1] >= self.bbox[1] - halo[1]) & (points[:, 1] <= self.bbox[3] + halo[1])
+        return np.nonzero(inside)[0]
+
+def get_tiles(points: np.ndarray, tile_size: tuple[float, float]) -> list[Tile]:
+    """Partitions points into the (non-empty) cells of a regular grid.
+
+    Args:
+        points: (n, 2) array of lon/lat coordinates
+        tile_size: cell size in degrees (lon, lat)
+
+    Returns:
+        tiles (every point is contained in exactly one tile)
+    """
+    if points.shape[0] == 0:
+        return []
+    origin = points.min(axis=0)
+    cells = np.floor((points - origin) / tile_size).astype(np.int64)
+    keys = cells[:, 0] * (int(cells[:, 1].max()) + 1) + cells[:, 1]
+    unique, inverse = np.unique(keys, return_inverse=True)
+    order = np.argsort(inverse, kind="stable")
+    bounds = np.searchsorted(inverse[order], np.arange(unique.shape[0] + 1))
+    tiles = []
+    for i in range(unique.shape[0]):
+        indices = order[bounds[i]:bounds[i+1]]
+        cx, cy = cells[indices[0]]
+        minx = origin[0] + cx * tile_size[0]
+        miny = origin[1] + cy * tile_size[1]
+        tiles.append(Tile(indices, (minx, miny, minx + tile_size[0], miny + tile_size[1])))
+    return tiles
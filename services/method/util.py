@@ -3,6 +3,7 @@
 """Utility functions and classes.
 """
 
+import numpy as np
 import pyaccess
 
 
@@ -20,6 +21,31 @@ class Infrastructure():
         self.locations = locations
         self.weights = weights  
 
+NO_DATA_VALUE = -9999
+
+def aggregate_multi_criteria(reaches: dict[str, np.ndarray], infrastructures: dict[str, Infrastructure], demand_count: int) -> dict[str, np.ndarray]:
+    """Combines the reachability of every infrastructure to the weighted multi-criteria result.
+
+    Args:
+        reaches: reachability per infrastructure (values <= 0 are unreachable)
+        infrastructures: infrastructure parameters
+        demand_count: number of demand points
+
+    Returns:
+        float32 accessibilities per infrastructure and "multiCriteria" (NO_DATA_VALUE for unreachable cells)
+    """
+    access = {}
+    multi = np.zeros((demand_count,), dtype=np.float32)
+    access["multiCriteria"] = multi
+    for name, reach in reaches.items():
+        reach = np.asarray(reach, dtype=np.float32)
+        valid = reach > 0
+        weight = np.float32(infrastructures[name].weight)
+        multi += np.where(valid, weight * reach, np.float32(0))
+        access[name] = np.where(valid, reach, np.float32(NO_DATA_VALUE))
+    multi[multi <= 0] = NO_DATA_VALUE
+    return access
+
 def get_distance_decay(param: dict) -> pyaccess._pyaccess_ext.IDistanceDecay | None:
     try:
         match param["decay_type"]:
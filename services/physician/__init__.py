@@ -0,0 +1,6 @@
+# Copyright (C) 2023 Authors of the MCDA project - All Rights Reserved
+
+"""Service keeping the physician locations in memory.
+"""
+
+from .store import PhysicianStore, PhysicianSupply, init_physician_store, get_physician_store
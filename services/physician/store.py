@@ -0,0 +1,157 @@
+# Copyright (C) 2023 Authors of the MCDA project - All Rights Reserved
+
+"""In-memory cache of the physician supply.
+"""
+
+import logging
+import numpy as np
+from shapely import Polygon, contains_xy
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from functions.util import get_table
+from functions.physicians import get_physicians
+from services.database import create_db_session
+
+class PhysicianSupply:
+    """Locations and capacities of a single physician type (ordered by pid).
+    """
+    pids: np.ndarray
+    x: np.ndarray
+    y: np.ndarray
+    physician_count: np.ndarray
+    vbe_volume: np.ndarray
+
+    def __init__(self, pids: np.ndarray, x: np.ndarray, y: np.ndarray, physician_count: np.ndarray, vbe_volume: np.ndarray):
+        self.pids = pids
+        self.x = x
+        self.y = y
+        self.physician_count = physician_count
+        self.vbe_volume = vbe_volume
+
+    def get_rows(self, pids: np.ndarray) -> np.ndarray:
+        """Returns the rows of the given pids (unknown pids are skipped).
+        """
+        rows = np.searchsorted(self.pids, pids)
+        rows = rows[rows < self.pids.shape[0]]
+        return np.sort(rows[np.isin(self.pids[rows], pids)])
+
+    def get_rows_within(self, query: Polygon) -> np.ndarray:
+        """Returns the rows of all locations within the query polygon.
+        """
+        return np.nonzero(contains_xy(query, self.x, self.y))[0]
+
+    def get_capacity(self, rows: np.ndarray, capacity_type: str) -> tuple[np.ndarray, np.ndarray] | None:
+        """Returns the rows with non-zero capacity and their capacities (None for unknown capacity types).
+        """
+        if capacity_type == 'facility':
+            return rows, np.ones((rows.shape[0],), dtype=np.int64)
+        if capacity_type == 'physicianNumber':
+            weights = self.physician_count[rows]
+        elif capacity_type == 'employmentVolume':
+            weights = self.vbe_volume[rows]
+        else:
+            return None
+        valid = weights != 0
+        return rows[valid], weights[valid]
+
+class PhysicianStore:
+    """Keeps all physician locations in memory to serve every capacity type without the database.
+
+    Note:
+        - planning-area queries are answered from the precomputed members of the planning areas (if written by populate_db)
+        - physician locations and members are only loaded at startup, after rerunning populate_db the server has to be restarted
+          (until then the store consistently serves the previous physicians)
+    """
+    _physician_ids: dict[str, int]
+    _supplies: dict[int, PhysicianSupply]
+    _members: dict[tuple[str, bool], np.ndarray]
+
+    def __init__(self):
+        self._physician_ids = {}
+        self._supplies = {}
+        self._members = {}
+
+    async def load(self, session: AsyncSession):
+        """Loads "physicians_list", "physicians_locations" and the physician locations of all planning areas.
+        """
+        list_table = get_table("physicians_list")
+        loc_table = get_table("physicians_locations")
+        if list_table is None or loc_table is None:
+            return
+        rows = (await session.execute(select(list_table.c.name, list_table.c.physician_id))).fetchall()
+        self._physician_ids = {str(row[0]): int(row[1]) for row in rows}
+        stmt = select(
+            loc_table.c.physician_id, loc_table.c.pid, func.ST_X(loc_table.c.geometry), func.ST_Y(loc_table.c.geometry), loc_table.c.physician_count, loc_table.c.vbe_volume
+        ).order_by(loc_table.c.physician_id, loc_table.c.pid)
+        data = (await session.execute(stmt)).fetchall()
+        if len(data) > 0:
+            physician_ids = np.array([row[0] for row in data], dtype=np.int64)
+            pids = np.array([row[1] for row in data], dtype=np.int64)
+            x = np.array([row[2] for row in data], dtype=np.float64)
+            y = np.array([row[3] for row in data], dtype=np.float64)
+            # physician counts are served as integers (the column is a float column, fractional counts are kept as floats)
+            physician_count = np.array([row[4] for row in data], dtype=np.float64)
+            if np.array_equal(physician_count, np.round(physician_count)):
+                physician_count = physician_count.astype(np.int64)
+            else:
+                logging.warning("Physician counts are not integral, they are served as floats.")
+            vbe_volume = np.array([row[5] for row in data], dtype=np.float64)
+            ids, starts = np.unique(physician_ids, return_index=True)
+            ends = np.append(starts[1:], len(data))
+            for physician_id, start, end in zip(ids.tolist(), starts, ends):
+                self._supplies[physician_id] = PhysicianSupply(pids[start:end], x[start:end], y[start:end], physician_count[start:end], vbe_volume[start:end])
+        logging.info(f"Loaded {len(data)} physician locations")
+        member_table = get_table("planning_area_members")
+        if member_table is not None:
+            rows = (await session.execute(select(member_table.c.name, member_table.c.buffered, member_table.c.physician_pids))).fetchall()
+            for name, buffered, pids in rows:
+                self._members[(str(name), bool(buffered))] = np.asarray(pids, dtype=np.int64)
+
+    async def get_physicians(self, session: AsyncSession, query: Polygon, physician_name: str, capacity_type: str, planning_area: str | None = None, buffered: bool = False) -> tuple[list[tuple[float, float]], list[float]]:
+        """Same as "functions.physicians.get_physicians" but served from memory.
+
+        Note:
+            - falls back to the database if the physician type has not been loaded
+        """
+        physician_id = self._physician_ids.get(physician_name)
+        if physician_id is None:
+            return await get_physicians(session, query, physician_name, capacity_type, planning_area, buffered)
+        supply = self._supplies.get(physician_id)
+        if supply is None:
+            return [], []
+        members = self._members.get((planning_area, buffered)) if planning_area is not None else None
+        if members is not None:
+            rows = supply.get_rows(members)
+        else:
+            rows = supply.get_rows_within(query)
+        capacity = supply.get_capacity(rows, capacity_type)
+        if capacity is None:
+            return [], []
+        rows, weights = capacity
+        return list(zip(supply.x[rows].tolist(), supply.y[rows].tolist())), weights.tolist()
+
+PHYSICIAN_STORE = None
+
+async def init_physician_store():
+    """Initializes the physician store by loading all physician locations.
+
+    Note:
+        - has to be called after the database has been initialized
+    """
+    global PHYSICIAN_STORE
+    store = PhysicianStore()
+    async with create_db_session() as session:
+        await store.load(session)
+    PHYSICIAN_STORE = store
+
+def get_physician_store() -> PhysicianStore:
+    """Returns the physician store singleton.
+
+    Note:
+        - This can be used as a fastapi dependency
+    """
+    global PHYSICIAN_STORE
+    if PHYSICIAN_STORE is None:
+        raise ValueError("This should not have happened.")
+    return PHYSICIAN_STORE
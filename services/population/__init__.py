@@ -0,0 +1,7 @@
+# Copyright (C) 2023 Authors of the MCDA project - All Rights Reserved
+
+"""Service keeping the population grids in memory.
+"""
+
+from .store import PopulationStore, PopulationGrid, init_population_store, get_population_store, get_auto_resolution
+from .raster import POPULATION_RESOLUTIONS
@@ -0,0 +1,329 @@
+# Copyright (C) 2023 Authors of the MCDA project - All Rights Reserved
+
+"""Dense raster representation of the population grid.
+"""
+
+import json
+import logging
+import os
+import numpy as np
+from pyproj import Transformer
+from shapely import Polygon, MultiPolygon, contains_xy
+from shapely.ops import transform
+
+# the census grid is regular in its source crs (cells are not axis aligned after reprojecting to utm32)
+RASTER_CRS = 3035
+CELL_SIZE = 100
+# cell sizes of the aggregated population levels
+PYRAMID_CELL_SIZES = [250, 500, 1000]
+# all resolutions population values can be requested in
+POPULATION_RESOLUTIONS = [CELL_SIZE, *PYRAMID_CELL_SIZES]
+
+_to_raster = Transformer.from_crs(4326, RASTER_CRS, always_xy=True).transform
+_to_wgs = Transformer.from_crs(RASTER_CRS, 4326, always_xy=True).transform
+_to_utm = Transformer.from_crs(RASTER_CRS, 25832, always_xy=True).transform
+
+def get_meta_file(raster_dir: str) -> str:
+    return f"{raster_dir}/population_raster.json"
+
+def get_cells_file(raster_dir: str) -> str:
+    return f"{raster_dir}/population_cells.npy"
+
+def get_age_group_file(raster_dir: str, group: str, key: str) -> str:
+    return f"{raster_dir}/population_{group}_{key}.npy"
+
+def get_planning_area_file(raster_dir: str, name: str) -> str:
+    return f"{raster_dir}/planning_area_{name}.npz"
+
+def get_pyramid_center_file(raster_dir: str, cell_size: int, axis: str) -> str:
+    return f"{raster_dir}/population_{cell_size}m_center_{axis}.npy"
+
+def get_pyramid_age_group_file(raster_dir: str, cell_size: int, group: str, key: str) -> str:
+    return f"{raster_dir}/population_{cell_size}m_{group}_{key}.npy"
+
+def get_area_km2(polygon: Polygon | MultiPolygon) -> float:
+    """Computes the area of a (wgs84) polygon (in the equal-area raster crs).
+    """
+    return transform(_to_raster, polygon).area / 1000000
+
+class RasterGeometry:
+    """Origin (lower-left corner) and size of the population raster.
+
+    Note:
+        - pids of population cells are computed from their raster cell ("row * width + col + 1")
+    """
+    origin_x: float
+    origin_y: float
+    width: int
+    height: int
+
+    def __init__(self, origin_x: float, origin_y: float, width: int, height: int):
+        self.origin_x = origin_x
+        self.origin_y = origin_y
+        self.width = width
+        self.height = height
+
+    @staticmethod
+    def from_locations(x: np.ndarray, y: np.ndarray) -> "RasterGeometry":
+        """Creates the raster geometry covering all cells with the given (wgs84) centroids.
+        """
+        rx, ry = _to_raster(x, y)
+        origin_x = float(np.floor(np.min(rx) / CELL_SIZE) * CELL_SIZE)
+        origin_y = float(np.floor(np.min(ry) / CELL_SIZE) * CELL_SIZE)
+        width = int(np.floor((np.max(rx) - origin_x) / CELL_SIZE)) + 1
+        height = int(np.floor((np.max(ry) - origin_y) / CELL_SIZE)) + 1
+        return RasterGeometry(origin_x, origin_y, width, height)
+
+    def get_cells(self, x: np.ndarray, y: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Returns the raster rows and columns of the given (wgs84) locations.
+        """
+        rx, ry = _to_raster(np.asarray(x), np.asarray(y))
+        rows = np.floor((np.asarray(ry) - self.origin_y) / CELL_SIZE).astype(np.int64)
+        cols = np.floor((np.asarray(rx) - self.origin_x) / CELL_SIZE).astype(np.int64)
+        return rows, cols
+
+    def get_pids(self, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+        return rows * self.width + cols + 1
+
+    def get_centers(self, rows: np.ndarray, cols: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Returns the cell centroids in raster coordinates.
+        """
+        return self.origin_x + (cols + 0.5) * CELL_SIZE, self.origin_y + (rows + 0.5) * CELL_SIZE
+
+    def get_mask(self, polygon: Polygon | MultiPolygon) -> tuple[int, int, np.ndarray]:
+        """Rasterizes a (wgs84) polygon.
+
+        Returns:
+            first row, first column and boolean mask of the cells (centroids) within the polygon
+        """
+        query = transform(_to_raster, polygon)
+        minx, miny, maxx, maxy = query.bounds
+        row0 = max(int(np.floor((miny - self.origin_y) / CELL_SIZE)), 0)
+        col0 = max(int(np.floor((minx - self.origin_x) / CELL_SIZE)), 0)
+        row1 = min(int(np.floor((maxy - self.origin_y) / CELL_SIZE)) + 1, self.height)
+        col1 = min(int(np.floor((maxx - self.origin_x) / CELL_SIZE)) + 1, self.width)
+        if row1 <= row0 or col1 <= col0:
+            return 0, 0, np.zeros((0, 0), dtype=np.bool_)
+        rows, cols = np.mgrid[row0:row1, col0:col1]
+        cx, cy = self.get_centers(rows, cols)
+        return row0, col0, contains_xy(query, cx, cy)
+
+    def get_level_shape(self, cell_size: int) -> tuple[int, int]:
+        """Returns the shape of the aggregated raster with the given cell size.
+        """
+        return (int(np.ceil(self.height * CELL_SIZE / cell_size)), int(np.ceil(self.width * CELL_SIZE / cell_size)))
+
+    def get_level_cells(self, cell_size: int, rows: np.ndarray, cols: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Returns the cells of the aggregated raster containing the centroids of the given cells.
+        """
+        return ((rows + 0.5) * CELL_SIZE // cell_size).astype(np.int64), ((cols + 0.5) * CELL_SIZE // cell_size).astype(np.int64)
+
+    def to_dict(self) -> dict:
+        return {"crs": RASTER_CRS, "cell_size": CELL_SIZE, "origin_x": self.origin_x, "origin_y": self.origin_y, "width": self.width, "height": self.height}
+
+def remove_planning_area_masks(raster_dir: str):
+    """Removes the precomputed masks of all planning areas ("write_planning_area_mask" has to be rerun afterwards).
+    """
+    if not os.path.isdir(raster_dir):
+        return
+    for file in os.listdir(raster_dir):
+        if file.startswith("planning_area_") and file.endswith(".npz"):
+            os.remove(os.path.join(raster_dir, file))
+
+def write_population_raster(raster_dir: str, geometry: RasterGeometry, rows: np.ndarray, cols: np.ndarray, groups: dict[str, dict[str, np.ndarray]]):
+    """Writes the population rasters (one file per population group and age group).
+
+    Args:
+        raster_dir: output directory
+        geometry: raster geometry
+        rows, cols: raster cells of the population entries
+        groups: population values per population group and age group (ordered as rows/cols)
+
+    Note:
+        - planning-area masks of a previous raster are removed (they depend on the raster geometry)
+    """
+    os.makedirs(raster_dir, exist_ok=True)
+    remove_planning_area_masks(raster_dir)
+    cells = np.lib.format.open_memmap(get_cells_file(raster_dir), mode="w+", dtype=np.bool_, shape=(geometry.height, geometry.width))
+    cells[rows, cols] = True
+    cells.flush()
+    del cells
+    for group, items in groups.items():
+        for key, values in items.items():
+            raster = np.lib.format.open_memmap(get_age_group_file(raster_dir, group, key), mode="w+", dtype=np.int32, shape=(geometry.height, geometry.width))
+            raster[rows, cols] = values
+            raster.flush()
+            del raster
+    with open(get_meta_file(raster_dir), "w") as file:
+        file.write(json.dumps({**geometry.to_dict(), "groups": {group: list(items.keys()) for group, items in groups.items()}}))
+
+def write_population_pyramid(raster_dir: str):
+    """Writes the aggregated population levels (PYRAMID_CELL_SIZES) of the population raster.
+
+    Note:
+        - cells are assigned to the aggregated cell containing their centroid
+        - locations of aggregated cells are the mean centroid of their populated cells
+    """
+    with open(get_meta_file(raster_dir), "r") as file:
+        meta = json.loads(file.read())
+    geometry = RasterGeometry(meta["origin_x"], meta["origin_y"], meta["width"], meta["height"])
+    rows, cols = np.nonzero(np.load(get_cells_file(raster_dir), mmap_mode="r"))
+    cx, cy = geometry.get_centers(rows, cols)
+    for cell_size in PYRAMID_CELL_SIZES:
+        shape = geometry.get_level_shape(cell_size)
+        lrows, lcols = geometry.get_level_cells(cell_size, rows, cols)
+        count = np.zeros(shape, dtype=np.float64)
+        np.add.at(count, (lrows, lcols), 1)
+        for axis, values in [("x", cx), ("y", cy)]:
+            center = np.lib.format.open_memmap(get_pyramid_center_file(raster_dir, cell_size, axis), mode="w+", dtype=np.float64, shape=shape)
+            center[:] = 0
+            np.add.at(center, (lrows, lcols), values)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                center[:] = np.where(count > 0, center / count, np.nan)
+            center.flush()
+            del center
+        for group, keys in meta["groups"].items():
+            for key in keys:
+                values = np.load(get_age_group_file(raster_dir, group, key), mmap_mode="r")[rows, cols]
+                raster = np.lib.format.open_memmap(get_pyramid_age_group_file(raster_dir, cell_size, group, key), mode="w+", dtype=np.int32, shape=shape)
+                raster[:] = 0
+                np.add.at(raster, (lrows, lcols), values)
+                raster.flush()
+                del raster
+
+def write_planning_area_mask(raster_dir: str, name: str, polygon: Polygon | MultiPolygon):
+    """Precomputes the raster mask of a planning area (requires the population raster to be written first).
+    """
+    with open(get_meta_file(raster_dir), "r") as file:
+        meta = json.loads(file.read())
+    geometry = RasterGeometry(meta["origin_x"], meta["origin_y"], meta["width"], meta["height"])
+    row, col, mask = geometry.get_mask(polygon)
+    np.savez(get_planning_area_file(raster_dir, name), row=row, col=col, mask=mask)
+
+class PyramidLevel:
+    """Aggregated population raster with a coarser cell size.
+    """
+    cell_size: int
+    _center_x: np.ndarray
+    _center_y: np.ndarray
+    _groups: dict[str, dict[str, np.ndarray]]
+
+    def __init__(self, raster_dir: str, cell_size: int, groups: dict[str, list[str]]):
+        self.cell_size = cell_size
+        self._center_x = np.load(get_pyramid_center_file(raster_dir, cell_size, "x"), mmap_mode="r")
+        self._center_y = np.load(get_pyramid_center_file(raster_dir, cell_size, "y"), mmap_mode="r")
+        self._groups = {}
+        for group, keys in groups.items():
+            self._groups[group] = {key: np.load(get_pyramid_age_group_file(raster_dir, cell_size, group, key), mmap_mode="r") for key in keys}
+
+    def get_locations(self, rows: np.ndarray, cols: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Returns the (wgs84) locations of the given aggregated cells.
+        """
+        wx, wy = _to_wgs(self._center_x[rows, cols], self._center_y[rows, cols])
+        return np.asarray(wx), np.asarray(wy)
+
+    def get_weights(self, group: str, keys: list[str], rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+        """Sums the population of the given age groups for every aggregated cell.
+        """
+        weights = np.zeros((rows.shape[0],), dtype=np.int64)
+        for key in keys:
+            weights += self._groups[group][key][rows, cols]
+        return weights
+
+class PopulationRaster:
+    """Memory-mapped population raster.
+
+    Note:
+        - rasters are only read within the window of a query
+        - planning-area masks are precomputed during population of the database ("write_planning_area_mask")
+        - masks are read once per planning area (the server has to be restarted after rewriting them)
+    """
+    _dir: str
+    _geometry: RasterGeometry
+    _cells: np.ndarray
+    _groups: dict[str, dict[str, np.ndarray]]
+    _area_masks: dict[str, tuple[int, int, np.ndarray] | None]
+    _levels: dict[int, PyramidLevel]
+
+    def __init__(self, raster_dir: str):
+        self._dir = raster_dir
+        with open(get_meta_file(raster_dir), "r") as file:
+            meta = json.loads(file.read())
+        if meta["crs"] != RASTER_CRS or meta["cell_size"] != CELL_SIZE:
+            raise ValueError("Invalid population raster.")
+        self._geometry = RasterGeometry(meta["origin_x"], meta["origin_y"], meta["width"], meta["height"])
+        self._cells = np.load(get_cells_file(raster_dir), mmap_mode="r")
+        self._groups = {}
+        for group, keys in meta["groups"].items():
+            self._groups[group] = {key: np.load(get_age_group_file(raster_dir, group, key), mmap_mode="r") for key in keys}
+        self._area_masks = {}
+        self._levels = {}
+        for cell_size in PYRAMID_CELL_SIZES:
+            if os.path.isfile(get_pyramid_center_file(raster_dir, cell_size, "x")):
+                self._levels[cell_size] = PyramidLevel(raster_dir, cell_size, meta["groups"])
+
+    def get_geometry(self) -> RasterGeometry:
+        return self._geometry
+
+    def has_group(self, group: str) -> bool:
+        return group in self._groups
+
+    def get_level(self, cell_size: int) -> PyramidLevel | None:
+        return self._levels.get(cell_size)
+
+    def get_cells_from_pids(self, pids: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        return (pids - 1) // self._geometry.width, (pids - 1) % self._geometry.width
+
+    def matches(self, pids: np.ndarray, x: np.ndarray, y: np.ndarray) -> bool:
+        """Checks whether the pids of the population table follow the raster layout (tested on a sample of cells).
+        """
+        sample = np.linspace(0, pids.shape[0] - 1, min(pids.shape[0], 1000)).astype(np.int64)
+        rows, cols = self._geometry.get_cells(x[sample], y[sample])
+        return bool(np.all(self._geometry.get_pids(rows, cols) == pids[sample]))
+
+    def _get_area_mask(self, name: str) -> tuple[int, int, np.ndarray] | None:
+        if name not in self._area_masks:
+            file = get_planning_area_file(self._dir, name)
+            if os.path.isfile(file):
+                data = np.load(file)
+                self._area_masks[name] = (int(data["row"]), int(data["col"]), data["mask"])
+            else:
+                self._area_masks[name] = None
+        return self._area_masks[name]
+
+    def _select_cells(self, row0: int, col0: int, mask: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        window = self._cells[row0:row0+mask.shape[0], col0:col0+mask.shape[1]]
+        rows, cols = np.nonzero(mask & window)
+        return rows + row0, cols + col0
+
+    def get_cells_within(self, query: Polygon | MultiPolygon) -> tuple[np.ndarray, np.ndarray]:
+        """Returns the rows and columns of all population cells within the (wgs84) query.
+        """
+        return self._select_cells(*self._geometry.get_mask(query))
+
+    def get_cells_in_area(self, name: str) -> tuple[np.ndarray, np.ndarray] | None:
+        """Returns the rows and columns of all population cells within the planning area (None if no mask exists).
+        """
+        mask = self._get_area_mask(name)
+        if mask is None:
+            return None
+        return self._select_cells(*mask)
+
+    def get_pids(self, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+        return self._geometry.get_pids(rows, cols)
+
+    def get_utm_locations(self, rows: np.ndarray, cols: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        cx, cy = self._geometry.get_centers(rows, cols)
+        ux, uy = _to_utm(cx, cy)
+        return np.asarray(ux), np.asarray(uy)
+
+def load_population_raster(raster_dir: str) -> PopulationRaster | None:
+    """Loads the population raster (None if it has not been written).
+    """
+    if not os.path.isfile(get_meta_file(raster_dir)):
+        return None
+    try:
+        return PopulationRaster(raster_dir)
+    except Exception:
+        logging.exception("Failed to load population raster")
+        return None
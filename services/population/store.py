@@ -0,0 +1,268 @@
+# Copyright (C) 2023 Authors of the MCDA project - All Rights Reserved
+
+"""In-memory columnar store of the population tables.
+"""
+
+import logging
+import numpy as np
+from shapely import Polygon, contains_xy
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from functions.util import get_table
+import config
+from functions.population import get_population_values, get_population_geometry
+from .raster import PopulationRaster, load_population_raster, get_area_km2, CELL_SIZE
+from services.database import create_db_session
+
+class PopulationGrid:
+    """Columns of a single population table (one entry per grid cell).
+
+    Note:
+        - rows are addressed through the pid of the table ("get_rows")
+        - locations are the centroids of the cells
+    """
+    pids: np.ndarray
+    x: np.ndarray
+    y: np.ndarray
+    utm_x: np.ndarray
+    utm_y: np.ndarray
+    age_groups: dict[str, np.ndarray]
+    _order: np.ndarray
+    _sorted_pids: np.ndarray
+
+    def __init__(self, pids: np.ndarray, x: np.ndarray, y: np.ndarray, utm_x: np.ndarray, utm_y: np.ndarray, age_groups: dict[str, np.ndarray]):
+        self.pids = pids
+        self.x = x
+        self.y = y
+        self.utm_x = utm_x
+        self.utm_y = utm_y
+        self.age_groups = age_groups
+        # pids are looked up by binary search (pids can be sparse, e.g. raster cell ids)
+        self._order = np.argsort(pids, kind="stable")
+        self._sorted_pids = pids[self._order]
+
+    def get_rows(self, pids: np.ndarray) -> np.ndarray:
+        """Returns the rows of the given pids (-1 for unknown pids).
+        """
+        if self._sorted_pids.shape[0] == 0:
+            return np.full((pids.shape[0],), -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self._sorted_pids, pids), self._sorted_pids.shape[0] - 1)
+        return np.where(self._sorted_pids[pos] == pids, self._order[pos], -1)
+
+    def get_rows_within(self, query: Polygon) -> np.ndarray:
+        """Returns the rows of all cells whose centroid lies within the query polygon.
+        """
+        minx, miny, maxx, maxy = query.bounds
+        candidates = np.nonzero((self.x >= minx) & (self.x <= maxx) & (self.y >= miny) & (self.y <= maxy))[0]
+        return candidates[contains_xy(query, self.x[candidates], self.y[candidates])]
+
+    def get_weights(self, rows: np.ndarray, keys: list[str]) -> np.ndarray:
+        """Sums the population of the given age groups for every row.
+        """
+        weights = np.zeros((rows.shape[0],), dtype=np.int64)
+        for key in keys:
+            weights += self.age_groups[key][rows]
+        return weights
+
+class PopulationStore:
+    """Keeps all population tables in memory to serve population requests without the database.
+
+    Note:
+        - population types are resolved the same way as by "functions.population.get_population_values"
+        - query extents are tested against cell centroids (instead of the cell geometries used by PostGIS)
+        - population geometries are served from the population raster (if it has been written by populate_db and matches the tables)
+        - planning-area queries are answered from the precomputed members of the planning areas (if written by populate_db)
+        - population tables and members are only loaded at startup, after rerunning populate_db the server has to be restarted
+          (until then the store consistently serves the previous population)
+    """
+    _grids: dict[str, PopulationGrid]
+    _age_groups: dict[str, list[str]]
+    _raster: PopulationRaster | None
+    _members: dict[tuple[str, bool], np.ndarray]
+
+    def __init__(self, raster: PopulationRaster | None = None):
+        self._grids = {}
+        self._age_groups = {}
+        self._raster = raster
+        self._members = {}
+
+    async def load(self, session: AsyncSession):
+        """Loads all population tables listed in "population_list" and the population cells of all planning areas.
+        """
+        member_table = get_table("planning_area_members")
+        if member_table is not None:
+            rows = (await session.execute(select(member_table.c.name, member_table.c.buffered, member_table.c.population_pids))).fetchall()
+            for name, buffered, pids in rows:
+                self._members[(str(name), bool(buffered))] = np.asarray(pids, dtype=np.int64)
+        list_table = get_table("population_list")
+        if list_table is None:
+            return
+        rows = (await session.execute(select(list_table.c.name, list_table.c.table_name, list_table.c.meta_table_name))).fetchall()
+        for name, table_name, meta_table_name in rows:
+            pop_table = get_table(table_name)
+            meta_table = get_table(meta_table_name)
+            if pop_table is None or meta_table is None:
+                continue
+            keys = [str(row[0]) for row in (await session.execute(select(meta_table.c.age_group_key))).fetchall()]
+            columns = [pop_table.c.pid, pop_table.c.x, pop_table.c.y, pop_table.c.utm_x, pop_table.c.utm_y, *[getattr(pop_table.c, key) for key in keys]]
+            data = (await session.execute(select(*columns))).fetchall()
+            if len(data) == 0:
+                continue
+            arr = np.array(data, dtype=np.float64)
+            age_groups = {key: arr[:, 5+i].astype(np.int32) for i, key in enumerate(keys)}
+            self._grids[name] = PopulationGrid(arr[:, 0].astype(np.int64), arr[:, 1].copy(), arr[:, 2].copy(), arr[:, 3].copy(), arr[:, 4].copy(), age_groups)
+            self._age_groups[name] = keys
+            logging.info(f"Loaded population {name} ({len(data)} cells)")
+            grid = self._grids[name]
+            if self._raster is not None and not self._raster.matches(grid.pids, grid.x, grid.y):
+                logging.warning("Population raster does not match the population tables, it will not be used.")
+                self._raster = None
+
+    def get_grid(self, name: str) -> PopulationGrid | None:
+        return self._grids.get(name)
+
+    async def get_population_values(self, session: AsyncSession, query: Polygon | None = None, indices: list[int] | None = None, typ: str = 'standard_all', age_groups: list[str] = [], planning_area: str | None = None, buffered: bool = False) -> tuple[list[tuple[float, float]], list[int]]:
+        """Same as "functions.population.get_population_values" but served from memory.
+
+        Note:
+            - falls back to the database if the population type has not been loaded
+        """
+        if query is None and indices is None:
+            return [], []
+        name = typ
+        keys = age_groups
+        if typ == "standard_all":
+            name = "standard"
+            keys = self._age_groups.get(name, [])
+        grid = self._grids.get(name)
+        if grid is None:
+            return await get_population_values(session, query, indices, typ, age_groups, planning_area, buffered)
+        if len(keys) == 0 or any(key not in grid.age_groups for key in keys):
+            return [], []
+        rows = _get_rows(grid, query, indices, self._get_members(query, planning_area, buffered))
+        # unknown indices are kept as empty cells to preserve the order of the indices-list
+        found = rows >= 0
+        x = np.where(found, grid.x[rows], 0)
+        y = np.where(found, grid.y[rows], 0)
+        weights = np.where(found, grid.get_weights(rows, keys), 0)
+        return list(zip(x.tolist(), y.tolist())), weights.tolist()
+
+    async def get_aggregated_population_values(self, session: AsyncSession, query: Polygon | None = None, indices: list[int] | None = None, typ: str = 'standard_all', age_groups: list[str] = [], resolution: int | None = None, planning_area: str | None = None, buffered: bool = False) -> tuple[list[tuple[float, float]], list[int], np.ndarray, int]:
+        """Same as "get_population_values" but aggregated to a level of the population pyramid.
+
+        Args:
+            resolution: cell size of the level (100, 250, 500 or 1000), picked from the size of the query extent if None
+
+        Returns:
+            locations: list of locations of the aggregated cells
+            weights: list of population weights of the aggregated cells
+            mapping: index of the aggregated cell for every population cell (ordered as returned by "get_population_values")
+            resolution: cell size of the returned cells
+
+        Note:
+            - falls back to the full resolution (identity mapping) if the level is not available
+        """
+        if resolution is None:
+            resolution = get_auto_resolution(query)
+        name = "standard" if typ == "standard_all" else typ
+        keys = self._age_groups.get(name, []) if typ == "standard_all" else age_groups
+        grid = self._grids.get(name)
+        level = self._raster.get_level(resolution) if self._raster is not None else None
+        if level is None or grid is None or self._raster is None or not self._raster.has_group(name) or len(keys) == 0 or any(key not in grid.age_groups for key in keys):
+            locations, weights = await self.get_population_values(session, query, indices, typ, age_groups, planning_area, buffered)
+            return locations, weights, np.arange(len(locations)), CELL_SIZE
+        rows = _get_rows(grid, query, indices, self._get_members(query, planning_area, buffered))
+        found = rows >= 0
+        cell_rows, cell_cols = self._raster.get_cells_from_pids(grid.pids[rows])
+        level_rows, level_cols = self._raster.get_geometry().get_level_cells(resolution, cell_rows, cell_cols)
+        level_ids = np.where(found, level_rows * (int(level_cols.max(initial=0)) + 1) + level_cols, -1)
+        unique, first, mapping = np.unique(level_ids, return_index=True, return_inverse=True)
+        # unknown indices are mapped to an empty cell
+        valid = unique >= 0
+        x = np.zeros((unique.shape[0],), dtype=np.float64)
+        y = np.zeros((unique.shape[0],), dtype=np.float64)
+        weights = np.zeros((unique.shape[0],), dtype=np.int64)
+        x[valid], y[valid] = level.get_locations(level_rows[first[valid]], level_cols[first[valid]])
+        weights[valid] = level.get_weights(name, keys, level_rows[first[valid]], level_cols[first[valid]])
+        return list(zip(x.tolist(), y.tolist())), weights.tolist(), mapping, resolution
+
+    def _get_members(self, query: Polygon | None, planning_area: str | None, buffered: bool) -> np.ndarray | None:
+        if query is None or planning_area is None:
+            return None
+        return self._members.get((planning_area, buffered))
+
+    async def get_population_geometry(self, session: AsyncSession, query: Polygon, typ: str = 'standard_all', planning_area: str | None = None) -> tuple[list[int], list[tuple[float, float]]]:
+        """Same as "functions.population.get_population_geometry" but served from the population raster.
+
+        Note:
+            - planning areas are looked up by their precomputed raster masks (query is used if no mask exists)
+            - falls back to the database if no (matching) raster is available
+        """
+        name = "standard" if typ == "standard_all" else typ
+        if self._raster is None or name not in self._grids:
+            return await get_population_geometry(session, query, typ, planning_area)
+        cells = None
+        if planning_area is not None:
+            cells = self._raster.get_cells_in_area(planning_area)
+        if cells is None:
+            cells = self._raster.get_cells_within(query)
+        rows, cols = cells
+        pids = self._raster.get_pids(rows, cols)
+        utm_x, utm_y = self._raster.get_utm_locations(rows, cols)
+        return pids.tolist(), list(zip(utm_x.tolist(), utm_y.tolist()))
+
+def _get_rows(grid: PopulationGrid, query: Polygon | None, indices: list[int] | None, members: np.ndarray | None = None) -> np.ndarray:
+    # rows of the indices-list first, rows of additional cells within the query (or the planning-area members) afterwards
+    if indices is not None:
+        rows = grid.get_rows(np.asarray(indices, dtype=np.int64))
+    else:
+        rows = np.zeros((0,), dtype=np.int64)
+    if members is not None:
+        extra = grid.get_rows(members)
+        extra = extra[extra >= 0]
+        if indices is not None:
+            extra = extra[~np.isin(extra, rows)]
+        rows = np.concatenate([rows, extra])
+    elif query is not None:
+        extra = grid.get_rows_within(query)
+        if indices is not None:
+            extra = extra[~np.isin(extra, rows)]
+        rows = np.concatenate([rows, extra])
+    return rows
+
+def get_auto_resolution(query: Polygon | None) -> int:
+    """Picks the resolution of the population pyramid from the size of the query extent.
+    """
+    if query is None:
+        return 100
+    area = get_area_km2(query)
+    for max_area, resolution in config.POPULATION_AUTO_RESOLUTION:
+        if area <= max_area:
+            return resolution
+    return 1000
+
+POPULATION_STORE = None
+
+async def init_population_store():
+    """Initializes the population store by loading all population tables.
+
+    Note:
+        - has to be called after the database has been initialized
+    """
+    global POPULATION_STORE
+    store = PopulationStore(load_population_raster(config.POPULATION_RASTER_DIR))
+    async with create_db_session() as session:
+        await store.load(session)
+    POPULATION_STORE = store
+
+def get_population_store() -> PopulationStore:
+    """Returns the population store singleton.
+
+    Note:
+        - This can be used as a fastapi dependency
+    """
+    global POPULATION_STORE
+    if POPULATION_STORE is None:
+        raise ValueError("This should not have happened.")
+    return POPULATION_STORE
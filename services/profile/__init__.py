@@ -3,4 +3,5 @@
 """Service for interacting with the pyaccess library.
 """
 
-from .profiles import ProfileManager, get_profile_manager, init_profile_manager, IRoutingProfile
\ No newline at end of file
+from .profiles import ProfileManager, get_profile_manager, init_profile_manager, IRoutingProfile
+from .matrix import TravelTimeMatrix
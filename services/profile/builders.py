@@ -6,6 +6,8 @@
 import numpy as np
 import pyaccess
 
+from .snapping import remove_snapping_cache
+
 def build_driving_car(osm_file: str, store: bool = False, store_dir: str = "") -> pyaccess.Graph:
     nodes, edges = pyaccess.parse_osm(osm_file, "driving")
     graph = pyaccess.new_graph(nodes, edges)
@@ -24,6 +26,7 @@ def build_driving_car(osm_file: str, store: bool = False, store_dir: str = "") -
         graph.store("driving-car", store_dir)
         nodes.to_feather(f"{store_dir}/driving-car-nodes")
         edges.to_feather(f"{store_dir}/driving-car-edges")
+        remove_snapping_cache("driving-car", store_dir)
     return graph
 
 def build_walking_foot(osm_file: str, store: bool = False, store_dir: str = "") -> pyaccess.Graph:
@@ -44,6 +47,7 @@ def build_walking_foot(osm_file: str, store: bool = False, store_dir: str = "")
         graph.store("walking-foot", store_dir)
         nodes.to_feather(f"{store_dir}/walking-foot-nodes")
         edges.to_feather(f"{store_dir}/walking-foot-edges")
+        remove_snapping_cache("walking-foot", store_dir)
     return graph
 
 def build_public_transit(graph: pyaccess.Graph, gtfs_dir: str, gtfs_filter_polygon, store: bool = False, store_dir: str = "") -> pyaccess.Graph:
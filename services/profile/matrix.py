@@ -0,0 +1,148 @@
+# Copyright (C) 2023 Authors of the MCDA project - All Rights Reserved
+
+"""Sparse travel-time matrix shared by the accessibility methods.
+"""
+
+from typing import Callable
+import numpy as np
+from scipy.sparse import csr_matrix, hstack
+
+class TravelTimeMatrix:
+    """Sparse (CSR) demand x supply travel-time matrix.
+
+    Note:
+        - only travel-times up to max_range are stored
+        - supply columns can be looked up by location to reuse the matrix for subsets of the supply
+        - times are stored explicitly (a travel-time of 0 is a valid entry)
+        - matrices are never modified in place (they can be shared between sessions)
+    """
+    _indptr: np.ndarray
+    _indices: np.ndarray
+    _times: np.ndarray
+    _demand_count: int
+    _supply_count: int
+    _supply_locations: list[tuple[float, float]]
+    _supply_mapping: dict[tuple[float, float], int]
+    _max_range: int
+
+    def __init__(self, indptr: np.ndarray, indices: np.ndarray, times: np.ndarray, supply_locations: list[tuple[float, float]], max_range: int):
+        self._indptr = indptr
+        self._indices = indices
+        self._times = times
+        self._demand_count = indptr.shape[0] - 1
+        self._supply_count = len(supply_locations)
+        self._supply_locations = supply_locations
+        self._supply_mapping = {(p[0], p[1]): i for i, p in enumerate(supply_locations)}
+        self._max_range = max_range
+
+    def get_nbytes(self) -> int:
+        """Estimates the memory used by the matrix.
+        """
+        return self._indptr.nbytes + self._indices.nbytes + self._times.nbytes + 96 * self._supply_count
+
+    def get_max_range(self) -> int:
+        return self._max_range
+
+    def get_demand_count(self) -> int:
+        return self._demand_count
+
+    def get_columns(self, locations: list[tuple[float, float]]) -> np.ndarray | None:
+        """Returns the matrix columns of the given supply locations (None if any location is not part of the matrix).
+        """
+        cols = np.empty((len(locations),), dtype=np.int32)
+        for i, p in enumerate(locations):
+            col = self._supply_mapping.get((p[0], p[1]))
+            if col is None:
+                return None
+            cols[i] = col
+        return cols
+
+    def get_missing_locations(self, locations: list[tuple[float, float]]) -> list[tuple[float, float]]:
+        """Returns the (unique) supply locations that are not part of the matrix.
+        """
+        missing = {}
+        for p in locations:
+            if (p[0], p[1]) not in self._supply_mapping:
+                missing[(p[0], p[1])] = None
+        return list(missing.keys())
+
+    def extend(self, other: "TravelTimeMatrix") -> "TravelTimeMatrix":
+        """Returns a new matrix with the supply columns of other (computed for the same demand points) appended.
+        """
+        if other._demand_count != self._demand_count:
+            raise ValueError("matrices have to share the demand points")
+        # shift times by one to keep zero travel-times as explicit entries
+        a = csr_matrix((self._times + 1, self._indices, self._indptr), shape=(self._demand_count, self._supply_count))
+        b = csr_matrix((other._times + 1, other._indices, other._indptr), shape=(other._demand_count, other._supply_count))
+        mat = hstack([a, b], format="csr")
+        return TravelTimeMatrix(mat.indptr, mat.indices, mat.data - 1, self._supply_locations + other._supply_locations, min(self._max_range, other._max_range))
+
+    def select_rows(self, rows: np.ndarray) -> "TravelTimeMatrix":
+        """Returns a new matrix consisting of the given demand rows (rows may be repeated).
+        """
+        # shift times by one to keep zero travel-times as explicit entries
+        mat = csr_matrix((self._times + 1, self._indices, self._indptr), shape=(self._demand_count, self._supply_count))[rows]
+        return TravelTimeMatrix(mat.indptr, mat.indices, mat.data - 1, self._supply_locations, self._max_range)
+
+    def select(self, data: np.ndarray, cols: np.ndarray, rows: np.ndarray | None = None) -> csr_matrix:
+        """Builds a demand x len(cols) matrix from per-entry data (e.g. decayed weights) restricted to the given columns.
+
+        Note:
+            - zero-valued entries are dropped from the result
+            - if rows is given only those demand rows are contained in the result
+        """
+        mat = csr_matrix((data, self._indices, self._indptr), shape=(self._demand_count, self._supply_count))
+        if rows is not None:
+            mat = mat[rows]
+        sel = csr_matrix((np.ones((cols.shape[0],), dtype=data.dtype), (cols, np.arange(cols.shape[0]))), shape=(self._supply_count, cols.shape[0]))
+        return (mat @ sel).tocsr()
+
+    def get_decay_weights(self, decay, max_range: int) -> np.ndarray:
+        """Computes the decayed weight of every stored entry.
+
+        Args:
+            decay: distance decay (IDistanceDecay)
+            max_range: maximum range of the decay
+
+        Returns:
+            per-entry weights (0 for entries beyond max_range)
+        """
+        lookup = np.zeros((self._max_range + 2,), dtype=np.float32)
+        for t in range(min(max_range, self._max_range) + 1):
+            lookup[t] = decay.get_distance_weight(t)
+        return lookup[np.minimum(self._times, self._max_range + 1)]
+
+    def get_range_mask(self, max_range: int) -> np.ndarray:
+        """Returns 1 for every stored entry within max_range, else 0.
+        """
+        return (self._times <= max_range).astype(np.float32)
+
+def build_travel_time_matrix(calc_dense: Callable[[list[tuple[float, float]]], np.ndarray], dem_points: list[tuple[float, float]], sup_points: list[tuple[float, float]], max_range: int, chunk_size: int = 10000, progress: Callable[[float], None] | None = None) -> TravelTimeMatrix:
+    """Builds a sparse travel-time matrix from dense one-to-many results.
+
+    Args:
+        calc_dense: computes the dense travel-times from a chunk of demand points to all supply points (negative if unreachable)
+        dem_points: demand locations
+        sup_points: supply locations (used to lookup matrix columns)
+        max_range: maximum travel-time to be stored
+        chunk_size: number of demand rows computed at once (bounds the size of the dense intermediate)
+        progress: called with the fraction of computed demand rows after every chunk
+
+    Returns:
+        travel-time matrix
+    """
+    indptr = np.zeros((len(dem_points) + 1,), dtype=np.int64)
+    indices = []
+    times = []
+    for start in range(0, len(dem_points), chunk_size):
+        dense = np.asarray(calc_dense(dem_points[start:start+chunk_size]))
+        rows, cols = np.nonzero((dense >= 0) & (dense <= max_range))
+        indptr[start+1:start+dense.shape[0]+1] = np.bincount(rows, minlength=dense.shape[0])
+        indices.append(cols.astype(np.int32))
+        times.append(dense[rows, cols].astype(np.int32))
+        if progress is not None:
+            progress((start + dense.shape[0]) / len(dem_points))
+    np.cumsum(indptr, out=indptr)
+    if len(indices) == 0:
+        return TravelTimeMatrix(indptr, np.zeros((0,), dtype=np.int32), np.zeros((0,), dtype=np.int32), sup_points, max_range)
+    return TravelTimeMatrix(indptr, np.concatenate(indices), np.concatenate(times), sup_points, max_range)
@@ -3,7 +3,8 @@
 """Module containing the actual service.
 """
 
-from typing import Protocol
+from typing import Callable, Protocol
+import logging
 import numpy as np
 import pyaccess
 
@@ -11,10 +12,17 @@ import config
 from .routing_profile import RoutingProfile
 from .transit_profile import TransitProfile
 from .builders import build_driving_car, build_walking_foot, build_public_transit
+from .snapping import SnappingIndex
+from .matrix import TravelTimeMatrix
 
 class IRoutingProfile(Protocol):
     """Routing profile interface
     """
+    def snap(self, points: list[tuple[float, float]]) -> tuple[np.ndarray, list[tuple[float, float]]]:
+        """Returns the graph node every point is snapped to and the location of that node.
+        """
+        ...
+
     def calc_reachability(self, dem_points: list[tuple[float, float]], sup_points: list[tuple[float, float]], decay: pyaccess._pyaccess_ext.IDistanceDecay) -> tuple[np.ndarray, np.ndarray]:
         ...
 
@@ -24,6 +32,9 @@ class IRoutingProfile(Protocol):
     def calc_2sfca(self, dem_points: list[tuple[float, float]], dem_weights: list[int], sup_points: list[tuple[float, float]], sup_weights: list[int], decay: pyaccess._pyaccess_ext.IDistanceDecay) -> np.ndarray:
         ...
 
+    def calc_matrix(self, dem_points: list[tuple[float, float]], sup_points: list[tuple[float, float]], max_range: int, progress: Callable[[float], None] | None = None) -> TravelTimeMatrix:
+        ...
+
 class Profile:
     """Profile class
     """
@@ -36,29 +47,40 @@ class ProfileManager:
     """Profile manager class
     """
     _graphs: dict[str, pyaccess.Graph]
+    _snappings: dict[str, SnappingIndex | None]
     _profiles: dict[str, Profile]
 
     def __init__(self):
         self._graphs = {}
+        self._snappings = {}
         self._profiles = {}
 
-    def add_profile(self, name: str, graph: pyaccess.Graph, weights: list[str]):
+    def add_profile(self, name: str, graph: pyaccess.Graph, snapping: SnappingIndex | None, weights: list[str]):
         self._graphs[name] = graph
+        self._snappings[name] = snapping
         self._profiles[name] = Profile(weights)
 
+    def store_snappings(self):
+        """Persists the snapping caches of all profiles.
+        """
+        for snapping in set(self._snappings.values()):
+            if snapping is not None:
+                snapping.store()
+
     def has_profile(self, name: str) -> bool:
         return name in self._profiles
 
     def get_profile(self, profile: str, weight: str = "time", weekday: str = "wednesday", timespan: tuple[int , int]= (28800, 36000)) -> IRoutingProfile | None:
         graph = self._graphs[profile]
+        snapping = self._snappings[profile]
         params = self._profiles[profile]
         if weight not in params._weights:
             raise Exception(f"Weight {weight} not found in profile {profile}")
         match profile:
             case "driving-car" | "walking-foot":
-                return RoutingProfile(graph, weight)
+                return RoutingProfile(graph, weight, snapping)
             case "public-transit":
-                return TransitProfile(graph, weekday, timespan[0], timespan[1])
+                return TransitProfile(graph, weekday, timespan[0], timespan[1], snapping)
             case _:
                 return None
 
@@ -68,15 +90,25 @@ def _load_or_create_profiles() -> ProfileManager:
     profile_manager = ProfileManager()
     # load or create profiles
     graph_cache: dict[str, pyaccess.Graph] = {}
+    snapping_cache: dict[str, SnappingIndex | None] = {}
+    def get_snapping(graph_name: str) -> SnappingIndex | None:
+        # snapping is optional (only used to merge demand points), errors must not trigger a graph rebuild
+        if graph_name not in snapping_cache:
+            try:
+                snapping_cache[graph_name] = SnappingIndex(graph_name, config.GRAPH_DIR)
+            except Exception:
+                logging.warning(f"Failed to load the graph nodes of {graph_name}, demand points will not be merged.")
+                snapping_cache[graph_name] = None
+        return snapping_cache[graph_name]
     for profile in config.ROUTING_PROFILES:
         if profile_manager.has_profile(profile):
             continue
+        match profile:
+            case "public-transit":
+                graph_name = "walking-foot"
+            case _:
+                graph_name = profile
         try:
-            match profile:
-                case "public-transit":
-                    graph_name = "walking-foot"
-                case _:
-                    graph_name = profile
             if graph_name in graph_cache:
                 graph = graph_cache[graph_name]
             else:
@@ -85,7 +117,6 @@ def _load_or_create_profiles() -> ProfileManager:
             if profile == "public-transit":
                 if not graph.has_public_transit("transit"):
                     raise ValueError("")
-            profile_manager.add_profile(profile, graph, ["time"])
         except:
             match profile:
                 case "driving-car":
@@ -101,7 +132,9 @@ def _load_or_create_profiles() -> ProfileManager:
                         graph = build_walking_foot(config.GRAPH_OSM_FILE, store=True, store_dir=config.GRAPH_DIR)
                         graph_cache["walking-foot"] = graph
                     graph = build_public_transit(graph, config.GRAPH_GTFS_DIR, config.GRAPH_GTFS_FILTER_POLYGON, store=True)
-            profile_manager.add_profile(profile, graph, ["time"])
+            # graph might have been rebuild (node ids changed)
+            snapping_cache.pop(graph_name, None)
+        profile_manager.add_profile(profile, graph, get_snapping(graph_name), ["time"])
     return profile_manager
 
 PROFILES = None
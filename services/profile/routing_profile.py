@@ -3,18 +3,31 @@
 """Profile class for routing graphs.
 """
 
+from typing import Callable
 import numpy as np
 import pyaccess
 
+from .snapping import SnappingIndex
+from .matrix import TravelTimeMatrix, build_travel_time_matrix
+
 class RoutingProfile:
     """Profile class for routing graphs.
     """
     _graph: pyaccess.Graph
     _weight: str
+    _snapping: SnappingIndex | None
 
-    def __init__(self, graph: pyaccess.Graph, _weight: str):
+    def __init__(self, graph: pyaccess.Graph, _weight: str, snapping: SnappingIndex | None):
         self._graph = graph
         self._weight = _weight
+        self._snapping = snapping
+
+    def snap(self, points: list[tuple[float, float]]) -> tuple[np.ndarray, list[tuple[float, float]]]:
+        # without snapping index every point is treated as its own node
+        if self._snapping is None:
+            return np.arange(len(points)), list(points)
+        nodes = self._snapping.snap(points)
+        return nodes, self._snapping.get_locations(nodes)
 
     def calc_reachability(self, dem_points: list[tuple[float, float]], sup_points: list[tuple[float, float]], decay: pyaccess._pyaccess_ext.IDistanceDecay) -> tuple[np.ndarray, np.ndarray]:
         return pyaccess.calc_reachability_2(self._graph, dem_points, sup_points, decay, weight=self._weight)
@@ -24,3 +37,8 @@ class RoutingProfile:
 
     def calc_2sfca(self, dem_points: list[tuple[float, float]], dem_weights: list[int], sup_points: list[tuple[float, float]], sup_weights: list[int], decay: pyaccess._pyaccess_ext.IDistanceDecay) -> np.ndarray:
         return pyaccess.calc_2sfca(self._graph, dem_points, dem_weights, sup_points, sup_weights, decay, weight=self._weight)
+
+    def calc_matrix(self, dem_points: list[tuple[float, float]], sup_points: list[tuple[float, float]], max_range: int, progress: Callable[[float], None] | None = None) -> TravelTimeMatrix:
+        # only called if config.PYACCESS_CALC_MATRIX is enabled (results are checked against calc_reachability before being used)
+        calc_dense = lambda dem: pyaccess.calc_matrix(self._graph, dem, sup_points, max_range=max_range, weight=self._weight)
+        return build_travel_time_matrix(calc_dense, dem_points, sup_points, max_range, progress=progress)
@@ -0,0 +1,131 @@
+# Copyright (C) 2023 Authors of the MCDA project - All Rights Reserved
+
+"""Snapping of locations to routing-graph nodes.
+"""
+
+import logging
+import os
+import tempfile
+import threading
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+# number of newly snapped locations after which the cache is written to disk
+_STORE_THRESHOLD = 10000
+# maximum number of cached locations (further locations are snapped without caching, e.g. aggregated population centroids)
+_MAX_CACHE_SIZE = 1000000
+
+def get_snapping_file(graph_name: str, graph_dir: str) -> str:
+    return f"{graph_dir}/{graph_name}-snapping.npz"
+
+def remove_snapping_cache(graph_name: str, graph_dir: str):
+    """Removes the persisted snapping cache of a graph.
+
+    Note:
+        - has to be called whenever the graph is rebuild (node ids change)
+    """
+    file = get_snapping_file(graph_name, graph_dir)
+    if os.path.isfile(file):
+        os.remove(file)
+
+class SnappingIndex:
+    """Maps locations to the closest node of a routing graph.
+
+    Snapped nodes are cached per location (population cells and facilities never move) and persisted next to the graph files.
+
+    Note:
+        - node coordinates are read from the "<graph>-nodes" file written by the graph builders (ordered by node id)
+        - the cache is discarded if the number of graph nodes changed since it was written
+        - the cache holds at most _MAX_CACHE_SIZE locations
+        - every process (e.g. compute workers) keeps its own cache, the last process storing its cache wins
+    """
+    _file: str
+    _node_locations: np.ndarray
+    _tree: cKDTree
+    _scale: float
+    _cache: dict[tuple[float, float], int]
+    _unsaved: int
+    _lock: threading.Lock
+
+    def __init__(self, graph_name: str, graph_dir: str):
+        self._file = get_snapping_file(graph_name, graph_dir)
+        nodes = pd.read_feather(f"{graph_dir}/{graph_name}-nodes")
+        self._node_locations = nodes[["lon", "lat"]].to_numpy(dtype=np.float64)
+        # scale longitudes to get roughly equidistant coordinates for the tree
+        self._scale = float(np.cos(np.radians(self._node_locations[:, 1].mean())))
+        self._tree = cKDTree(self._node_locations * (self._scale, 1.0))
+        self._cache = {}
+        self._unsaved = 0
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not os.path.isfile(self._file):
+            return
+        # a corrupt cache is discarded (it is rebuild while snapping)
+        try:
+            data = np.load(self._file)
+            if int(data["node_count"]) != self._node_locations.shape[0]:
+                return
+            lon, lat, node = data["lon"][:_MAX_CACHE_SIZE], data["lat"][:_MAX_CACHE_SIZE], data["node"][:_MAX_CACHE_SIZE]
+            self._cache = dict(zip(zip(lon.tolist(), lat.tolist()), node.tolist()))
+        except Exception:
+            logging.warning(f"Invalid snapping cache {self._file}, it will be discarded.")
+
+    def store(self):
+        """Writes the snapping cache to disk.
+        """
+        with self._lock:
+            if self._unsaved == 0:
+                return
+            keys = list(self._cache.keys())
+            lon = np.array([k[0] for k in keys], dtype=np.float64)
+            lat = np.array([k[1] for k in keys], dtype=np.float64)
+            node = np.array(list(self._cache.values()), dtype=np.int32)
+            self._unsaved = 0
+        # every writer uses its own temporary file (caches are stored concurrently by the compute workers)
+        fd, tmp_file = tempfile.mkstemp(prefix=os.path.basename(self._file), suffix=".tmp", dir=os.path.dirname(self._file) or ".")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                np.savez(file, lon=lon, lat=lat, node=node, node_count=self._node_locations.shape[0])
+            os.replace(tmp_file, self._file)
+        except BaseException:
+            if os.path.isfile(tmp_file):
+                os.remove(tmp_file)
+            raise
+
+    def snap(self, points: list[tuple[float, float]]) -> np.ndarray:
+        """Returns the closest graph node for every point.
+        """
+        nodes = np.empty((len(points),), dtype=np.int32)
+        missing = []
+        with self._lock:
+            for i, p in enumerate(points):
+                node = self._cache.get((p[0], p[1]))
+                if node is None:
+                    missing.append(i)
+                else:
+                    nodes[i] = node
+        if len(missing) == 0:
+            return nodes
+        coords = np.array([points[i] for i in missing], dtype=np.float64).reshape(-1, 2)
+        _, found = self._tree.query(coords * (self._scale, 1.0))
+        nodes[missing] = found
+        with self._lock:
+            cached = 0
+            for i, node in zip(missing, found.tolist()):
+                if len(self._cache) >= _MAX_CACHE_SIZE:
+                    break
+                self._cache[(points[i][0], points[i][1])] = node
+                cached += 1
+            self._unsaved += cached
+            unsaved = self._unsaved
+        if unsaved >= _STORE_THRESHOLD:
+            self.store()
+        return nodes
+
+    def get_locations(self, nodes: np.ndarray) -> list[tuple[float, float]]:
+        """Returns the coordinates of the given graph nodes.
+        """
+        return [(float(lon), float(lat)) for lon, lat in self._node_locations[np.asarray(nodes, dtype=np.int64)].tolist()]
@@ -3,9 +3,13 @@
 """Profile class for public transit graphs.
 """
 
+from typing import Callable
 import numpy as np
 import pyaccess
 
+from .snapping import SnappingIndex
+from .matrix import TravelTimeMatrix, build_travel_time_matrix
+
 class TransitProfile:
     """Profile class for public transit graphs.
     """
@@ -13,12 +17,21 @@ class TransitProfile:
     _weekday: str
     _min_departure: int
     _max_departure: int
+    _snapping: SnappingIndex | None
 
-    def __init__(self, graph: pyaccess.Graph, weekday: str, min_departure: int, max_departure: int):
+    def __init__(self, graph: pyaccess.Graph, weekday: str, min_departure: int, max_departure: int, snapping: SnappingIndex | None):
         self._graph = graph
         self._weekday = weekday
         self._min_departure = min_departure
         self._max_departure = max_departure
+        self._snapping = snapping
+
+    def snap(self, points: list[tuple[float, float]]) -> tuple[np.ndarray, list[tuple[float, float]]]:
+        # without snapping index every point is treated as its own node
+        if self._snapping is None:
+            return np.arange(len(points)), list(points)
+        nodes = self._snapping.snap(points)
+        return nodes, self._snapping.get_locations(nodes)
 
     def calc_reachability(self, dem_points: list[tuple[float, float]], sup_points: list[tuple[float, float]], decay: pyaccess._pyaccess_ext.IDistanceDecay) -> tuple[np.ndarray, np.ndarray]:
         return pyaccess.calc_reachability_2(self._graph, dem_points, sup_points, decay=decay, transit="transit", transit_weight=self._weekday, min_departure=self._min_departure, max_departure=self._max_departure)
@@ -28,3 +41,8 @@ class TransitProfile:
 
     def calc_2sfca(self, dem_points: list[tuple[float, float]], dem_weights: list[int], sup_points: list[tuple[float, float]], sup_weights: list[int], decay: pyaccess._pyaccess_ext.IDistanceDecay) -> np.ndarray:
         return pyaccess.calc_2sfca(self._graph, dem_points, dem_weights, sup_points, sup_weights, decay=decay, transit="transit", transit_weight=self._weekday, min_departure=self._min_departure, max_departure=self._max_departure)
+
+    def calc_matrix(self, dem_points: list[tuple[float, float]], sup_points: list[tuple[float, float]], max_range: int, progress: Callable[[float], None] | None = None) -> TravelTimeMatrix:
+        # only called if config.PYACCESS_CALC_MATRIX is enabled (results are checked against calc_reachability before being used)
+        calc_dense = lambda dem: pyaccess.calc_matrix(self._graph, dem, sup_points, max_range=max_range, transit="transit", transit_weight=self._weekday, min_departure=self._min_departure, max_departure=self._max_departure)
+        return build_travel_time_matrix(calc_dense, dem_points, sup_points, max_range, progress=progress)
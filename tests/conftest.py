@@ -0,0 +1,7 @@
+# Copyright (C) 2023 Authors of the MCDA project - All Rights Reserved
+
+import os
+import sys
+
+# make the backend modules importable (tests are run from the repository root or the tests directory)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
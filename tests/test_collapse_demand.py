@@ -0,0 +1,73 @@
+# Copyright (C) 2023 Authors of the MCDA project - All Rights Reserved
+
+"""Tests of merging demand points snapped to the same graph node.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from services.method import access_methods
+from services.method.util import Infrastructure
+from services.profile.snapping import SnappingIndex
+
+class _Router:
+    """Profile with a reachability per graph node, demand is snapped to the closest node (after scaling the longitudes).
+    """
+    def __init__(self, snapping: SnappingIndex, node_locations: np.ndarray, scale: float):
+        self._snapping = snapping
+        self._node_locations = node_locations * (scale, 1.0)
+        self._scale = scale
+        self._values = np.arange(1, len(node_locations) + 1, dtype=np.float32)
+
+    def snap(self, points: list[tuple[float, float]]) -> tuple[np.ndarray, list[tuple[float, float]]]:
+        nodes = self._snapping.snap(points)
+        return nodes, self._snapping.get_locations(nodes)
+
+    def calc_reachability(self, dem_points, sup_points, decay) -> tuple[np.ndarray, np.ndarray]:
+        coords = np.asarray(dem_points, dtype=np.float64).reshape(-1, 2) * (self._scale, 1.0)
+        dist = ((coords[:, None, :] - self._node_locations[None, :, :]) ** 2).sum(axis=2)
+        nodes = dist.argmin(axis=1)
+        return self._values[nodes], np.full((len(dem_points),), len(sup_points), dtype=np.int32)
+
+def _get_router(tmp_path, monkeypatch, scale: float | None) -> _Router:
+    rng = np.random.default_rng(0)
+    node_locations = np.column_stack([rng.uniform(9.0, 10.0, 200), rng.uniform(52.0, 53.0, 200)])
+    pd.DataFrame({"lon": node_locations[:, 0], "lat": node_locations[:, 1]}).to_feather(tmp_path / "test-nodes")
+    snapping = SnappingIndex("test", str(tmp_path))
+    # by default the router snaps like the snapping index
+    profile = _Router(snapping, node_locations, snapping._scale if scale is None else scale)
+    monkeypatch.setattr(access_methods, "_get_profile", lambda travel_mode: profile)
+    monkeypatch.setattr(access_methods, "get_distance_decay", lambda param: object())
+    return profile
+
+def _get_demand(count: int) -> list[tuple[float, float]]:
+    rng = np.random.default_rng(1)
+    return list(zip(rng.uniform(9.0, 10.0, count).tolist(), rng.uniform(52.0, 53.0, count).tolist()))
+
+_INFRASTRUCTURES = {"a": Infrastructure(1.0, {}, [], [(9.5, 52.5)], [])}
+
+def test_collapsed_demand_matches_uncollapsed(tmp_path, monkeypatch):
+    router = _get_router(tmp_path, monkeypatch, None)
+    demand = _get_demand(5000)
+
+    locations, mapping = access_methods._collapse_demand(router, demand)
+    assert len(locations) < len(demand)
+    assert mapping.shape == (len(demand),)
+
+    access, counts = access_methods._calc_multi_criteria("test", demand, _INFRASTRUCTURES)
+    expected, expected_counts = router.calc_reachability(demand, _INFRASTRUCTURES["a"].locations, None)
+    np.testing.assert_array_equal(access["a"], expected)
+    np.testing.assert_array_equal(counts["a"], expected_counts)
+
+def test_collapsed_origins_are_located_at_the_node(tmp_path, monkeypatch):
+    # a router snapping differently than the snapping index (unscaled longitudes)
+    router = _get_router(tmp_path, monkeypatch, 1.0)
+    demand = _get_demand(5000)
+
+    locations, mapping = access_methods._collapse_demand(router, demand)
+    nodes = router._snapping.snap(demand)
+    assert locations == router._snapping.get_locations(np.unique(nodes))
+    # every demand point gets the result of the node it was merged at
+    access, _ = access_methods._calc_multi_criteria("test", demand, _INFRASTRUCTURES)
+    np.testing.assert_array_equal(access["a"], router._values[nodes])
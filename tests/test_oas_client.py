@@ -0,0 +1,151 @@
+# Copyright (C) 2023 Authors of the MCDA project - All Rights Reserved
+
+"""Tests of the OAS client against the dummy OAS (scripts/oas_dummy_server.py).
+"""
+
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+import httpx
+import numpy as np
+import pytest
+
+from services.method.oas_api.client import OASClient
+
+_SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts", "oas_dummy_server.py")
+
+def _get_free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+@pytest.fixture(scope="module")
+def server_url():
+    port = _get_free_port()
+    process = subprocess.Popen([sys.executable, _SERVER_SCRIPT, str(port)], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://localhost:{port}"
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                httpx.get(f"{url}/test/calls")
+                break
+            except httpx.TransportError:
+                if time.monotonic() > deadline or process.poll() is not None:
+                    raise RuntimeError("Dummy OAS did not start.")
+                time.sleep(0.1)
+        yield url
+    finally:
+        process.terminate()
+        process.wait()
+
+def _post(url: str, path: str, body, timeout: float = 10, retries: int = 2, compress_min_bytes: int = 0, binary: bool = False):
+    async def run():
+        client = OASClient(url, timeout, timeout, 4, retries, 0.01, compress_min_bytes, binary)
+        try:
+            return await client.post(path, body)
+        finally:
+            await client.close()
+    return asyncio.run(run())
+
+def _get_calls(url: str, path: str) -> int:
+    return httpx.get(f"{url}/test/calls").json().get(path, 0)
+
+@pytest.mark.parametrize("status", [502, 503, 504])
+def test_retries_transient_failures(server_url, status):
+    path = f"/test/fail/{status}/2/retry"
+    result = _post(server_url, path, {"value": 1}, retries=2)
+    assert result == {"body": {"value": 1}, "calls": 3}
+    assert _get_calls(server_url, path) == 3
+
+def test_gives_up_after_retries(server_url):
+    path = "/test/fail/503/5/give-up"
+    with pytest.raises(httpx.HTTPStatusError) as e:
+        _post(server_url, path, {"value": 1}, retries=2)
+    assert e.value.response.status_code == 503
+    assert _get_calls(server_url, path) == 3
+
+def test_does_not_retry_client_errors(server_url):
+    path = "/test/fail/400/1/client-error"
+    with pytest.raises(httpx.HTTPStatusError) as e:
+        _post(server_url, path, {"value": 1}, retries=2)
+    assert e.value.response.status_code == 400
+    assert _get_calls(server_url, path) == 1
+
+def test_compresses_large_bodies(server_url):
+    body = {"values": list(range(1000))}
+    result = _post(server_url, "/test/echo", body, compress_min_bytes=1000)
+    assert result == {"body": body, "content_encoding": "gzip"}
+
+def test_does_not_compress_small_bodies(server_url):
+    body = {"values": list(range(10))}
+    result = _post(server_url, "/test/echo", body, compress_min_bytes=1000)
+    assert result == {"body": body, "content_encoding": None}
+
+def test_falls_back_to_uncompressed_bodies(server_url):
+    path = "/test/no-gzip/fallback"
+    body = {"values": list(range(1000))}
+    async def run():
+        client = OASClient(server_url, 10, 10, 4, 0, 0.01, 1000)
+        try:
+            return await client.post(path, body), await client.post(path, body)
+        finally:
+            await client.close()
+    first, second = asyncio.run(run())
+    assert first == {"body": body, "calls": 2}
+    # the client remembers that the OAS does not accept compressed bodies
+    assert second == {"body": body, "calls": 3}
+    assert _get_calls(server_url, path) == 3
+
+def test_decodes_gzip_responses(server_url):
+    # responses above the minimum size of the dummies gzip middleware are compressed
+    body = {"values": list(range(5000))}
+    result = _post(server_url, "/test/echo", body)
+    assert result["body"] == body
+
+def test_times_out(server_url):
+    with pytest.raises(httpx.TimeoutException):
+        _post(server_url, "/test/delay/2", {"value": 1}, timeout=0.2, retries=0)
+
+def test_retries_timeouts(server_url):
+    start = time.monotonic()
+    with pytest.raises(httpx.TimeoutException):
+        _post(server_url, "/test/delay/2", {"value": 1}, timeout=0.2, retries=1)
+    assert time.monotonic() - start >= 0.4
+
+_ACCESS_REQUEST = {
+    "distance_decay": {"decay_type": "linear", "max_range": 1800},
+    "demand": {"demand_locations": [[9.0, 52.0], [9.1, 52.0], [20.0, 40.0]], "demand_weights": [1, 1, 1]},
+    "supply": {"supply_locations": [[9.05, 52.0]], "supply_weights": [1]},
+    "routing_profile": "driving-car",
+    "response_params": {"scale": False, "scale_range": [0, 1], "no_data_value": -9999},
+}
+
+def test_decodes_json_responses(server_url):
+    result = _post(server_url, "/v1/accessibility/enhanced_2sfca", _ACCESS_REQUEST)
+    assert isinstance(result["access"], list)
+    assert len(result["access"]) == 3
+    assert result["access"][2] == -9999
+
+def test_decodes_binary_responses(server_url):
+    json_result = _post(server_url, "/v1/accessibility/enhanced_2sfca", _ACCESS_REQUEST)
+    binary_result = _post(server_url, "/v1/accessibility/enhanced_2sfca", _ACCESS_REQUEST, binary=True)
+    assert isinstance(binary_result["access"], np.ndarray)
+    np.testing.assert_allclose(binary_result["access"], json_result["access"])
+
+def test_decodes_nested_binary_responses(server_url):
+    body = {
+        "demand": {"demand_locations": [[9.0, 52.0], [9.1, 52.0]], "demand_weights": [1, 1]},
+        "infrastructures": {
+            "a": {"infrastructure_weight": 0.5, "decay": {"decay_type": "linear", "max_range": 1800}, "supply": {"supply_locations": [[9.05, 52.0]], "supply_weights": [1]}},
+        },
+        "routing_profile": "driving-car",
+    }
+    json_result = _post(server_url, "/v1/multicriteria/multi", body)
+    binary_result = _post(server_url, "/v1/multicriteria/multi", body, binary=True)
+    assert set(binary_result["access"].keys()) == {"multiCriteria", "a"}
+    np.testing.assert_allclose(binary_result["access"]["multiCriteria"], json_result["access"]["multiCriteria"])
+    np.testing.assert_allclose(binary_result["access"]["a"], json_result["access"]["a"])
@@ -0,0 +1,63 @@
+# Copyright (C) 2023 Authors of the MCDA project - All Rights Reserved
+
+"""Tests of the sharded multi-criteria requests of the OAS method service.
+"""
+
+import asyncio
+import numpy as np
+
+import config
+from services.method import oas_methods
+from services.method.oas_methods import OASMethodService
+from services.method.util import Infrastructure
+
+class _RecordingClient:
+    """Answers multi-criteria requests with the longitude of every demand point (and records the request sizes).
+    """
+    def __init__(self):
+        self.demand_sizes = []
+        self.supply_sizes = []
+
+    async def post(self, path: str, body: dict) -> dict:
+        demand = np.asarray(body["demand"]["demand_locations"], dtype=np.float64).reshape(-1, 2)
+        self.demand_sizes.append(demand.shape[0])
+        self.supply_sizes.append({name: len(infra["supply"]["supply_locations"]) for name, infra in body["infrastructures"].items()})
+        access = {name: demand[:, 0].tolist() for name in body["infrastructures"]}
+        return {"access": {"multiCriteria": demand[:, 0].tolist(), **access}}
+
+class _Decay:
+    def __init__(self, max_range: int):
+        self._max_range = max_range
+
+    def get_max_distance(self) -> int:
+        return self._max_range
+
+def _get_demand(count: int) -> list[tuple[float, float]]:
+    # roughly the extent of Niedersachsen
+    rng = np.random.default_rng(0)
+    x = rng.uniform(6.6, 11.6, count)
+    y = rng.uniform(51.3, 53.9, count)
+    return list(zip(x.tolist(), y.tolist()))
+
+def test_sharded_demand_is_sent_once(monkeypatch):
+    monkeypatch.setattr(oas_methods, "get_distance_decay", lambda param: _Decay(param["max_range"]))
+    monkeypatch.setattr(config, "OAS_SHARD_MIN_DEMAND", 1000)
+    monkeypatch.setattr(config, "OAS_SHARD_TILE_FACTOR", 1)
+    demand = _get_demand(20000)
+    infrastructures = {
+        "a": Infrastructure(0.5, {"decay_type": "linear", "max_range": 1800}, [], [(8.0, 52.0), (10.0, 53.0)], []),
+        "b": Infrastructure(0.5, {"decay_type": "linear", "max_range": 1800}, [], [(7.0, 51.5)], []),
+    }
+    client = _RecordingClient()
+    service = OASMethodService(client)
+
+    access, _ = asyncio.run(service.calcMultiCriteria(demand, [1] * len(demand), infrastructures, "driving-car"))
+
+    assert len(client.demand_sizes) > 1
+    assert sum(client.demand_sizes) == len(demand)
+    # every tile request contains all infrastructures
+    assert all(set(sizes.keys()) == {"a", "b"} for sizes in client.supply_sizes)
+    # results are stitched back in the order of the demand points
+    expected = np.asarray(demand, dtype=np.float32)[:, 0]
+    for name in ["multiCriteria", "a", "b"]:
+        np.testing.assert_array_equal(access[name], expected)
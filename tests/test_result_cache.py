@@ -0,0 +1,46 @@
+# Copyright (C) 2023 Authors of the MCDA project - All Rights Reserved
+
+"""Tests of the result cache wrapper of the method services.
+"""
+
+import asyncio
+import numpy as np
+
+from services.method.cache import CachedMethodService, ResultCache
+from services.profile import TravelTimeMatrix
+
+class _MatrixService:
+    def __init__(self, supported: bool):
+        self.supported = supported
+        self.calls = 0
+
+    def supportsMatrix(self) -> bool:
+        return self.supported
+
+    async def calcMatrix(self, population_locations, facility_locations, max_range, travel_mode="driving-car", progress=None):
+        self.calls += 1
+        if not self.supported:
+            return None
+        return TravelTimeMatrix(np.zeros((len(population_locations) + 1,), dtype=np.int64), np.zeros((0,), dtype=np.int32), np.zeros((0,), dtype=np.int32), list(facility_locations), max_range)
+
+_DEMAND = [(9.0, 52.0), (9.1, 52.0)]
+_FACILITIES = [(9.05, 52.0)]
+
+def test_skips_unsupported_matrices():
+    cache = ResultCache(1 << 20)
+    service = _MatrixService(False)
+    cached = CachedMethodService(service, "test", cache)
+    assert asyncio.run(cached.calcMatrix(_DEMAND, _FACILITIES, 1800)) is None
+    assert service.calls == 0
+    assert cache.get_stats()["misses"] == 0
+
+def test_caches_matrices():
+    cache = ResultCache(1 << 20)
+    service = _MatrixService(True)
+    cached = CachedMethodService(service, "test", cache)
+    first = asyncio.run(cached.calcMatrix(_DEMAND, _FACILITIES, 1800))
+    second = asyncio.run(cached.calcMatrix(_DEMAND, _FACILITIES, 1800))
+    assert first is second
+    assert service.calls == 1
+    assert cache.get_stats()["misses"] == 1
+    assert cache.get_stats()["hits"] == 1
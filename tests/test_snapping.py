@@ -0,0 +1,53 @@
+# Copyright (C) 2023 Authors of the MCDA project - All Rights Reserved
+
+"""Tests of the snapping index and its persisted cache.
+"""
+
+import os
+import numpy as np
+import pandas as pd
+import pytest
+
+from services.profile import snapping
+from services.profile.snapping import SnappingIndex
+
+@pytest.fixture
+def graph_dir(tmp_path) -> str:
+    rng = np.random.default_rng(0)
+    pd.DataFrame({"lon": rng.uniform(9.0, 10.0, 100), "lat": rng.uniform(52.0, 53.0, 100)}).to_feather(tmp_path / "test-nodes")
+    return str(tmp_path)
+
+def _get_points(count: int, seed: int = 1) -> list[tuple[float, float]]:
+    rng = np.random.default_rng(seed)
+    return list(zip(rng.uniform(9.0, 10.0, count).tolist(), rng.uniform(52.0, 53.0, count).tolist()))
+
+def test_cache_is_bounded(graph_dir, monkeypatch):
+    monkeypatch.setattr(snapping, "_MAX_CACHE_SIZE", 50)
+    index = SnappingIndex("test", graph_dir)
+    points = _get_points(200)
+    nodes = index.snap(points)
+    assert len(index._cache) == 50
+    # uncached locations are snapped the same way
+    np.testing.assert_array_equal(index.snap(points), nodes)
+    assert len(index._cache) == 50
+
+def test_store_and_load(graph_dir):
+    index = SnappingIndex("test", graph_dir)
+    points = _get_points(200)
+    nodes = index.snap(points)
+    index.store()
+    # temporary files are replaced by the cache file
+    assert sorted(os.listdir(graph_dir)) == ["test-nodes", "test-snapping.npz"]
+    loaded = SnappingIndex("test", graph_dir)
+    assert loaded._cache == index._cache
+    np.testing.assert_array_equal(loaded.snap(points), nodes)
+
+def test_last_writer_wins(graph_dir):
+    first = SnappingIndex("test", graph_dir)
+    second = SnappingIndex("test", graph_dir)
+    first.snap(_get_points(100, 1))
+    second.snap(_get_points(100, 2))
+    first.store()
+    second.store()
+    assert sorted(os.listdir(graph_dir)) == ["test-nodes", "test-snapping.npz"]
+    assert SnappingIndex("test", graph_dir)._cache == second._cache
@@ -0,0 +1,121 @@
+# Copyright (C) 2023 Authors of the MCDA project - All Rights Reserved
+
+"""Tests of the sparse travel-time matrix against dense reference matrices.
+"""
+
+import numpy as np
+import pytest
+
+from services.profile.matrix import TravelTimeMatrix, build_travel_time_matrix
+
+MAX_RANGE = 900
+
+def _get_dense(rows: int, cols: int, seed: int) -> np.ndarray:
+    """Random dense travel-times (negative if unreachable, some beyond MAX_RANGE, some 0).
+    """
+    rng = np.random.default_rng(seed)
+    dense = rng.integers(0, 2 * MAX_RANGE, (rows, cols))
+    dense[rng.random((rows, cols)) < 0.3] = -1
+    dense[rng.random((rows, cols)) < 0.05] = 0
+    return dense
+
+def _get_locations(count: int, offset: float = 0) -> list[tuple[float, float]]:
+    return [(offset + i * 0.01, 52.0 + i * 0.01) for i in range(count)]
+
+def _build(dense: np.ndarray, sup_points: list[tuple[float, float]], chunk_size: int = 7) -> TravelTimeMatrix:
+    dem_points = _get_locations(dense.shape[0], offset=8.0)
+    rows = {p: i for i, p in enumerate(dem_points)}
+    calc_dense = lambda dem: dense[[rows[p] for p in dem]]
+    return build_travel_time_matrix(calc_dense, dem_points, sup_points, MAX_RANGE, chunk_size=chunk_size)
+
+class _IdentityDecay:
+    """Returns the travel-time itself (used to read back stored times through "get_decay_weights").
+    """
+    def get_distance_weight(self, t: int) -> float:
+        return float(t)
+
+def _to_dense(matrix: TravelTimeMatrix, cols: np.ndarray) -> np.ndarray:
+    """Converts the matrix back to dense travel-times (-1 for missing entries).
+    """
+    times = matrix.select(matrix.get_decay_weights(_IdentityDecay(), MAX_RANGE) + 1, cols).toarray()
+    return times - 1
+
+def _reference(dense: np.ndarray) -> np.ndarray:
+    return np.where((dense >= 0) & (dense <= MAX_RANGE), dense, -1)
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 100])
+def test_build_matches_dense(chunk_size):
+    dense = _get_dense(23, 11, 0)
+    sup_points = _get_locations(11)
+    matrix = _build(dense, sup_points, chunk_size)
+    assert matrix.get_demand_count() == 23
+    np.testing.assert_array_equal(_to_dense(matrix, np.arange(11)), _reference(dense))
+
+def test_build_empty_demand():
+    matrix = _build(np.zeros((0, 4), dtype=np.int64), _get_locations(4))
+    assert matrix.get_demand_count() == 0
+    assert _to_dense(matrix, np.arange(4)).shape == (0, 4)
+
+def test_select_columns():
+    dense = _get_dense(17, 9, 1)
+    sup_points = _get_locations(9)
+    matrix = _build(dense, sup_points)
+    cols = np.array([8, 0, 3, 3])
+    np.testing.assert_array_equal(_to_dense(matrix, cols), _reference(dense)[:, cols])
+
+def test_select_with_rows():
+    dense = _get_dense(17, 9, 2)
+    matrix = _build(dense, _get_locations(9))
+    rows = np.array([16, 2, 2, 0])
+    weights = matrix.get_decay_weights(_IdentityDecay(), MAX_RANGE) + 1
+    result = matrix.select(weights, np.arange(9), rows).toarray() - 1
+    np.testing.assert_array_equal(result, _reference(dense)[rows])
+
+def test_select_rows():
+    dense = _get_dense(15, 6, 3)
+    matrix = _build(dense, _get_locations(6))
+    rows = np.array([3, 3, 0, 14, 7])
+    selected = matrix.select_rows(rows)
+    assert selected.get_demand_count() == rows.shape[0]
+    np.testing.assert_array_equal(_to_dense(selected, np.arange(6)), _reference(dense)[rows])
+
+def test_extend():
+    dense_a = _get_dense(12, 5, 4)
+    dense_b = _get_dense(12, 3, 5)
+    sup_a = _get_locations(5)
+    sup_b = _get_locations(3, offset=1.0)
+    a = _build(dense_a, sup_a)
+    b = _build(dense_b, sup_b)
+    extended = a.extend(b)
+    np.testing.assert_array_equal(_to_dense(extended, np.arange(8)), _reference(np.hstack([dense_a, dense_b])))
+    np.testing.assert_array_equal(extended.get_columns(sup_b), np.arange(5, 8))
+    # the original matrices are not modified
+    np.testing.assert_array_equal(_to_dense(a, np.arange(5)), _reference(dense_a))
+
+def test_extend_requires_same_demand():
+    a = _build(_get_dense(4, 2, 6), _get_locations(2))
+    b = _build(_get_dense(5, 2, 7), _get_locations(2, offset=1.0))
+    with pytest.raises(ValueError):
+        a.extend(b)
+
+def test_columns_and_missing_locations():
+    sup_points = _get_locations(4)
+    matrix = _build(_get_dense(3, 4, 8), sup_points)
+    np.testing.assert_array_equal(matrix.get_columns([sup_points[2], sup_points[0]]), [2, 0])
+    assert matrix.get_columns([sup_points[1], (0.5, 0.5)]) is None
+    assert matrix.get_missing_locations([sup_points[1], (0.5, 0.5), (0.5, 0.5), (1.5, 0.5)]) == [(0.5, 0.5), (1.5, 0.5)]
+
+def test_range_mask():
+    dense = _get_dense(10, 7, 9)
+    matrix = _build(dense, _get_locations(7))
+    in_range = matrix.select(matrix.get_range_mask(300), np.arange(7)).toarray()
+    np.testing.assert_array_equal(in_range, ((dense >= 0) & (dense <= 300)).astype(np.float32))
+
+def test_decay_weights_beyond_range():
+    dense = _get_dense(10, 7, 10)
+    matrix = _build(dense, _get_locations(7))
+    weights = matrix.select(matrix.get_decay_weights(_IdentityDecay(), 300) + 1, np.arange(7)).toarray() - 1
+    expected = np.where((dense >= 0) & (dense <= 300), dense, -1)
+    # entries beyond the range get weight 0 (but are still stored)
+    expected = np.where((dense > 300) & (dense <= MAX_RANGE), 0, expected)
+    np.testing.assert_array_equal(weights, expected)